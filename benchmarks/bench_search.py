@@ -0,0 +1,93 @@
+"""
+Бенчмарк поиска заказов по статусу (SearchOrderView) и списка заказов
+с фильтром по статусу на большой таблице заказов.
+
+Сравнивает два состояния:
+    до   - без индекса (status, id) и с двумя COUNT на запрос, как было раньше;
+    после - с индексом order_status_id_idx и одним COUNT.
+
+Запуск:
+    python -m benchmarks.bench_search --orders 1000000 --repeat 20
+"""
+import argparse
+
+from benchmarks.common import (setup_django, benchmark_database, seed_orders,
+                               measure, print_timings)
+
+
+def legacy_search_by_status(order_status):
+    """
+    Прежняя реализация SearchOrderView._search_by_status: два COUNT на запрос.
+    """
+    from orders.models import Order
+
+    orders = Order.objects.filter(status=order_status)
+    if orders.count() < 1:
+        return None
+    return orders.count()
+
+
+def run_scenarios(repeat, legacy):
+    from django.test import RequestFactory
+    from django.urls import reverse
+    from orders.views import SearchOrderView, OrderListView
+
+    factory = RequestFactory()
+    search_request = factory.get(reverse("orders:search_order"), {
+        "orderSearchType": "by_status", "search_val": "ready"
+    })
+    list_request = factory.get(reverse("orders:orders_list"), {"status": "ready"})
+    search_view = SearchOrderView.as_view()
+    list_view = OrderListView.as_view()
+
+    if legacy:
+        search = lambda: legacy_search_by_status("ready")
+    else:
+        search = lambda: search_view(search_request)
+
+    return {
+        "Поиск по статусу": measure(search, repeat),
+        "Первая страница списка по статусу": measure(lambda: list_view(list_request), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1_000_000,
+                        help="Количество заказов в таблице")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="Количество повторов каждого сценария")
+    args = parser.parse_args()
+
+    setup_django()
+    from orders.models import Order
+
+    with benchmark_database() as connection:
+        print(f"Создание {args.orders} заказов ({connection.vendor})...")
+        seed_orders(args.orders)
+
+        index = next(index for index in Order._meta.indexes
+                     if index.name == "order_status_id_idx")
+
+        with connection.schema_editor() as editor:
+            editor.remove_index(Order, index)
+        print("\nДо: без индекса (status, id), два COUNT на поиск")
+        before = run_scenarios(args.repeat, legacy=True)
+        for title, timings in before.items():
+            print_timings(title, timings)
+
+        with connection.schema_editor() as editor:
+            editor.add_index(Order, index)
+        print("\nПосле: индекс (status, id), один COUNT на поиск")
+        after = run_scenarios(args.repeat, legacy=False)
+        for title, timings in after.items():
+            print_timings(title, timings)
+
+        print("\nУскорение (по медиане):")
+        for title in after:
+            print(f"{title:<50} x{before[title]['median'] / after[title]['median']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Бенчмарк отчета о самых продаваемых блюдах (GET /api/items/top/)
+на большой таблице строк заказов.
+
+Сравнивает:
+    перебор в Python - заказы и их блюда (order.lines.all()) по одному
+                       запросу на заказ, как без отчета пришлось бы считать
+                       вручную; измеряется на выборке заказов и пересчитывается
+                       на всю таблицу;
+    один запрос      - analytics.top_items: GROUP BY по строкам заказов;
+    ответ из кэша    - повторный запрос к API до изменения заказов.
+
+Запуск:
+    python -m benchmarks.bench_top_items --lines 1000000 --repeat 5
+"""
+import argparse
+from collections import Counter
+
+from benchmarks.common import (setup_django, benchmark_database, seed_items, seed_orders,
+                               measure, print_timings)
+
+LINES_PER_ORDER = 4
+
+
+def python_top_items(orders, limit=10):
+    """
+    Отчет перебором заказов и их строк в Python (N+1 запрос).
+    """
+    quantities = Counter()
+    for order in orders:
+        for line in order.lines.all():
+            quantities[line.item_id] += line.quantity
+    return quantities.most_common(limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1_000_000,
+                        help="Количество строк заказов")
+    parser.add_argument("--sample", type=int, default=2000,
+                        help="Количество заказов для замера перебора в Python")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Количество повторов каждого сценария")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.urls import reverse
+    from rest_framework.test import APIRequestFactory
+    from orders.analytics import top_items
+    from orders.api_views import ItemViewSet
+    from orders.models import Order
+
+    with benchmark_database() as connection:
+        orders_count = args.lines // LINES_PER_ORDER
+        print(f"Создание {orders_count} заказов и {orders_count * LINES_PER_ORDER} строк "
+              f"({connection.vendor})...")
+        items = seed_items()
+        seed_orders(orders_count, items=items, lines_per_order=LINES_PER_ORDER)
+
+        sample = list(Order.objects.order_by("id")[:args.sample])
+        python = measure(lambda: python_top_items(sample), args.repeat)
+        scale = orders_count / len(sample)
+        print_timings(f"Перебор в Python ({len(sample)} заказов)", python)
+        print(f"{'Перебор в Python (пересчет на все заказы)':<50} "
+              f"~{python['median'] * scale / 1000:.1f} s")
+
+        grouped = measure(lambda: top_items(10), args.repeat)
+        print_timings("Один запрос с группировкой", grouped)
+        print_timings("Один запрос, только оплаченные",
+                      measure(lambda: top_items(10, status="paid"), args.repeat))
+
+        factory = APIRequestFactory()
+        request = factory.get(reverse("orders:item-top"), {"status": "paid"})
+        view = ItemViewSet.as_view({"get": "top"})
+        view(request).render()
+        print_timings("Ответ API из кэша",
+                      measure(lambda: view(request).render(), args.repeat))
+
+        print(f"\nУскорение одного запроса относительно перебора: "
+              f"x{python['median'] * scale / grouped['median']:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Общие функции для бенчмарков: настройка Django, временная БД и наполнение данными.
+
+Бенчмарки запускаются из корня проекта как модули:
+    python -m benchmarks.bench_search --orders 1000000
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    """
+    Настраивает Django для запуска бенчмарка вне manage.py.
+    """
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cafeorders.settings")
+    os.environ.setdefault("DJANGO_SECRET_KEY", "benchmark")
+
+    import django
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Создает отдельную тестовую БД со всеми миграциями и удаляет ее после работы.
+    Для SQLite файл БД создается во временном каталоге.
+    """
+    from django.db import connection, connections
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    if connection.vendor == "sqlite":
+        tmp_dir = tempfile.mkdtemp(prefix="cafeorders-bench-")
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tmp_dir, "bench.sqlite3")
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    # Реплика (cafeorders.settings, DATABASE_REPLICA=1) читает ту же временную БД
+    for alias in connections:
+        if connections[alias].settings_dict["TEST"].get("MIRROR") == connection.alias:
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def seed_items(count=30):
+    """
+    Создает блюда для бенчмарка.
+
+    Returns:
+        list[Item]: Созданные блюда.
+    """
+    from orders.models import Item
+
+    return Item.objects.bulk_create(
+        [Item(name=f"Блюдо {number}", price=random.randint(100, 3000))
+         for number in range(count)]
+    )
+
+
+def seed_orders(count, items=None, lines_per_order=0, batch_size=10000):
+    """
+    Создает count заказов со случайными статусами пакетными INSERT.
+
+    Args:
+        count (int): Количество заказов.
+        items (list[Item], optional): Блюда для строк заказов.
+        lines_per_order (int): Количество строк в каждом заказе.
+        batch_size (int): Размер пакета INSERT.
+    """
+    from django.db import transaction
+    from orders.models import Order, OrderLine
+
+    statuses = [status for status, _ in Order.STATUS_CHOICES]
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        with transaction.atomic():
+            orders = Order.objects.bulk_create([
+                Order(table_number=created + number + 1,
+                      status=random.choice(statuses))
+                for number in range(size)
+            ])
+            if items and lines_per_order:
+                OrderLine.objects.bulk_create([
+                    OrderLine(order=order, item=item,
+                              quantity=random.randint(1, 3), unit_price=item.price)
+                    for order in orders
+                    for item in random.sample(items, lines_per_order)
+                ], batch_size=batch_size)
+        created += size
+
+
+def measure(func, repeat):
+    """
+    Выполняет func repeat раз и возвращает время выполнения в миллисекундах.
+
+    Returns:
+        dict: Медиана, p95 и среднее время.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "median": statistics.median(timings),
+        "p95": percentile(timings, 0.95),
+        "mean": statistics.fmean(timings),
+    }
+
+
+def percentile(timings, fraction):
+    """
+    Перцентиль отсортированного списка замеров (ближайший ранг).
+
+    Args:
+        timings (list[float]): Отсортированные замеры.
+        fraction (float): Доля, например 0.95 для p95.
+
+    Returns:
+        float: Значение перцентиля или 0 для пустого списка.
+    """
+    if not timings:
+        return 0
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def print_timings(title, timings):
+    print(f"{title:<50} median {timings['median']:8.2f} ms   "
+          f"p95 {timings['p95']:8.2f} ms   mean {timings['mean']:8.2f} ms")
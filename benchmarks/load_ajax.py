@@ -0,0 +1,224 @@
+"""
+Нагрузочный тест AJAX views под WSGI- и ASGI-сервером.
+
+Запускает на временной БД с заказами по очереди:
+    wsgi      - gunicorn (gthread) с синхронными views;
+    asgi      - uvicorn с асинхронными views (orders.async_views);
+    asgi-sync - uvicorn с синхронными views через sync_to_async;
+и для каждого сервера измеряет число запросов в секунду и задержки
+при заданном числе одновременных соединений.
+
+Запросы: поиск по ID, по номеру стола и по статусу, выручка
+и (при --writes > 0) смена статуса заказа.
+
+Требуются пакеты gunicorn и uvicorn. Запуск:
+    python -m benchmarks.load_ajax --orders 100000 --concurrency 64 --duration 20
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import BASE_DIR, setup_django, benchmark_database, seed_orders
+
+SERVERS = {
+    "wsgi": ("gunicorn cafeorders.wsgi:application --bind 127.0.0.1:{port} "
+             "--workers {workers} --worker-class gthread --threads {threads} "
+             "--log-level warning"),
+    "asgi": ("uvicorn cafeorders.asgi:application --port {port} "
+             "--workers {workers} --no-access-log --log-level warning"),
+}
+SERVERS["asgi-sync"] = SERVERS["asgi"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, port, workers, threads, database):
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": "benchmarks.settings",
+        "BENCHMARK_DB": database,
+        "ORDERS_ASYNC_VIEWS": "1" if kind == "asgi" else "0",
+    }
+    command = SERVERS[kind].format(port=port, workers=workers, threads=threads)
+    process = subprocess.Popen(command.split(), cwd=BASE_DIR, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Сервер {kind} не запустился: {command}")
+
+
+class Connection:
+    """
+    Минимальный HTTP/1.1 клиент с keep-alive поверх asyncio streams.
+    """
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=b""):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        lines = [f"{method} {path} HTTP/1.1", f"Host: 127.0.0.1:{self.port}",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        response_headers = {
+            name.strip().lower(): value.strip()
+            for name, _, value in (line.decode().partition(":") for line in head.split(b"\r\n")[1:] if line)
+        }
+        content = await self.reader.readexactly(int(response_headers.get("content-length", 0)))
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, content
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+def build_requests(orders_count, writes, csrf_token, cookie):
+    """
+    Возвращает функцию, выбирающую случайный запрос из смеси сценариев.
+    """
+    def search(search_type, value):
+        return ("GET", f"/orders/ajax/search_order/?orderSearchType={search_type}&search_val={value}",
+                {}, b"")
+
+    write_headers = {"X-CSRFToken": csrf_token, "Cookie": cookie,
+                     "Content-Type": "application/json"}
+
+    def next_request():
+        if writes and random.random() < writes:
+            status = random.choice(["pending", "ready", "paid"])
+            return ("PATCH", f"/orders/ajax/change_order_status/{random.randint(1, orders_count)}",
+                    write_headers, json.dumps({"new_status": status}).encode())
+        scenario = random.randrange(4)
+        if scenario == 0:
+            return search("by_id", random.randint(1, orders_count))
+        if scenario == 1:
+            return search("by_table", random.randint(1, orders_count))
+        if scenario == 2:
+            return search("by_status", random.choice(["pending", "ready", "paid"]))
+        return ("GET", "/orders/ajax/calculate_total_revenue", {}, b"")
+
+    return next_request
+
+
+async def get_csrf(port):
+    connection = Connection(port)
+    _, headers, _ = await connection.request("GET", "/orders/order/create_order")
+    await connection.close()
+    token = re.search(r"csrftoken=([^;]+)", headers.get("set-cookie", ""))
+    token = token.group(1) if token else ""
+    return token, f"csrftoken={token}"
+
+
+async def run_load(port, concurrency, duration, next_request):
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        nonlocal errors
+        connection = Connection(port)
+        while time.monotonic() < deadline:
+            method, path, headers, body = next_request()
+            started = time.perf_counter()
+            try:
+                status, _, _ = await connection.request(method, path, headers, body)
+            except (OSError, asyncio.IncompleteReadError):
+                await connection.close()
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 500:
+                errors += 1
+        await connection.close()
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "median": statistics.median(latencies) if latencies else 0,
+        "p95": latencies[int(len(latencies) * 0.95)] if latencies else 0,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=100_000,
+                        help="Количество заказов в таблице")
+    parser.add_argument("--concurrency", type=int, default=64,
+                        help="Количество одновременных соединений")
+    parser.add_argument("--duration", type=float, default=20,
+                        help="Длительность теста для каждого сервера, секунд")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Количество процессов сервера")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="Количество потоков на процесс gunicorn")
+    parser.add_argument("--writes", type=float, default=0.1,
+                        help="Доля запросов смены статуса (0 - только чтение)")
+    parser.add_argument("--servers", nargs="+", choices=SERVERS, default=list(SERVERS))
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+
+    with benchmark_database() as connection:
+        print(f"Создание {args.orders} заказов ({connection.vendor})...")
+        seed_orders(args.orders)
+        call_command("rebuild_revenue", stdout=io.StringIO())
+        database = connection.settings_dict["NAME"]
+        connection.close()
+
+        results = {}
+        for kind in args.servers:
+            port = free_port()
+            process = start_server(kind, port, args.workers, args.threads, database)
+            try:
+                csrf_token, cookie = asyncio.run(get_csrf(port))
+                next_request = build_requests(args.orders, args.writes, csrf_token, cookie)
+                # Прогрев: соединения с БД, импорт модулей в воркерах
+                asyncio.run(run_load(port, args.concurrency, 2, next_request))
+                results[kind] = asyncio.run(
+                    run_load(port, args.concurrency, args.duration, next_request)
+                )
+            finally:
+                process.terminate()
+                process.wait()
+
+        print(f"\nСоединений: {args.concurrency}, процессов: {args.workers}, "
+              f"доля записей: {args.writes:.0%}")
+        for kind, result in results.items():
+            print(f"{kind:<10} {result['rps']:9.1f} req/s   median {result['median']:8.2f} ms   "
+                  f"p95 {result['p95']:8.2f} ms   ошибок {result['errors']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""
+Нагрузочный тест всех эндпоинтов заказов со сравнением с сохраненным эталоном.
+
+На временной БД с заданным количеством блюд, заказов и строк заказов
+по очереди нагружает каждый сценарий: HTML-страницы, AJAX views и
+маршруты DRF. Каждый сценарий выполняется --concurrency потоками
+(у каждого свой тестовый клиент Django и свое соединение с БД),
+пока не будет отправлено --requests запросов. Для сценария выводятся:
+    req/s          - пропускная способность;
+    p50, p95, p99  - задержки в миллисекундах;
+    queries        - среднее число SQL-запросов на один HTTP-запрос
+                     (замер отдельными последовательными запросами);
+    ошибки         - ответы 5xx и исключения.
+
+Запросы обрабатываются в процессе бенчмарка без HTTP-сервера, поэтому
+результаты отражают стоимость views, шаблонов, сериализаторов и БД.
+Поведение под gunicorn и uvicorn измеряет benchmarks.load_ajax.
+
+Эталон:
+    --save-baseline  - сохранить результаты в файл эталона;
+    без флага        - сравнить с эталоном, если файл есть. Регрессией
+                       считается рост p95 или падение req/s больше чем
+                       на --threshold, а также рост числа SQL-запросов
+                       на запрос. При регрессиях код выхода 1.
+Файл эталона по умолчанию - benchmarks/baselines/<СУБД>.json. Задержки
+зависят от машины: эталон сохраняется на той же машине, где сравнивается.
+
+Запуск на SQLite:
+    python -m benchmarks.load_endpoints --orders 10000 --concurrency 8
+На локальном PostgreSQL (параметры подключения DATABASE_* из cafeorders.settings):
+    docker run --rm -d -p 5432:5432 -e POSTGRES_USER=cafeorders -e POSTGRES_PASSWORD=postgres postgres:16
+    DATABASE_ENGINE=postgresql DATABASE_PASSWORD=postgres python -m benchmarks.load_endpoints
+"""
+import argparse
+import io
+import json
+import logging
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+
+from benchmarks.common import (BASE_DIR, setup_django, benchmark_database, seed_items,
+                               seed_orders, percentile)
+
+BASELINES_DIR = BASE_DIR / "benchmarks" / "baselines"
+
+
+class Scenario:
+    """
+    Сценарий нагрузки: один эндпоинт и способ построить запрос к нему.
+
+    Attributes:
+        name (str): Имя сценария в отчете и эталоне.
+        group (str): Группа: html, ajax или api.
+        build (callable): Функция (random.Random, данные) -> (метод, путь, тело).
+        share (float): Доля от --requests для сценария (для тяжелых эндпоинтов).
+    """
+    def __init__(self, name, group, build, share=1.0):
+        self.name = name
+        self.group = group
+        self.build = build
+        self.share = share
+
+
+def get(path):
+    return lambda rnd, data: ("GET", path.format(order=rnd.choice(data["order_ids"]),
+                                                 table=rnd.choice(data["table_numbers"])), None)
+
+
+def change_status(rnd, data):
+    body = json.dumps({"new_status": rnd.choice(["pending", "ready"])})
+    return "PATCH", f"/orders/ajax/change_order_status/{rnd.choice(data['open_order_ids'])}", body
+
+
+SCENARIOS = [
+    Scenario("home", "html", get("/")),
+    Scenario("orders_list", "html", get("/orders/")),
+    Scenario("orders_list_pending", "html", get("/orders/?status=pending")),
+    Scenario("order_detail", "html", get("/orders/order/{order}")),
+    Scenario("create_order_form", "html", get("/orders/order/create_order")),
+    Scenario("search_by_id", "ajax", get("/orders/ajax/search_order/?orderSearchType=by_id"
+                                         "&search_val={order}")),
+    Scenario("search_by_table", "ajax", get("/orders/ajax/search_order/?orderSearchType=by_table"
+                                            "&search_val={table}")),
+    Scenario("search_by_status", "ajax", get("/orders/ajax/search_order/?orderSearchType=by_status"
+                                             "&search_val=ready")),
+    Scenario("revenue", "ajax", get("/orders/ajax/calculate_total_revenue")),
+    Scenario("export_jsonl", "ajax", get("/orders/export/?format=jsonl&status=ready"), share=0.1),
+    Scenario("api_orders", "api", get("/api/orders/")),
+    Scenario("api_order_detail", "api", get("/api/orders/{order}/")),
+    Scenario("api_items", "api", get("/api/items/")),
+    Scenario("api_items_top", "api", get("/api/items/top/")),
+    Scenario("api_analytics", "api", get("/api/analytics/")),
+    Scenario("api_analytics_hourly", "api", get("/api/analytics/hourly/")),
+    Scenario("api_archive", "api", get("/api/archive/orders/")),
+    # Запись идет последней: она сбрасывает кэши чтения
+    Scenario("change_status", "ajax", change_status),
+]
+
+
+def send(client, method, path, body):
+    """
+    Отправляет запрос тестовым клиентом и дочитывает потоковый ответ.
+
+    Returns:
+        int: HTTP-статус ответа.
+    """
+    if method == "GET":
+        response = client.get(path)
+    else:
+        response = client.generic(method, path, body, content_type="application/json")
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response.status_code
+
+
+def count_queries(scenario, data, samples, seed):
+    """
+    Среднее число SQL-запросов на запрос сценария.
+    """
+    from django.db import connections
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client, rnd, counts = Client(), random.Random(seed), []
+    for _ in range(samples):
+        # Запросы считаются во всех БД: чтения могут идти на реплику
+        with ExitStack() as stack:
+            contexts = [stack.enter_context(CaptureQueriesContext(connection))
+                        for connection in connections.all()]
+            send(client, *scenario.build(rnd, data))
+        counts.append(sum(len(context.captured_queries) for context in contexts))
+    return statistics.fmean(counts)
+
+
+def run_scenario(scenario, data, concurrency, requests, seed):
+    """
+    Нагружает сценарий concurrency потоками до отправки requests запросов.
+
+    Returns:
+        dict: req/s, p50/p95/p99 в миллисекундах и количество ошибок.
+    """
+    from django.db import connections
+    from django.test import Client
+
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker(number):
+        nonlocal errors
+        client, rnd = Client(), random.Random(seed + number)
+        own_latencies, own_errors = [], 0
+        try:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        break
+                request = scenario.build(rnd, data)
+                started = time.perf_counter()
+                try:
+                    status = send(client, *request)
+                except Exception:
+                    own_errors += 1
+                    continue
+                own_latencies.append((time.perf_counter() - started) * 1000)
+                if status >= 500:
+                    own_errors += 1
+        finally:
+            connections.close_all()
+        with lock:
+            latencies.extend(own_latencies)
+            errors += own_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed if elapsed else 0,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "errors": errors,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Сравнивает результаты с эталоном.
+
+    Returns:
+        list[str]: Описания регрессий.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result["queries"] > expected["queries"] + 0.5:
+            regressions.append(f"{name}: SQL-запросов {expected['queries']:.1f} -> {result['queries']:.1f}")
+        if expected["p95"] and result["p95"] > expected["p95"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {expected['p95']:.2f} -> {result['p95']:.2f} ms")
+        if expected["rps"] and result["rps"] < expected["rps"] * (1 - threshold):
+            regressions.append(f"{name}: req/s {expected['rps']:.1f} -> {result['rps']:.1f}")
+    return regressions
+
+
+def print_results(results, baseline):
+    print(f"\n{'сценарий':<22} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} "
+          f"{'queries':>8} {'ошибок':>7}   p95 к эталону")
+    for name, result in results.items():
+        expected = baseline.get(name)
+        delta = ""
+        if expected and expected["p95"]:
+            delta = f"{(result['p95'] / expected['p95'] - 1) * 100:+.0f}%"
+        print(f"{name:<22} {result['rps']:9.1f} {result['p50']:9.2f} {result['p95']:9.2f} "
+              f"{result['p99']:9.2f} {result['queries']:8.1f} {result['errors']:7}   {delta}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=30,
+                        help="Количество блюд")
+    parser.add_argument("--orders", type=int, default=10_000,
+                        help="Количество заказов")
+    parser.add_argument("--lines-per-order", type=int, default=3,
+                        help="Количество строк в каждом заказе")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Количество одновременных клиентов")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="Количество запросов на сценарий")
+    parser.add_argument("--query-samples", type=int, default=5,
+                        help="Количество запросов для подсчета SQL-запросов")
+    parser.add_argument("--scenarios", nargs="+", choices=[s.name for s in SCENARIOS],
+                        help="Запустить только эти сценарии")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Отключить кэш (DummyCache), чтобы измерить работу с БД")
+    parser.add_argument("--baseline", type=Path,
+                        help="Файл эталона (по умолчанию benchmarks/baselines/<СУБД>.json)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Сохранить результаты как эталон")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Допустимое ухудшение p95 и req/s относительно эталона")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="Начальное значение генератора случайных чисел")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+    from orders.models import Order
+
+    if args.no_cache:
+        override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+        }).enable()
+
+    # Ответы 4xx не должны засорять отчет предупреждениями
+    logging.getLogger("django.request").setLevel(logging.ERROR)
+    random.seed(args.seed)
+    scenarios = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios]
+    with benchmark_database() as connection:
+        vendor = connection.vendor
+        print(f"Создание {args.items} блюд и {args.orders} заказов "
+              f"по {args.lines_per_order} строки ({vendor})...")
+        items = seed_items(args.items)
+        seed_orders(args.orders, items=items, lines_per_order=min(args.lines_per_order, len(items)))
+        call_command("rebuild_revenue", stdout=io.StringIO())
+        call_command("rebuild_sales_rollups", stdout=io.StringIO())
+        data = {
+            "order_ids": list(Order.objects.values_list("id", flat=True)),
+            "table_numbers": list(Order.objects.values_list("table_number", flat=True)),
+            "open_order_ids": list(Order.objects.active().values_list("id", flat=True)),
+        }
+        connection.close()
+
+        results = {}
+        for scenario in scenarios:
+            requests = max(1, int(args.requests * scenario.share))
+            # Прогрев: кэши, шаблоны, соединения с БД
+            count_queries(scenario, data, 1, args.seed)
+            queries = count_queries(scenario, data, args.query_samples, args.seed)
+            results[scenario.name] = {
+                **run_scenario(scenario, data, args.concurrency, requests, args.seed),
+                "queries": queries,
+            }
+            print(f"  {scenario.group:<5} {scenario.name}: готово")
+
+    baseline_path = args.baseline or BASELINES_DIR / f"{vendor}.json"
+    meta = {"vendor": vendor, "items": args.items, "orders": args.orders,
+            "lines_per_order": args.lines_per_order, "concurrency": args.concurrency,
+            "requests": args.requests, "no_cache": args.no_cache}
+    baseline = {}
+    if not args.save_baseline and baseline_path.exists():
+        stored = json.loads(baseline_path.read_text())
+        baseline = stored["results"]
+        if stored["meta"] != meta:
+            print(f"\nВнимание: эталон {baseline_path} снят с другими параметрами: {stored['meta']}")
+
+    print(f"\nКлиентов: {args.concurrency}, запросов на сценарий: {args.requests}, "
+          f"кэш: {'выключен' if args.no_cache else 'включен'}")
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps({"meta": meta, "results": results},
+                                            indent=2, ensure_ascii=False) + "\n")
+        print(f"\nЭталон сохранен: {baseline_path}")
+        return 0
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("\nРегрессии относительно эталона:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nРегрессий относительно эталона нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
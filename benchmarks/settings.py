@@ -0,0 +1,15 @@
+"""
+Настройки для серверов, запускаемых нагрузочными тестами (benchmarks.load_ajax).
+
+Отличаются от cafeorders.settings отключенным DEBUG (не копится лог запросов)
+и БД, путь к которой передается в переменной окружения BENCHMARK_DB.
+"""
+import os
+
+from cafeorders.settings import *  # noqa: F401,F403
+from cafeorders.settings import DATABASES
+
+DEBUG = False
+ALLOWED_HOSTS = ["127.0.0.1", "localhost"]
+
+DATABASES["default"]["NAME"] = os.environ["BENCHMARK_DB"]
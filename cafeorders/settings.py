@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 load_dotenv()
 
@@ -46,9 +47,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Метрики запросов и заголовок Server-Timing (включаются ORDERS_METRICS)
+    'orders.metrics.MetricsMiddleware',
+    # Поиск N+1 и медленных SQL-запросов (включается ORDERS_QUERY_GUARD)
+    'orders.queryguard.QueryGuardMiddleware',
+    # Чтение с реплик и закрепление клиента за основной БД после записи
+    'orders.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Ответ 304 по заголовкам ETag / Last-Modified ответа (orders.cache.conditional_view)
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -79,16 +88,108 @@ WSGI_APPLICATION = 'cafeorders.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-        'TEST': {
-            'NAME': BASE_DIR / "orders/tests" / 'test_db.sqlite3'
+# DATABASE_ENGINE=sqlite (по умолчанию) - файл БД для установки на одной машине,
+# DATABASE_ENGINE=postgresql - для продакшена с несколькими воркерами.
+
+DATABASE_ENGINE = os.getenv("DATABASE_ENGINE", "sqlite")
+
+if DATABASE_ENGINE == "postgresql":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv("DATABASE_NAME", "cafeorders"),
+            'USER': os.getenv("DATABASE_USER", "cafeorders"),
+            'PASSWORD': os.getenv("DATABASE_PASSWORD", ""),
+            'HOST': os.getenv("DATABASE_HOST", "127.0.0.1"),
+            'PORT': os.getenv("DATABASE_PORT", "5432"),
+            # Постоянные соединения: поток переиспользует соединение CONN_MAX_AGE
+            # секунд и проверяет его перед первым запросом (CONN_HEALTH_CHECKS)
+            'CONN_MAX_AGE': int(os.getenv("DATABASE_CONN_MAX_AGE", 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.getenv("DATABASE_POOL", "0") == "1":
+        # Пул соединений psycopg (пакет psycopg[pool]), общий для потоков процесса.
+        # Нужен под ASGI, где постоянные соединения не переиспользуются.
+        # С пулом Django требует CONN_MAX_AGE = 0
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv("DATABASE_POOL_MIN_SIZE", 2)),
+            'max_size': int(os.getenv("DATABASE_POOL_MAX_SIZE", 10)),
+            'timeout': float(os.getenv("DATABASE_POOL_TIMEOUT", 10)),
+        }
+elif DATABASE_ENGINE == "sqlite":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv("DATABASE_NAME", BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {},
+            'TEST': {
+                'NAME': BASE_DIR / "orders/tests" / 'test_db.sqlite3'
+            }
+        }
+    }
+    if os.getenv("SQLITE_TUNED", "1") == "1":
+        DATABASES['default']['OPTIONS'] = {
+            # WAL: чтение не блокируется записью, запись не ждет читателей.
+            # synchronous=NORMAL в режиме WAL не теряет целостность при сбое,
+            # но не вызывает fsync на каждую транзакцию
+            'init_command': "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL",
+            # Сколько секунд ждать, пока другое соединение освободит запись (busy timeout)
+            'timeout': float(os.getenv("SQLITE_BUSY_TIMEOUT", 20)),
+            # Транзакция сразу берет блокировку записи. Иначе при повышении блокировки
+            # с чтения до записи SQLite отвечает "database is locked", не дожидаясь timeout
+            'transaction_mode': 'IMMEDIATE',
         }
+else:
+    raise ImproperlyConfigured("DATABASE_ENGINE: sqlite или postgresql")
+
+# Реплика для чтения списков, поиска и отчетов (orders.routers). Без DATABASE_REPLICA_HOST
+# и DATABASE_REPLICA_NAME указывает на основную БД - так можно проверить маршрутизацию
+# локально. В тестах реплика - зеркало основной тестовой БД.
+# Чтение с реплики включается DATABASE_REPLICA=1
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': os.getenv("DATABASE_REPLICA_NAME", DATABASES['default']['NAME']),
+    'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+    'TEST': {'MIRROR': 'default'},
+}
+if DATABASE_ENGINE == "postgresql":
+    DATABASES['replica']['HOST'] = os.getenv("DATABASE_REPLICA_HOST", DATABASES['default']['HOST'])
+    DATABASES['replica']['PORT'] = os.getenv("DATABASE_REPLICA_PORT", DATABASES['default']['PORT'])
+
+DATABASE_ROUTERS = ['orders.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# По умолчанию кэш в памяти процесса. Для нескольких процессов укажите общий
+# бэкенд: CACHE_BACKEND=redis|memcached|file и адрес в CACHE_LOCATION.
+# В кэше хранятся версии страниц (orders.cache) и каталога меню
+# (orders.catalogue): в кэше процесса изменения, сделанные одним воркером,
+# не видны остальным до перезапуска.
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[os.getenv("CACHE_BACKEND", "locmem")],
+        'LOCATION': os.getenv("CACHE_LOCATION", "cafeorders"),
+        'TIMEOUT': int(os.getenv("CACHE_TIMEOUT", 300)),
     }
 }
 
+# Количество процессов сервера (эту же переменную читают gunicorn и uvicorn).
+# При нескольких процессах и кэше в памяти процесса manage.py check
+# выдает предупреждение orders.W001.
+ORDERS_WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -136,6 +237,53 @@ MEDIA_ROOT = BASE_DIR / 'media/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Pagination
+# Размер страницы списков заказов (HTML и API) и его верхняя граница
+
+ORDERS_PAGE_SIZE = int(os.getenv("ORDERS_PAGE_SIZE", 50))
+ORDERS_MAX_PAGE_SIZE = int(os.getenv("ORDERS_MAX_PAGE_SIZE", 200))
+# Максимальное количество заказов в одном запросе пакетного создания
+ORDERS_BULK_MAX_SIZE = int(os.getenv("ORDERS_BULK_MAX_SIZE", 500))
+
+# Через сколько часов после оплаты заказ переносится в архив (команда archive_orders)
+ORDERS_ARCHIVE_AFTER_HOURS = float(os.getenv("ORDERS_ARCHIVE_AFTER_HOURS", 24))
+
+# Количество заказов в одной порции потоковой выгрузки (orders.export)
+ORDERS_EXPORT_CHUNK_SIZE = int(os.getenv("ORDERS_EXPORT_CHUNK_SIZE", 2000))
+
+# Асинхронные версии AJAX views (orders.async_views) для запуска под ASGI.
+# Выключены по умолчанию: на SQLite они дают около половины пропускной
+# способности синхронных views (benchmarks.load_ajax).
+ORDERS_ASYNC_VIEWS = os.getenv("ORDERS_ASYNC_VIEWS", "0") == "1"
+
+# Брокер событий заказов для потока SSE (orders.broadcast):
+# local - в пределах процесса, cache - через общий бэкенд кэша
+ORDERS_EVENTS_BROKER = os.getenv("ORDERS_EVENTS_BROKER", "local")
+# Период отправки keepalive в потоке событий, секунд
+ORDERS_EVENTS_KEEPALIVE = int(os.getenv("ORDERS_EVENTS_KEEPALIVE", 15))
+
+# Метрики запросов (orders.metrics): эндпоинт /metrics в формате Prometheus
+# и заголовок Server-Timing. Выключены - middleware не подключается
+ORDERS_METRICS = os.getenv("ORDERS_METRICS", "0") == "1"
+
+# Проверка SQL-запросов каждого запроса (orders.queryguard): в лог orders.queries
+# пишутся запросы одной формы, выполненные больше MAX_REPEATS раз (N+1),
+# и запросы дольше ORDERS_SLOW_QUERY_MS миллисекунд
+ORDERS_QUERY_GUARD = os.getenv("ORDERS_QUERY_GUARD", "0") == "1"
+ORDERS_QUERY_GUARD_MAX_REPEATS = int(os.getenv("ORDERS_QUERY_GUARD_MAX_REPEATS", 5))
+ORDERS_SLOW_QUERY_MS = float(os.getenv("ORDERS_SLOW_QUERY_MS", 200))
+
+# Реплики, с которых читают списки, поиск и отчеты (orders.routers), и сколько
+# секунд после изменяющего запроса клиент читает из основной БД (read-your-writes)
+ORDERS_REPLICA_DATABASES = ["replica"] if os.getenv("DATABASE_REPLICA", "0") == "1" else []
+ORDERS_REPLICA_PIN_SECONDS = int(os.getenv("ORDERS_REPLICA_PIN_SECONDS", 5))
+ORDERS_REPLICA_PIN_COOKIE = "orders_primary"
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'orders.pagination.IdCursorPagination',
+}
+
+
 # LOGGING = {
 #     'version': 1,
 #     'disable_existing_loggers': False,
@@ -1,11 +1,22 @@
 from django.contrib import admin
-from orders.models import Item, Order
+from orders.models import Item, Order, OrderLine
+from orders.signals import recalculate_orders
 
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
     pass
 
 
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 1
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    pass
+    inlines = [OrderLineInline]
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Строки из inline сохраняются по одной, минуя сигнал m2m_changed
+        recalculate_orders([form.instance.pk])
@@ -22,16 +22,20 @@ class AjaxResponse:
             "message": message
         }, status=400)
 
-    def success_request(self, message: str, link: Optional[str] = None) -> JsonResponse:
+    def success_request(self, message: str, link: Optional[str] = None,
+                        data: Optional[dict] = None) -> JsonResponse:
         """
         Возвращает успешный JSON-ответ с сообщением (message).
-        Опционально возвращает ссылку (link).
+        Опционально возвращает ссылку (link) и новое состояние объекта (data).
         """
-        return JsonResponse({
+        content = {
             "success": True,
             "message": message,
             "link": link
-        })
+        }
+        if data is not None:
+            content["data"] = data
+        return JsonResponse(content)
 
     def not_found(self, message: str) -> JsonResponse:
         """
@@ -42,6 +46,17 @@ class AjaxResponse:
             "message": message
         }, status=404)
 
+    def conflict(self, message: str, data: dict) -> JsonResponse:
+        """
+        Возвращает ответ с кодом 409 (Conflict): объект изменен другим запросом.
+        В data передается текущее состояние объекта для повторной попытки.
+        """
+        return JsonResponse({
+            "success": False,
+            "message": message,
+            "data": data
+        }, status=409)
+
 ajax_response = AjaxResponse()
 
 
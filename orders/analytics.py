@@ -0,0 +1,454 @@
+"""
+Аналитика продаж по часовым агрегатам (SalesRollup, ItemSalesRollup).
+
+Агрегаты обновляются вместе с заказами из обработчиков сигналов
+(orders.signals):
+    - при оплате заказа его сумма и строки добавляются в час оплаты,
+      при выходе из статуса "paid" - вычитаются выражениями
+      UPDATE ... SET x = x + delta;
+    - после исправления оплаченного заказа (изменение блюд, удаление)
+      час его оплаты пересчитывается по заказам этого часа.
+
+Отчеты за любой период суммируют строки агрегатов: их число ограничено
+количеством часов периода, умноженным на число столов или блюд,
+и не зависит от количества заказов.
+
+Отчет о самых продаваемых блюдах (top_items) фильтруется по статусу
+и времени создания заказа, поэтому считается не по агрегатам, а
+сгруппированным запросом по строкам текущих заказов вместе со строками
+архивных заказов (ArchivedOrder.lines), а его ответ кэшируется до
+изменения заказов.
+"""
+import datetime
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from orders.catalogue import item_catalogue
+from orders.models import (ArchivedOrder, ItemSalesRollup, LINE_TOTAL, Order, OrderLine,
+                           SalesRollup)
+from orders.revenue import parse_day
+
+HOUR = datetime.timedelta(hours=1)
+
+
+def hour_start(moment: datetime.datetime) -> datetime.datetime:
+    """
+    Возвращает начало часа (UTC), в агрегат которого попадает момент времени.
+    """
+    return moment.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _increment(model, lookup: dict, **deltas):
+    """
+    Увеличивает поля строки агрегата выражением UPDATE ... SET x = x + delta.
+    Если строки еще нет, создает ее.
+    """
+    rows = model.objects.filter(**lookup)
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if rows.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        rows.update(**updates)
+
+
+def _apply(states: list, sign: int):
+    """
+    Добавляет (sign=1) или вычитает (sign=-1) оплаченные заказы из агрегатов.
+
+    Строки заказов читаются одним запросом, затем выполняется по одному
+    UPDATE на каждую затронутую пару (час, стол) и (час, блюдо).
+
+    Args:
+        states (list): Кортежи (ID заказа, номер стола, сумма, время оплаты).
+        sign (int): 1 или -1.
+    """
+    hours = {}
+    tables = {}
+    for pk, table_number, total_price, paid_at in states:
+        if paid_at is None:
+            continue
+        hour = hours[pk] = hour_start(paid_at)
+        count, amount = tables.get((hour, table_number), (0, Decimal(0)))
+        tables[(hour, table_number)] = (count + sign, amount + sign * total_price)
+    if not hours:
+        return
+
+    items = {}
+    for order_id, item_id, quantity, unit_price in (
+        OrderLine.objects.filter(order_id__in=hours)
+        .values_list("order_id", "item_id", "quantity", "unit_price")
+    ):
+        key = (hours[order_id], item_id)
+        sold, amount = items.get(key, (0, Decimal(0)))
+        items[key] = (sold + sign * quantity, amount + sign * quantity * (unit_price or 0))
+
+    with transaction.atomic():
+        for (hour, table_number), (count, amount) in tables.items():
+            _increment(SalesRollup, {"hour": hour, "table_number": table_number},
+                       orders_count=count, revenue=amount)
+        for (hour, item_id), (quantity, amount) in items.items():
+            _increment(ItemSalesRollup, {"hour": hour, "item_id": item_id},
+                       quantity=quantity, revenue=amount)
+
+
+def _state(order: Order) -> tuple:
+    return order.pk, order.table_number, order.total_price, order.paid_at
+
+
+def _saved_state(order: Order) -> tuple:
+    saved_state = order.saved_state
+    return (order.pk, saved_state.get("table_number", order.table_number),
+            saved_state.get("total_price", order.total_price), saved_state.get("paid_at"))
+
+
+def add_paid_orders(orders: Iterable[Order]):
+    """
+    Учитывает в агрегатах новые оплаченные заказы.
+    """
+    _apply([_state(order) for order in orders if order.status == "paid"], 1)
+
+
+def on_orders_changed(orders: Iterable[Order]):
+    """
+    Учитывает в агрегатах смену статуса, суммы, стола или времени оплаты заказов:
+    прежнее оплаченное состояние (saved_state) вычитается, новое добавляется.
+
+    Строки заказа при этом не меняются, поэтому для обоих состояний
+    используются текущие строки.
+    """
+    orders = list(orders)
+    _apply([_saved_state(order) for order in orders
+            if order.saved_state.get("status") == "paid"], -1)
+    _apply([_state(order) for order in orders if order.status == "paid"], 1)
+
+
+def refresh_hours(hours: Iterable[datetime.datetime]):
+    """
+    Пересчитывает агрегаты указанных часов по заказам этих часов.
+    """
+    for hour in sorted(set(hours)):
+        rebuild_rollups(hour, hour + HOUR)
+
+
+def refresh_orders(orders: Iterable[Order]):
+    """
+    Пересчитывает час оплаты оплаченных заказов, строки которых изменились.
+    """
+    refresh_hours(hour_start(order.paid_at) for order in orders
+                  if order.status == "paid" and order.paid_at is not None)
+
+
+def refresh_order_pks(order_pks: Iterable[int]):
+    """
+    Пересчитывает час оплаты заказов по ID, если они оплачены.
+    """
+    refresh_hours(
+        hour_start(paid_at) for paid_at in
+        Order.objects.filter(pk__in=list(order_pks), status="paid", paid_at__isnull=False)
+        .values_list("paid_at", flat=True)
+    )
+
+
+def rebuild_rollups(start: Optional[datetime.datetime] = None,
+                    end: Optional[datetime.datetime] = None) -> int:
+    """
+    Пересобирает агрегаты за период [start, end) по оплаченным заказам,
+    текущим и перенесенным в архив.
+
+    Args:
+        start (datetime, optional): Начало периода (начало часа).
+        end (datetime, optional): Конец периода (начало часа, не включается).
+
+    Returns:
+        int: Количество записанных строк агрегата по столам.
+    """
+    period = {}
+    if start is not None:
+        period["paid_at__gte"] = start
+    if end is not None:
+        period["paid_at__lt"] = end
+    utc = datetime.timezone.utc
+
+    tables = {}
+    for hour, table_number, count, amount in (
+        Order.objects.filter(status="paid", paid_at__isnull=False, **period)
+        .annotate(hour=TruncHour("paid_at", tzinfo=utc))
+        .order_by().values("hour", "table_number")
+        .annotate(orders_count=Count("id"), amount=Sum("total_price"))
+        .values_list("hour", "table_number", "orders_count", "amount")
+    ):
+        tables[(hour, table_number)] = (count, amount)
+
+    items = {}
+    line_period = {f"order__{lookup}": value for lookup, value in period.items()}
+    for hour, item_id, quantity, amount in (
+        OrderLine.objects.filter(order__status="paid", order__paid_at__isnull=False, **line_period)
+        .annotate(hour=TruncHour("order__paid_at", tzinfo=utc))
+        .order_by().values("hour", "item_id")
+        .annotate(sold=Sum("quantity"), amount=Sum(LINE_TOTAL))
+        .values_list("hour", "item_id", "sold", "amount")
+    ):
+        items[(hour, item_id)] = (quantity, amount or Decimal(0))
+
+    # Строки архивных заказов хранятся в JSON и суммируются здесь
+    for paid_at, table_number, total_price, lines in (
+        ArchivedOrder.objects.filter(status="paid", paid_at__isnull=False, **period)
+        .values_list("paid_at", "table_number", "total_price", "lines")
+        .iterator(chunk_size=2000)
+    ):
+        hour = hour_start(paid_at)
+        count, amount = tables.get((hour, table_number), (0, Decimal(0)))
+        tables[(hour, table_number)] = (count + 1, amount + total_price)
+        for item_id, quantity, unit_price in lines:
+            sold, amount = items.get((hour, item_id), (0, Decimal(0)))
+            items[(hour, item_id)] = (sold + quantity,
+                                      amount + quantity * Decimal(unit_price or 0))
+
+    rollup_period = {lookup.replace("paid_at", "hour"): value for lookup, value in period.items()}
+    with transaction.atomic():
+        SalesRollup.objects.filter(**rollup_period).delete()
+        ItemSalesRollup.objects.filter(**rollup_period).delete()
+        SalesRollup.objects.bulk_create([
+            SalesRollup(hour=hour, table_number=table_number, orders_count=count, revenue=amount)
+            for (hour, table_number), (count, amount) in tables.items()
+        ])
+        ItemSalesRollup.objects.bulk_create([
+            ItemSalesRollup(hour=hour, item_id=item_id, quantity=quantity, revenue=amount)
+            for (hour, item_id), (quantity, amount) in items.items()
+        ])
+    return len(tables)
+
+
+def parse_moment(value: str, end: bool = False) -> Optional[datetime.datetime]:
+    """
+    Разбирает границу периода: дату YYYY-MM-DD или дату и время в формате ISO 8601.
+
+    Дата означает начало дня по местному времени, для конца периода
+    (end=True) - начало следующего дня, то есть день включается в период.
+
+    Returns:
+        datetime | None: Момент времени или None, если формат неверный.
+    """
+    day = parse_day(value)
+    if day is not None:
+        if end:
+            day += datetime.timedelta(days=1)
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    else:
+        try:
+            moment = parse_datetime(value)
+        except ValueError:
+            moment = None
+        if moment is None:
+            return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_period(start: Optional[str], end: Optional[str]) -> tuple:
+    """
+    Разбирает период отчета [start, end) с точностью до часа агрегатов:
+    начало округляется вниз, конец - вверх до начала часа.
+    По умолчанию - текущий день.
+
+    Returns:
+        tuple: (начало, конец) в UTC.
+
+    Raises:
+        ValueError: Граница периода в неверном формате или начало позже конца.
+    """
+    today = timezone.localdate().isoformat()
+    start_moment = parse_moment(start or today)
+    end_moment = parse_moment(end or today, end=True)
+    if start_moment is None or end_moment is None:
+        raise ValueError("Период задается датами YYYY-MM-DD или временем YYYY-MM-DDTHH:MM")
+    start_hour = hour_start(start_moment)
+    end_hour = hour_start(end_moment)
+    if end_hour < end_moment:
+        end_hour += HOUR
+    if start_hour >= end_hour:
+        raise ValueError("Начало периода должно быть раньше конца")
+    return start_hour, end_hour
+
+
+def _table_rows(start: datetime.datetime, end: datetime.datetime):
+    return SalesRollup.objects.filter(hour__gte=start, hour__lt=end).order_by()
+
+
+def _item_rows(start: datetime.datetime, end: datetime.datetime):
+    return ItemSalesRollup.objects.filter(hour__gte=start, hour__lt=end).order_by()
+
+
+def summary(start: datetime.datetime, end: datetime.datetime) -> dict:
+    """
+    Выручка, количество оплаченных заказов и проданных блюд за период.
+    """
+    totals = _table_rows(start, end).aggregate(revenue=Sum("revenue"),
+                                               orders_count=Sum("orders_count"))
+    items_sold = _item_rows(start, end).aggregate(quantity=Sum("quantity"))["quantity"]
+    return {
+        "revenue": totals["revenue"] or Decimal(0),
+        "orders_count": totals["orders_count"] or 0,
+        "items_sold": items_sold or 0,
+    }
+
+
+def revenue_by_hour(start: datetime.datetime, end: datetime.datetime) -> list:
+    """
+    Выручка и количество оплаченных заказов по часам периода.
+    """
+    return list(
+        _table_rows(start, end).values("hour")
+        .annotate(revenue=Sum("revenue"), orders_count=Sum("orders_count"))
+        .order_by("hour")
+    )
+
+
+def revenue_by_day(start: datetime.datetime, end: datetime.datetime) -> list:
+    """
+    Выручка и количество оплаченных заказов по дням периода (местное время).
+    """
+    return list(
+        _table_rows(start, end)
+        .annotate(day=TruncDate("hour", tzinfo=timezone.get_current_timezone()))
+        .values("day")
+        .annotate(revenue=Sum("revenue"), orders_count=Sum("orders_count"))
+        .order_by("day")
+    )
+
+
+def revenue_by_table(start: datetime.datetime, end: datetime.datetime) -> list:
+    """
+    Выручка и количество оплаченных заказов по столам, по убыванию выручки.
+    """
+    return list(
+        _table_rows(start, end).values("table_number")
+        .annotate(revenue=Sum("revenue"), orders_count=Sum("orders_count"))
+        .order_by("-revenue", "table_number")
+    )
+
+
+def sales_by_item(start: datetime.datetime, end: datetime.datetime) -> list:
+    """
+    Количество и выручка проданных блюд, по убыванию выручки.
+    Названия блюд берутся из каталога меню (orders.catalogue).
+    """
+    rows = list(
+        _item_rows(start, end).values("item_id")
+        .annotate(quantity=Sum("quantity"), revenue=Sum("revenue"))
+        .filter(quantity__gt=0)
+        .order_by("-revenue", "item_id")
+    )
+    items = item_catalogue.get_many(row["item_id"] for row in rows)
+    for row in rows:
+        item = items.get(row["item_id"])
+        row["name"] = item.name if item is not None else None
+    return rows
+
+
+# Сортировки отчета top_items
+TOP_ITEMS_ORDERING = {
+    "quantity": ("-quantity", "-revenue", "item_id"),
+    "revenue": ("-revenue", "-quantity", "item_id"),
+}
+
+
+def _archived_item_sales(status: Optional[str], start: Optional[datetime.datetime],
+                         end: Optional[datetime.datetime]) -> dict:
+    """
+    Продажи блюд по строкам архивных заказов.
+
+    Строки архива хранятся в JSON, поэтому суммируются в Python порциями:
+    время растет с количеством архивных заказов периода.
+
+    Returns:
+        dict[int, dict]: ID блюда и его количество, число заказов и выручка.
+    """
+    orders = ArchivedOrder.objects.all()
+    if status is not None:
+        orders = orders.filter(status=status)
+    if start is not None:
+        orders = orders.filter(created_at__gte=start)
+    if end is not None:
+        orders = orders.filter(created_at__lt=end)
+    sales = {}
+    for lines in orders.values_list("lines", flat=True).iterator(chunk_size=2000):
+        for item_id, quantity, unit_price in lines:
+            row = sales.setdefault(item_id, {"quantity": 0, "orders_count": 0,
+                                             "revenue": Decimal(0)})
+            row["quantity"] += quantity
+            row["orders_count"] += 1
+            row["revenue"] += quantity * Decimal(unit_price or 0)
+    return sales
+
+
+def top_items(limit: int, status: Optional[str] = None,
+              start: Optional[datetime.datetime] = None,
+              end: Optional[datetime.datetime] = None,
+              ordering: str = "quantity") -> list:
+    """
+    Самые продаваемые блюда по строкам текущих и архивных заказов.
+
+    Строки текущих заказов суммируются одним запросом с группировкой
+    по блюду (GROUP BY item_id), строки архива - _archived_item_sales.
+    Архив хранит только оплаченные заказы, поэтому для других статусов
+    не читается.
+
+    Args:
+        limit (int): Количество блюд в отчете.
+        status (str, optional): Учитывать только заказы с этим статусом.
+        start (datetime, optional): Заказы, созданные не раньше этого момента.
+        end (datetime, optional): Заказы, созданные раньше этого момента.
+        ordering (str): "quantity" - по количеству, "revenue" - по выручке.
+
+    Returns:
+        list: Словари {"item_id", "name", "quantity", "orders_count", "revenue"}.
+    """
+    lines = OrderLine.objects.all()
+    if status is not None:
+        lines = lines.filter(order__status=status)
+    if start is not None:
+        lines = lines.filter(order__created_at__gte=start)
+    if end is not None:
+        lines = lines.filter(order__created_at__lt=end)
+    rows = {
+        row["item_id"]: row for row in
+        lines.order_by().values("item_id", name=F("item__name"))
+        # Выручка считается первой: аннотация quantity заменяет одноименное
+        # поле в выражении LINE_TOTAL
+        .annotate(revenue=Coalesce(Sum(LINE_TOTAL), Decimal(0)),
+                  quantity=Sum("quantity"),
+                  orders_count=Count("order_id"))
+    }
+
+    if status in (None, Order.CLOSED_STATUS):
+        archived = _archived_item_sales(status, start, end)
+        # Названия блюд, которых нет в текущих заказах, берутся из каталога меню
+        missing = [pk for pk in archived if pk not in rows]
+        items = item_catalogue.get_many(missing) if missing else {}
+        for item_id, sales in archived.items():
+            if item_id in rows:
+                row = rows[item_id]
+                for field, value in sales.items():
+                    row[field] += value
+            else:
+                item = items.get(item_id)
+                rows[item_id] = {"item_id": item_id,
+                                 "name": item.name if item is not None else None, **sales}
+
+    def sort_key(row):
+        return tuple(-row[field[1:]] if field.startswith("-") else row[field]
+                     for field in TOP_ITEMS_ORDERING[ordering])
+
+    return sorted(rows.values(), key=sort_key)[:limit]
@@ -1,9 +1,21 @@
+from django.db import transaction
+from django.http import Http404
+from django.utils.decorators import method_decorator
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
-from orders.models import Order, Item
-from orders.serializers import ItemSerializer, OrderSerializer
+from orders import analytics
+from orders.cache import (cache_view, conditional_view, items_versions, orders_list_versions,
+                          set_conditional_headers)
+from orders.conditional import (item_validators, items_list_validators,
+                                order_validators, orders_list_validators)
+from orders.pagination import get_page_size
+from orders.catalogue import item_catalogue
+from orders.models import (ArchivedOrder, Order, Item, InvalidStatusTransition,
+                           OrderVersionConflict)
+from orders.serializers import (ArchivedOrderSerializer, BulkStatusSerializer, ItemSerializer,
+                                OrderSerializer)
 
 
 class OrderViewSet(viewsets.ModelViewSet):
@@ -12,42 +24,165 @@ class OrderViewSet(viewsets.ModelViewSet):
 
     Поддерживает стандартные операции CRUD (создание, чтение, обновление, удаление)
     для модели Order. Также предоставляет кастомное действие для изменения статуса заказа.
+    Ответы list и retrieve поддерживают условные запросы (ETag, Last-Modified).
+    Изменения записываются с проверкой версии заказа (поле version): если заказ
+    изменен другим запросом, возвращается ответ 409 с его текущим состоянием.
 
     Attributes:
-        queryset (QuerySet): Набор всех заказов.
+        queryset (QuerySet): Набор всех заказов с подгруженными блюдами.
         serializer_class (OrderSerializer): Сериализатор для модели Order.
     """
-    queryset = Order.objects.all()
+    queryset = Order.objects.for_list()
     serializer_class = OrderSerializer
 
+    @method_decorator(conditional_view(orders_list_validators))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(conditional_view(order_validators))
+    def retrieve(self, request, *args, **kwargs):
+        order = self.get_object()
+        response = Response(self.get_serializer(order).data)
+        return set_conditional_headers(response, last_modified=order.last_modified)
+
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except OrderVersionConflict as conflict:
+            return self.conflict_response(conflict.order.pk)
+
+    def conflict_response(self, pk):
+        """
+        Ответ 409 с текущим состоянием заказа, изменения которого не записаны.
+
+        Raises:
+            Http404: Заказ удален другим запросом.
+        """
+        order = self.get_queryset().filter(pk=pk).first()
+        if order is None:
+            raise Http404
+        return Response({"error": "Order was modified by another request",
+                         "current": self.get_serializer(order).data},
+                        status=status.HTTP_409_CONFLICT)
+
+    @action(detail=False, methods=['post'])
+    def bulk_create(self, request):
+        """
+        Создает несколько заказов одним запросом.
+
+        Заказы проверяются вместе (включая уникальность номеров столов
+        внутри пакета) и записываются в одной транзакции пакетными INSERT.
+        Если хотя бы один заказ не прошел проверку, не создается ни один.
+
+        Args:
+            request (Request): Объект запроса со списком заказов.
+
+        Returns:
+            Response: Список созданных заказов или ошибки по каждому заказу.
+
+        Examples:
+            Пример запроса:
+            POST /api/orders/bulk_create/
+            [
+                {"table_number": 21, "items": [1, 2]},
+                {"table_number": 22, "lines": [{"item": 3, "quantity": 2}]}
+            ]
+        """
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        orders = serializer.save()
+        created = self.get_queryset().filter(pk__in=[order.pk for order in orders])
+        return Response(self.get_serializer(created, many=True).data,
+                        status=status.HTTP_201_CREATED)
+
     @action(detail=True, methods=['post'])
     def change_status(self, request, pk=None):
         """
-        Изменяет статус заказа.
+        Изменяет статус заказа по графу переходов Order.STATUS_TRANSITIONS.
 
         Args:
-            request (Request): Объект запроса, содержащий новый статус.
+            request (Request): Объект запроса, содержащий новый статус
+                и, необязательно, версию заказа, которую видел клиент.
             pk (int, optional): ID заказа. По умолчанию None.
 
         Returns:
-            Response: JSON-ответ с сообщением об успешном обновлении статуса
-            или ошибкой, если статус недопустим.
+            Response: JSON-ответ с сообщением об успешном обновлении статуса,
+            ошибкой, если статус, переход или версия недопустимы, или ответ 409
+            с текущим состоянием, если заказ изменен другим запросом.
 
         Examples:
             Пример запроса:
             POST /api/orders/1/change_status/
             {
-                "status": "paid"
+                "status": "paid",
+                "version": 3
             }
         """
         order = self.get_object()
         new_status = request.data.get('status')
-        if new_status not in dict(Order.STATUS_CHOICES).keys():
+        if new_status not in Order.STATUS_LABELS:
             return Response({"error": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST)
+        version = request.data.get('version')
+        if version is not None:
+            if type(version) is not int:
+                return Response({"error": "Invalid version"}, status=status.HTTP_400_BAD_REQUEST)
+            order.version = version
+
+        try:
+            order.transition_to(new_status)
+        except InvalidStatusTransition:
+            return Response({"error": "Invalid status transition",
+                             "allowed": sorted(Order.STATUS_TRANSITIONS[order.status])},
+                            status=status.HTTP_400_BAD_REQUEST)
+        except OrderVersionConflict:
+            return self.conflict_response(order.pk)
+        return Response({"message": "Status updated successfully", "version": order.version})
+
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        """
+        Переводит несколько заказов в новый статус одним UPDATE.
+
+        Записываются только поля status и paid_at. Заказы, для которых переход
+        не разрешен графом Order.STATUS_TRANSITIONS, не изменяются.
+
+        Args:
+            request (Request): Объект запроса со списком ID заказов и новым статусом.
+
+        Returns:
+            Response: Результат для каждого ID: "updated" - статус изменен,
+            "unchanged" - заказ уже в этом статусе, "not_allowed" - переход
+            не разрешен, "not_found" - заказа нет.
+
+        Examples:
+            Пример запроса:
+            POST /api/orders/bulk_status/
+            {
+                "ids": [1, 2, 3],
+                "status": "paid"
+            }
+        """
+        serializer = BulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        new_status = serializer.validated_data['status']
+
+        with transaction.atomic():
+            updated = {order.pk for order in
+                       Order.objects.filter(pk__in=ids).change_status(new_status)}
+            current = dict(Order.objects.filter(pk__in=ids).values_list('pk', 'status'))
 
-        order.status = new_status
-        order.save()
-        return Response({"message": "Status updated successfully"})
+        results = {}
+        for pk in ids:
+            if pk in updated:
+                results[pk] = "updated"
+            elif pk not in current:
+                results[pk] = "not_found"
+            elif current[pk] == new_status:
+                results[pk] = "unchanged"
+            else:
+                results[pk] = "not_allowed"
+        return Response({"status": new_status, "results": results})
 
 
 class ItemViewSet(viewsets.ModelViewSet):
@@ -55,11 +190,171 @@ class ItemViewSet(viewsets.ModelViewSet):
     ViewSet для управления блюдами.
 
     Поддерживает стандартные операции CRUD (создание, чтение, обновление, удаление)
-    для модели Item.
+    для модели Item. Ответы list и retrieve кэшируются до изменения меню,
+    retrieve читает блюдо из каталога меню процесса (orders.catalogue).
 
     Attributes:
         queryset (QuerySet): Набор всех блюд.
         serializer_class (ItemSerializer): Сериализатор для модели Item.
+        replica_actions (frozenset): Действия, читающие с реплики БД (orders.routers).
     """
     queryset = Item.objects.all()
-    serializer_class = ItemSerializer
\ No newline at end of file
+    serializer_class = ItemSerializer
+    replica_actions = frozenset({"list", "retrieve", "top"})
+
+    @method_decorator(conditional_view(items_list_validators))
+    @method_decorator(cache_view(version_keys=items_versions))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(conditional_view(item_validators))
+    @method_decorator(cache_view(version_keys=items_versions))
+    def retrieve(self, request, *args, **kwargs):
+        item = item_catalogue.get(kwargs[self.lookup_field])
+        if item is None:
+            raise Http404
+        return Response(self.get_serializer(item).data)
+
+    @method_decorator(conditional_view(orders_list_validators))
+    @method_decorator(cache_view(version_keys=orders_list_versions))
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        """
+        Самые продаваемые блюда: количество, число заказов и выручка.
+
+        Считается по строкам текущих заказов одним запросом с группировкой
+        и по строкам архивных заказов (orders.analytics.top_items). Ответ
+        кэшируется до изменения заказов или меню.
+
+        Args:
+            request (Request): Объект запроса с необязательными параметрами:
+                limit - количество блюд (по умолчанию ORDERS_PAGE_SIZE),
+                status - статус заказов,
+                start, end - период создания заказов (YYYY-MM-DD, конец включительно),
+                ordering - "quantity" (по умолчанию) или "revenue".
+
+        Returns:
+            Response: Блюда в поле results или ошибка, если параметры неверные.
+
+        Examples:
+            Пример запроса:
+            GET /api/items/top/?limit=5&status=paid&start=2025-01-01&end=2025-01-31
+        """
+        params = request.query_params
+        order_status = params.get('status')
+        if order_status is not None and order_status not in Order.STATUS_LABELS:
+            return Response({"error": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST)
+        ordering = params.get('ordering', 'quantity')
+        if ordering not in analytics.TOP_ITEMS_ORDERING:
+            return Response({"error": "Invalid ordering"}, status=status.HTTP_400_BAD_REQUEST)
+        period = {}
+        for name, end in (('start', False), ('end', True)):
+            if params.get(name):
+                period[name] = analytics.parse_moment(params[name], end=end)
+                if period[name] is None:
+                    return Response({"error": f"Invalid {name}"},
+                                    status=status.HTTP_400_BAD_REQUEST)
+
+        results = analytics.top_items(get_page_size(params.get('limit')), status=order_status,
+                                      ordering=ordering, **period)
+        return Response({"results": results})
+
+
+class ArchivedOrderViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet для чтения архива заказов (заказы, перенесенные командой archive_orders).
+
+    Список фильтруется по номеру стола параметром table_number.
+
+    Attributes:
+        queryset (QuerySet): Набор всех архивных заказов.
+        serializer_class (ArchivedOrderSerializer): Сериализатор для модели ArchivedOrder.
+    """
+    queryset = ArchivedOrder.objects.all()
+    serializer_class = ArchivedOrderSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        table_number = self.request.query_params.get('table_number')
+        if table_number is not None:
+            if not table_number.isdecimal():
+                return queryset.none()
+            queryset = queryset.filter(table_number=table_number)
+        return queryset
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """
+    ViewSet отчетов о продажах за период.
+
+    Отчеты суммируют часовые агрегаты продаж (orders.analytics) и не читают
+    заказы, поэтому время ответа не зависит от количества заказов.
+    Период задается параметрами start и end: датами YYYY-MM-DD (конец
+    включительно) или временем YYYY-MM-DDTHH:MM с точностью до часа.
+    По умолчанию - текущий день.
+
+    Examples:
+        GET /api/analytics/?start=2025-01-01&end=2025-01-31
+        GET /api/analytics/daily/?start=2025-01-01&end=2025-01-31
+        GET /api/analytics/hourly/?start=2025-01-23
+        GET /api/analytics/items/?start=2025-01-01&end=2025-01-31
+        GET /api/analytics/tables/?start=2025-01-01&end=2025-01-31
+
+    Все отчеты читают с реплики БД (orders.routers).
+    """
+    replica_actions = frozenset({"list", "hourly", "daily", "items", "tables"})
+
+    def report_response(self, request, report):
+        """
+        Ответ с периодом и результатом отчета или ошибка 400, если период неверный.
+
+        Args:
+            request (Request): Объект запроса с параметрами start и end.
+            report (Callable): Функция отчета из orders.analytics.
+
+        Returns:
+            Response: Итоги отчета (словарь) или строки отчета в поле results.
+        """
+        try:
+            start, end = analytics.parse_period(request.query_params.get('start'),
+                                                request.query_params.get('end'))
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        data = report(start, end)
+        if isinstance(data, list):
+            data = {"results": data}
+        return Response({"start": start, "end": end, **data})
+
+    def list(self, request):
+        """
+        Итоги за период: выручка, количество оплаченных заказов и проданных блюд.
+        """
+        return self.report_response(request, analytics.summary)
+
+    @action(detail=False, methods=['get'])
+    def hourly(self, request):
+        """
+        Выручка и количество оплаченных заказов по часам.
+        """
+        return self.report_response(request, analytics.revenue_by_hour)
+
+    @action(detail=False, methods=['get'])
+    def daily(self, request):
+        """
+        Выручка и количество оплаченных заказов по дням (местное время).
+        """
+        return self.report_response(request, analytics.revenue_by_day)
+
+    @action(detail=False, methods=['get'])
+    def items(self, request):
+        """
+        Количество и выручка проданных блюд, по убыванию выручки.
+        """
+        return self.report_response(request, analytics.sales_by_item)
+
+    @action(detail=False, methods=['get'])
+    def tables(self, request):
+        """
+        Выручка и количество оплаченных заказов по столам, по убыванию выручки.
+        """
+        return self.report_response(request, analytics.revenue_by_table)
@@ -7,4 +7,5 @@ class OrdersConfig(AppConfig):
     verbose_name = "Заказы"
 
     def ready(self):
+        import orders.checks
         import orders.signals
@@ -0,0 +1,111 @@
+"""
+Перенос закрытых заказов в архив (ArchivedOrder).
+
+Таблица Order остается небольшой: списки, поиск и API читают только
+текущие заказы, а оплаченные заказы переносятся в архив пакетами
+командой archive_orders (запускается по расписанию).
+
+Перенос не является удалением заказа: выручка, журнал событий и рассылка
+событий не изменяются, поэтому строки удаляются в обход сигналов
+post_delete. Сбрасывается только кэш страниц заказов.
+"""
+import datetime
+from typing import Optional
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from orders.cache import invalidate_orders
+from orders.models import ArchivedOrder, Order, OrderLine
+
+
+def delete_orders(order_pks: list):
+    """
+    Удаляет заказы одним DELETE без сигналов и каскадов ORM.
+
+    Заказ не удаляется, а переносится, поэтому QuerySet.delete() не подходит:
+    его сигналы pre_delete/post_delete уменьшили бы выручку, записали
+    удаление в журнал событий и разослали его экранам. Каскады не нужны:
+    строки заказов (OrderLine) удаляются до вызова, других ссылок на Order нет.
+    """
+    quote_name = connection.ops.quote_name
+    placeholders = ", ".join(["%s"] * len(order_pks))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote_name(Order._meta.db_table)} "
+            f"WHERE {quote_name(Order._meta.pk.column)} IN ({placeholders})",
+            order_pks,
+        )
+
+
+def archive_batch(cutoff: datetime.datetime, batch_size: int) -> int:
+    """
+    Переносит в архив один пакет закрытых заказов, оплаченных до cutoff.
+
+    Одна транзакция: выборка заказов (строки, уже заблокированные другим
+    процессом архивации, пропускаются), их строк, INSERT в архив
+    и DELETE строк и заказов.
+
+    Returns:
+        int: Количество перенесенных заказов.
+    """
+    with transaction.atomic():
+        orders = list(
+            Order.objects
+            .filter(Q(paid_at__lt=cutoff) | Q(paid_at__isnull=True),
+                    status=Order.CLOSED_STATUS)
+            .order_by("id")
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not orders:
+            return 0
+        order_pks = [order.pk for order in orders]
+
+        lines = {}
+        for order_id, item_id, quantity, unit_price in (
+            OrderLine.objects.filter(order_id__in=order_pks)
+            .order_by("id").values_list("order_id", "item_id", "quantity", "unit_price")
+        ):
+            lines.setdefault(order_id, []).append([item_id, quantity, unit_price])
+
+        now = timezone.now()
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(id=order.pk, table_number=order.table_number,
+                          total_price=order.total_price, status=order.status,
+                          paid_at=order.paid_at, created_at=order.created_at,
+                          updated_at=order.updated_at,
+                          archived_at=now, lines=lines.get(order.pk, []))
+            for order in orders
+        ])
+        OrderLine.objects.filter(order_id__in=order_pks).delete()
+        delete_orders(order_pks)
+        invalidate_orders(order_pks)
+    return len(orders)
+
+
+def archive_closed_orders(older_than: datetime.timedelta, batch_size: int = 1000,
+                          max_batches: Optional[int] = None) -> int:
+    """
+    Переносит в архив все закрытые заказы, оплаченные раньше чем older_than назад.
+
+    Каждый пакет переносится в отдельной транзакции, чтобы не держать
+    блокировки на время всего переноса.
+
+    Args:
+        older_than (timedelta): Сколько времени заказ остается в таблице после оплаты.
+        batch_size (int): Количество заказов в одном пакете.
+        max_batches (int, optional): Ограничение количества пакетов за запуск.
+
+    Returns:
+        int: Количество перенесенных заказов.
+    """
+    cutoff = timezone.now() - older_than
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(cutoff, batch_size)
+        archived += count
+        batches += 1
+        if count < batch_size:
+            break
+    return archived
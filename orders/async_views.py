@@ -0,0 +1,158 @@
+"""
+Асинхронные версии AJAX views для запуска под ASGI-сервером.
+
+Под ASGI синхронная view выполняется через адаптер sync_to_async в общем
+потоке (thread_sensitive), и все такие запросы процесса выстраиваются
+в очередь к нему. Эти views обращаются к БД через асинхронный API ORM
+(aget, acount, adelete, Order.atransition_to) и не занимают поток на время запроса.
+
+Проверка параметров, запросы поиска и тексты ответов общие с синхронными
+views из orders.views. Какие views подключаются в urls, определяет
+настройка ORDERS_ASYNC_VIEWS (по умолчанию выключена).
+"""
+from django.http import HttpRequest
+from django.http.response import HttpResponseNotAllowed
+
+from orders import export
+from orders.ajax_responses import ajax_response
+from orders.models import InvalidStatusTransition, OrderVersionConflict
+from orders.revenue import aget_revenue_counter
+from orders.routers import use_replica
+from orders.views import (DeleteOrderView, UpdateOrderView, SearchOrderView,
+                          export_response, parse_revenue_day, revenue_response)
+
+
+class AsyncDeleteOrderView(DeleteOrderView):
+    """
+    Асинхронная view для удаления заказа.
+    """
+    async def delete(self, request: HttpRequest, order_pk: int, *args, **kwargs):
+        """
+        Обрабатывает DELETE-запрос для удаления заказа.
+
+        Args:
+            request (HttpRequest): Объект запроса Django.
+            order_pk (int): ID заказа для удаления.
+
+        Returns:
+            JsonResponse: JSON-ответ с результатом операции.
+        """
+        try:
+            order = await self.model.objects.aget(pk=order_pk)
+        except self.model.DoesNotExist:
+            return ajax_response.not_found(
+                message="Заказ не найден"
+            )
+
+        await order.adelete()
+        return self.deleted_response(order_pk)
+
+
+class AsyncUpdateOrderView(UpdateOrderView):
+    """
+    Асинхронная view для изменения статуса заказа.
+    """
+    async def patch(self, request: HttpRequest, order_pk):
+        """
+        Обрабатывает PATCH-запрос для изменения статуса заказа.
+
+        Args:
+            request (HttpRequest): Объект запроса Django.
+            order_pk (int): ID заказа для обновления.
+
+        Returns:
+            JsonResponse: JSON-ответ с результатом операции.
+        """
+        parsed = self.parse_request(request)
+        if parsed is None:
+            return ajax_response.bad_request()
+        new_status, version = parsed
+
+        try:
+            order = await self.model.objects.aget(pk=order_pk)
+        except self.model.DoesNotExist:
+            return ajax_response.not_found(
+                message="Заказ не найден"
+            )
+        if version is not None:
+            order.version = version
+        try:
+            await order.atransition_to(new_status)
+        except InvalidStatusTransition as error:
+            return self.not_allowed_transition_response(error)
+        except OrderVersionConflict:
+            return self.conflict_response(await self.model.objects.filter(pk=order_pk).afirst())
+        return self.updated_response(order)
+
+
+class AsyncSearchOrderView(SearchOrderView):
+    """
+    Асинхронная view для поиска заказов по ID, номеру стола или статусу.
+    """
+    async def get(self, request: HttpRequest, *args, **kwargs):
+        """
+        Обрабатывает GET-запрос для поиска заказов.
+
+        Args:
+            request (HttpRequest): Объект запроса Django.
+
+        Returns:
+            JsonResponse: JSON-ответ с результатами поиска или ошибкой.
+        """
+        search, error_response = self.build_search(request)
+        if error_response:
+            return error_response
+
+        if search.count_queryset is not None:
+            return self.status_count_response(search.value, await search.count_queryset.acount())
+        for queryset in search.candidates:
+            order = await queryset.afirst()
+            if order is not None:
+                return self.order_found_response(order)
+        return ajax_response.not_found(search.not_found_message)
+
+
+@use_replica
+async def async_calculate_total_revenue(request: HttpRequest):
+    """
+    Асинхронная версия calculate_total_revenue.
+
+    Args:
+        request (HttpRequest): Объект запроса Django.
+
+    Returns:
+        JsonResponse: JSON-ответ с суммой выручки или ошибкой.
+    """
+    if request.method != "GET":
+        return ajax_response.bad_request()
+
+    day, error_response = parse_revenue_day(request)
+    if error_response:
+        return error_response
+
+    amount, updated_at = await aget_revenue_counter(day=day)
+    return revenue_response(day, amount, updated_at)
+
+
+async def async_export_orders(request: HttpRequest):
+    """
+    Асинхронная версия export_orders.
+
+    Под ASGI синхронный итератор ответа был бы прочитан целиком
+    до отправки, поэтому выгрузка отдается асинхронным итератором,
+    который читает каждую порцию заказов через sync_to_async.
+
+    Args:
+        request (HttpRequest): Объект запроса Django.
+
+    Returns:
+        StreamingHttpResponse: Файл выгрузки.
+        JsonResponse: Ошибка 400, если параметры некорректны.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(permitted_methods=["GET"])
+    try:
+        query, export_format = export.parse_params(request.GET)
+    except ValueError as error:
+        return ajax_response.bad_request_with_message(str(error))
+    return export_response(export.astream(query, export_format), export_format)
@@ -0,0 +1,237 @@
+"""
+Рассылка событий заказов подключенным экранам (Server-Sent Events).
+
+События (создание заказа, смена статуса, удаление) публикуются из сигналов
+моделей после фиксации транзакции и раздаются всем подписчикам процесса
+через EventHub. Подписчики - потоки SSE (views.order_events), каждый со своей
+ограниченной очередью в event loop ASGI-сервера.
+
+Между процессами события передает брокер (настройка ORDERS_EVENTS_BROKER):
+    local - только в пределах процесса (один воркер, тесты);
+    cache - через общий бэкенд кэша (Redis, Memcached): события записываются
+            под последовательными номерами, а каждый процесс с подписчиками
+            опрашивает счетчик и раздает новые события своему EventHub.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+EVENTS_SEQ_KEY = "orders:events:seq"
+
+
+def event_key(seq: int) -> str:
+    """
+    Ключ события с номером seq в общем кэше.
+    """
+    return f"orders:events:{seq}"
+
+
+class Subscription:
+    """
+    Очередь событий одного подписчика.
+
+    При переполнении (медленный клиент) старые события отбрасываются,
+    чтобы один подписчик не задерживал рассылку остальным.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def put(self, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+
+class EventHub:
+    """
+    Раздача событий всем подписчикам процесса.
+
+    publish() можно вызывать из любого потока: события передаются в event
+    loop подписчиков одним вызовом call_soon_threadsafe на каждый loop,
+    а не на каждого подписчика.
+    """
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscriptions)
+
+    @asynccontextmanager
+    async def subscribe(self):
+        """
+        Подписывает текущую корутину на события до выхода из контекста.
+
+        Yields:
+            Subscription: Очередь событий подписчика.
+        """
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        get_broker().on_subscribe(self)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscriptions.discard(subscription)
+
+    def publish(self, event: dict):
+        """
+        Передает событие всем подписчикам процесса.
+        """
+        with self._lock:
+            by_loop = {}
+            for subscription in self._subscriptions:
+                by_loop.setdefault(subscription.loop, []).append(subscription)
+
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver, subscriptions, event)
+            except RuntimeError:
+                # Event loop уже закрыт
+                with self._lock:
+                    self._subscriptions.difference_update(subscriptions)
+
+    @staticmethod
+    def _deliver(subscriptions, event):
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+class LocalBroker:
+    """
+    Брокер в пределах процесса: события сразу передаются EventHub.
+    """
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+        self._ids = itertools.count(1)
+
+    def publish(self, event: dict):
+        self.hub.publish({**event, "id": next(self._ids)})
+
+    def on_subscribe(self, hub: EventHub):
+        pass
+
+
+class CacheBroker:
+    """
+    Брокер через общий бэкенд кэша для нескольких процессов.
+
+    Attributes:
+        poll_interval (float): Период опроса новых событий, секунд.
+        timeout (int): Время хранения события в кэше, секунд.
+        max_batch (int): Сколько последних событий раздается за один опрос,
+            если процесс отстал (остальные пропускаются).
+    """
+    poll_interval = 0.5
+    timeout = 60
+    max_batch = 100
+
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+        self._listener = None
+
+    def publish(self, event: dict):
+        try:
+            seq = cache.incr(EVENTS_SEQ_KEY)
+        except ValueError:
+            cache.add(EVENTS_SEQ_KEY, 0, timeout=None)
+            seq = cache.incr(EVENTS_SEQ_KEY)
+        cache.set(event_key(seq), {**event, "id": seq}, self.timeout)
+
+    def on_subscribe(self, hub: EventHub):
+        # Один опрашивающий кэш task на процесс, пока есть подписчики
+        if self._listener is None or self._listener.done():
+            # Номер последнего события читается сразу, чтобы подписчик получил
+            # события, опубликованные до первого опроса
+            last_seq = cache.get(EVENTS_SEQ_KEY) or 0
+            self._listener = asyncio.get_running_loop().create_task(self.listen(last_seq))
+
+    async def listen(self, last_seq: int):
+        while self.hub.has_subscribers():
+            seq = await cache.aget(EVENTS_SEQ_KEY) or 0
+            if seq > last_seq:
+                keys = [event_key(number) for number in
+                        range(max(last_seq + 1, seq - self.max_batch + 1), seq + 1)]
+                events = await cache.aget_many(keys)
+                for key in keys:
+                    if key in events:
+                        self.hub.publish(events[key])
+                last_seq = seq
+            await asyncio.sleep(self.poll_interval)
+
+
+BROKERS = {
+    "local": LocalBroker,
+    "cache": CacheBroker,
+}
+
+hub = EventHub()
+_broker = None
+
+
+def get_broker():
+    """
+    Возвращает брокер событий, выбранный настройкой ORDERS_EVENTS_BROKER.
+    """
+    global _broker
+    broker_class = BROKERS[settings.ORDERS_EVENTS_BROKER]
+    if not isinstance(_broker, broker_class):
+        _broker = broker_class(hub)
+    return _broker
+
+
+def order_payload(order) -> dict:
+    """
+    Данные заказа для события.
+    """
+    return {
+        "id": order.pk,
+        "table_number": order.table_number,
+        "status": order.status,
+        "status_display": order.get_status_display(),
+        "total_price": str(order.total_price),
+        "version": order.version,
+    }
+
+
+def publish_order_event(event_type: str, order):
+    """
+    Публикует событие заказа после фиксации текущей транзакции.
+
+    Args:
+        event_type (str): Тип события: "order_created",
+            "order_status_changed" или "order_deleted".
+        order (Order): Заказ. Данные берутся сразу, до фиксации транзакции.
+    """
+    event = {"type": event_type, "order": order_payload(order)}
+    transaction.on_commit(lambda: get_broker().publish(event))
+
+
+def format_sse(event: dict) -> str:
+    """
+    Форматирует событие для потока text/event-stream.
+    """
+    data = json.dumps(event["order"], ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+def matches(event: dict, order_pk: Optional[int]) -> bool:
+    """
+    Проверяет, относится ли событие к заказу order_pk (None - к любому).
+    """
+    return order_pk is None or event["order"]["id"] == order_pk
@@ -0,0 +1,263 @@
+"""
+Кэширование страниц, инвалидация по версиям и условные GET-запросы.
+
+Каждая кэшируемая страница зависит от набора ключей версий (список заказов,
+конкретный заказ, меню). Версии входят в ключ кэша страницы, поэтому для
+инвалидации достаточно увеличить версию: старые записи перестают читаться
+и вытесняются по таймауту. Версии хранятся в том же бэкенде кэша (CACHES),
+так что при общем бэкенде (Redis, Memcached) инвалидация видна всем процессам.
+С кэшем в памяти процесса (locmem) у каждого воркера свои версии, поэтому
+при нескольких воркерах нужен общий бэкенд (проверка orders.W001).
+"""
+import asyncio
+import hashlib
+import time
+from functools import wraps
+from typing import Callable, Iterable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import (get_cache_key, get_conditional_response,
+                                learn_cache_key, patch_vary_headers)
+from django.utils.http import http_date
+
+from orders import metrics
+from orders.routers import is_replica_read
+
+ORDERS_VERSION_KEY = "orders:version"
+ITEMS_VERSION_KEY = "items:version"
+
+
+def order_version_key(order_pk) -> str:
+    """
+    Ключ версии отдельного заказа.
+    """
+    return f"orders:version:{order_pk}"
+
+
+def get_versions(keys: Iterable[str]) -> list:
+    """
+    Возвращает текущие версии для ключей одним обращением к кэшу.
+    Отсутствующие версии создаются.
+    """
+    keys = list(keys)
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Начальная версия по времени не совпадает с версиями,
+            # которые могли остаться в кэше до вытеснения ключа
+            cache.add(key, time.time_ns())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump_versions(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns())
+
+
+def bump_versions(*keys: str):
+    """
+    Увеличивает версии ключей.
+
+    Версии увеличиваются сразу (чтобы изменения были видны внутри текущей
+    транзакции) и повторно после фиксации транзакции, чтобы отбросить
+    страницы, закэшированные параллельными запросами до фиксации.
+    """
+    _bump_versions(keys)
+    transaction.on_commit(lambda: _bump_versions(keys))
+
+
+def invalidate_orders(order_pks: Iterable[int] = ()):
+    """
+    Инвалидирует списки заказов и страницы указанных заказов.
+    """
+    bump_versions(ORDERS_VERSION_KEY, *(order_version_key(pk) for pk in order_pks))
+
+
+def invalidate_items():
+    """
+    Инвалидирует все страницы, на которых отображаются блюда.
+    """
+    bump_versions(ITEMS_VERSION_KEY)
+
+
+def orders_list_versions(request, *args, **kwargs) -> list:
+    return [ORDERS_VERSION_KEY, ITEMS_VERSION_KEY]
+
+
+def order_detail_versions(request, order_pk=None, *args, pk=None, **kwargs) -> list:
+    return [order_version_key(order_pk or pk), ITEMS_VERSION_KEY]
+
+
+def items_versions(request, *args, **kwargs) -> list:
+    return [ITEMS_VERSION_KEY]
+
+
+def _can_cache(request, response) -> bool:
+    """
+    Проверяет, можно ли сохранить ответ в кэш.
+
+    Страницы с CSRF-токеном кэшируются только для клиентов, у которых уже есть
+    CSRF cookie, и отдельно для каждого значения cookie (Vary: Cookie).
+    """
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    if "private" in response.get("Cache-Control", ""):
+        return False
+    if request.META.get("CSRF_COOKIE_NEEDS_UPDATE"):
+        # Токен на странице действителен, только если он выпущен
+        # для секрета из cookie, уже сохраненной у клиента
+        csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+        if settings.CSRF_USE_SESSIONS or request.META.get("CSRF_COOKIE") != csrf_cookie:
+            return False
+        patch_vary_headers(response, ("Cookie",))
+    return True
+
+
+def cache_view(version_keys: Optional[Callable] = None, timeout: Optional[int] = None):
+    """
+    Декоратор кэширования GET-ответов view.
+
+    Args:
+        version_keys (callable, optional): Функция (request, *args, **kwargs),
+            возвращающая ключи версий, от которых зависит страница.
+        timeout (int, optional): Время жизни записи. По умолчанию TIMEOUT из CACHES.
+
+    Для class-based views используется вместе с method_decorator.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            versions = get_versions(version_keys(request, *args, **kwargs)) if version_keys else []
+            key_prefix = "views:" + ".".join(str(version) for version in versions)
+            cache_timeout = timeout if timeout is not None else cache.default_timeout
+
+            cache_key = get_cache_key(request, key_prefix, "GET", cache=cache)
+            # Клиент, закрепленный за основной БД после записи, не должен получить
+            # страницу, построенную по отстающей реплике
+            if cache_key is not None and not getattr(request, "replica_pinned", False):
+                response = cache.get(cache_key)
+                if response is not None:
+                    metrics.record_cache(hit=True)
+                    return response
+            metrics.record_cache(hit=False)
+
+            response = view(request, *args, **kwargs)
+
+            def store(response):
+                if _can_cache(request, response):
+                    store_timeout = cache_timeout
+                    if is_replica_read(request):
+                        # Страница могла быть построена до того, как реплика получила
+                        # изменение, увеличившее версию: храним ее не дольше окна
+                        # закрепления за основной БД
+                        store_timeout = min(cache_timeout, settings.ORDERS_REPLICA_PIN_SECONDS)
+                    cache_key = learn_cache_key(request, response, store_timeout,
+                                                key_prefix, cache=cache)
+                    cache.set(cache_key, response, store_timeout)
+
+            if hasattr(response, "render") and callable(response.render):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+            return response
+        return wrapper
+    return decorator
+
+
+def make_etag(*parts) -> str:
+    """
+    Строит ETag из частей состояния ресурса (ID, версии, время изменения).
+    """
+    digest = hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def set_conditional_headers(response, etag: Optional[str] = None, last_modified=None):
+    """
+    Добавляет к успешному ответу заголовки ETag и Last-Modified, если их еще нет.
+    По ним ConditionalGetMiddleware отвечает 304 на повторные запросы.
+    """
+    if response.status_code == 200:
+        if etag and not response.has_header("ETag"):
+            response["ETag"] = etag
+        if last_modified and not response.has_header("Last-Modified"):
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def conditional_view(validators: Callable):
+    """
+    Декоратор условных GET-запросов (If-None-Match, If-Modified-Since).
+
+    Args:
+        validators (callable): Функция (request, *args, **kwargs), возвращающая
+            пару (ETag, время изменения) для запрошенного ресурса. Любое значение
+            может быть None. Функция должна быть дешевле самой view, например
+            строить ETag по версиям из кэша без обращения к БД.
+
+    Если ресурс не изменился, возвращается 304 без вызова view, иначе
+    ответ view дополняется заголовками ETag и Last-Modified. Время изменения,
+    которое известно только после загрузки данных, view выставляет сама
+    (set_conditional_headers), а If-Modified-Since по нему проверяет
+    ConditionalGetMiddleware.
+    Поддерживает синхронные и асинхронные views, для class-based views
+    используется вместе с method_decorator.
+    """
+    def check(request, etag, last_modified):
+        return get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return await view(request, *args, **kwargs)
+                etag, last_modified = await sync_to_async(validators)(request, *args, **kwargs)
+                response = check(request, etag, last_modified)
+                if response is not None:
+                    return response
+                if is_replica_read(request):
+                    etag = None
+                return set_conditional_headers(await view(request, *args, **kwargs),
+                                               etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            etag, last_modified = validators(request, *args, **kwargs)
+            response = check(request, etag, last_modified)
+            if response is not None:
+                return response
+            if is_replica_read(request):
+                # ETag по версиям не защищает от отставания реплики: клиент получал бы
+                # 304 на устаревшую страницу до следующего изменения
+                etag = None
+            return set_conditional_headers(view(request, *args, **kwargs), etag, last_modified)
+        return wrapper
+    return decorator
+
+
+def versions_validators(version_keys: Callable) -> Callable:
+    """
+    Валидаторы для страниц, зависящих от ключей версий (списки):
+    ETag строится из версий без обращения к БД, времени изменения нет.
+    """
+    def validators(request, *args, **kwargs):
+        return make_etag(*get_versions(version_keys(request, *args, **kwargs))), None
+    return validators
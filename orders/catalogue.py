@@ -0,0 +1,90 @@
+"""
+Каталог блюд (меню), закэшированный в памяти процесса.
+
+Меню меняется несколько раз в день, а читается при каждом открытии формы
+заказа, проверке ID блюд в API и запросе списка блюд. Каталог загружается
+одним запросом и хранится в процессе вместе с версией меню из общего кэша
+(orders.cache.ITEMS_VERSION_KEY). Сохранение или удаление блюда увеличивает
+версию, и каждый процесс перечитывает каталог при следующем обращении.
+Для этого кэш должен быть общим для процессов: с locmem изменение меню
+видно только процессу, в котором оно сделано (проверка orders.W001).
+"""
+import threading
+from typing import Iterable, Optional
+
+from django.db import DEFAULT_DB_ALIAS
+
+from orders.cache import ITEMS_VERSION_KEY, get_versions
+from orders.models import Item
+
+
+class ItemCatalogue:
+    """
+    Каталог блюд с проверкой версии при каждом обращении.
+
+    Возвращаемые объекты Item общие для всех потоков процесса,
+    их нельзя изменять и сохранять.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._items = {}
+
+    def _get_items(self) -> dict:
+        version = get_versions([ITEMS_VERSION_KEY])[0]
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    # Каталог живет в процессе до изменения меню, поэтому читается
+                    # из основной БД, а не с реплики, которая может отставать
+                    self._items = {item.pk: item for item in
+                                   Item.objects.db_manager(DEFAULT_DB_ALIAS).order_by("pk")}
+                    self._version = version
+        return self._items
+
+    def all(self) -> list:
+        """
+        Возвращает все блюда в порядке ID.
+        """
+        return list(self._get_items().values())
+
+    def get(self, pk) -> Optional[Item]:
+        """
+        Возвращает блюдо по ID или None, если такого блюда нет.
+        """
+        try:
+            return self._get_items().get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def get_many(self, pks: Iterable) -> dict:
+        """
+        Возвращает найденные блюда по списку ID в виде {ID: Item}.
+        """
+        items = self._get_items()
+        found = {}
+        for pk in pks:
+            try:
+                item = items.get(int(pk))
+            except (TypeError, ValueError):
+                continue
+            if item is not None:
+                found[item.pk] = item
+        return found
+
+    def choices(self) -> list:
+        """
+        Варианты выбора блюд для форм: [(ID, название и стоимость)].
+        """
+        return [(item.pk, str(item)) for item in self.all()]
+
+    def clear(self):
+        """
+        Сбрасывает каталог процесса. Следующее обращение перечитает меню из БД.
+        """
+        with self._lock:
+            self._version = None
+            self._items = {}
+
+
+item_catalogue = ItemCatalogue()
@@ -0,0 +1,32 @@
+"""
+Системные проверки настроек заказов (manage.py check).
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Бэкенды кэша, данные которых видны только своему процессу
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Проверяет, что при нескольких процессах сервера кэш общий.
+
+    Версии страниц (orders.cache) и каталога меню (orders.catalogue)
+    хранятся в кэше default. В кэше процесса изменение заказа или меню,
+    сделанное одним воркером, не видно остальным до перезапуска.
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.ORDERS_WORKERS > 1 and backend in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            f"Кэш default ({backend}) хранится в памяти процесса, а процессов "
+            f"сервера {settings.ORDERS_WORKERS}: страницы заказов и меню "
+            f"в других процессах не инвалидируются.",
+            hint="Задайте общий бэкенд: CACHE_BACKEND=redis|memcached|file и CACHE_LOCATION.",
+            id="orders.W001",
+        )]
+    return []
@@ -0,0 +1,25 @@
+"""
+Валидаторы условных GET-запросов (ETag, Last-Modified) для orders.cache.conditional_view.
+
+Каждая функция принимает аргументы view и возвращает пару (ETag, время изменения),
+не выполняя саму view и не обращаясь к БД: списки и заказы проверяются
+по версиям из кэша (те же, что инвалидируют закэшированные страницы),
+блюда - по каталогу меню.
+"""
+from orders.cache import (make_etag, versions_validators, orders_list_versions,
+                          order_detail_versions, items_versions)
+from orders.catalogue import item_catalogue
+
+orders_list_validators = versions_validators(orders_list_versions)
+order_validators = versions_validators(order_detail_versions)
+items_list_validators = versions_validators(items_versions)
+
+
+def item_validators(request, *args, pk=None, **kwargs):
+    """
+    ETag и время изменения блюда из каталога меню.
+    """
+    item = item_catalogue.get(pk)
+    if item is None:
+        return None, None
+    return make_etag("item", item.pk, item.updated_at.isoformat()), item.updated_at
@@ -0,0 +1,227 @@
+"""
+Журнал событий заказов (только добавление) и восстановление состояния по нему.
+
+События записываются из обработчиков сигналов моделей (orders.signals)
+в одной транзакции с изменением заказа: создание, изменение полей, смена
+статуса, изменение блюд и удаление. Несколько событий одного изменения
+(пакетное создание, пакетная смена статуса) записываются одним INSERT.
+
+Данные события - компактный JSON только с изменившимися полями:
+    created - {"table_number", "status", "total_price", ["paid_at"], "lines"}
+    updated - изменившиеся поля из SNAPSHOT_FIELDS
+    status  - {"status", "paid_at"}
+    lines   - {"upsert": строки, "remove": ID блюд, "clear": true,
+               "lines": все строки заказа, "total_price"}
+    deleted - {}
+Строка заказа записывается списком [ID блюда, количество, цена за единицу].
+
+replay() проходит события по порядку до заданного момента и возвращает
+состояние заказов на этот момент (команда replay_order_events).
+"""
+import datetime
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from orders.models import Order, OrderEvent, OrderLine
+
+# Поля заказа, изменения которых записываются в журнал
+SNAPSHOT_FIELDS = ("table_number", "status", "total_price", "paid_at")
+
+
+def _line(item_id, quantity, unit_price) -> list:
+    return [item_id, quantity, unit_price]
+
+
+def _fields(order: Order, fields: Iterable[str]) -> dict:
+    return {field: getattr(order, field) for field in fields}
+
+
+def record(events: list):
+    """
+    Записывает события одним INSERT.
+    """
+    if events:
+        OrderEvent.objects.bulk_create(events)
+
+
+def record_created(orders: Iterable[Order], lines: Iterable[OrderLine] = ()):
+    """
+    Записывает создание заказов вместе с их строками.
+    """
+    lines_by_order = {}
+    for line in lines:
+        lines_by_order.setdefault(line.order_id, []).append(
+            _line(line.item_id, line.quantity, line.unit_price)
+        )
+    now = timezone.now()
+    events = []
+    for order in orders:
+        payload = _fields(order, ("table_number", "status", "total_price"))
+        if order.paid_at is not None:
+            payload["paid_at"] = order.paid_at
+        payload["lines"] = lines_by_order.get(order.pk, [])
+        events.append(OrderEvent(order_id=order.pk, type=OrderEvent.CREATED,
+                                 created_at=now, payload=payload))
+    record(events)
+
+
+def record_saved(order: Order, created: bool, update_fields=None):
+    """
+    Записывает сохранение заказа через Order.save().
+
+    Для существующего заказа записываются только сохраненные поля
+    (update_fields), смена статуса записывается событием status.
+    """
+    if created:
+        record_created([order])
+        return
+    fields = [field for field in SNAPSHOT_FIELDS
+              if update_fields is None or field in update_fields]
+    status_only = set(fields) <= {"status", "paid_at"}
+    if status_only and order.status != order.saved_state.get("status"):
+        event_type = OrderEvent.STATUS_CHANGED
+    else:
+        event_type = OrderEvent.UPDATED
+    record([OrderEvent(order_id=order.pk, type=event_type,
+                       payload=_fields(order, fields))])
+
+
+def record_status_changed(orders: Iterable[Order]):
+    """
+    Записывает смену статуса заказов (Order.transition_to, OrderQuerySet.change_status).
+    """
+    now = timezone.now()
+    record([
+        OrderEvent(order_id=order.pk, type=OrderEvent.STATUS_CHANGED, created_at=now,
+                   payload=_fields(order, ("status", "paid_at")))
+        for order in orders
+    ])
+
+
+def record_lines_changed(order: Order, upserted: Iterable = (), removed: Iterable[int] = (),
+                         clear: bool = False):
+    """
+    Записывает изменение строк заказа и его новую сумму.
+
+    Args:
+        order (Order): Заказ с новой суммой.
+        upserted: Новые и изменившиеся строки: OrderLine или
+            кортежи (ID блюда, количество, цена за единицу).
+        removed: ID блюд удаленных строк.
+        clear (bool): Удалены все строки заказа.
+    """
+    payload = {}
+    upserted = [
+        _line(line.item_id, line.quantity, line.unit_price)
+        if isinstance(line, OrderLine) else _line(*line)
+        for line in upserted
+    ]
+    if upserted:
+        payload["upsert"] = upserted
+    if removed:
+        payload["remove"] = sorted(removed)
+    if clear:
+        payload["clear"] = True
+    payload["total_price"] = order.total_price
+    record([OrderEvent(order_id=order.pk, type=OrderEvent.LINES_CHANGED, payload=payload)])
+
+
+def record_lines_snapshot(order_pks: Iterable[int]):
+    """
+    Записывает все строки и сумму заказов после изменения, затронувшего
+    несколько заказов сразу (блюдо добавлено в заказы или удалено из них,
+    строки изменены в админке). Два запроса и один INSERT.
+    """
+    order_pks = list(order_pks)
+    if not order_pks:
+        return
+    snapshots = {
+        pk: {"lines": [], "total_price": total_price}
+        for pk, total_price in Order.objects.filter(pk__in=order_pks).values_list("pk", "total_price")
+    }
+    lines = (OrderLine.objects.filter(order_id__in=snapshots)
+             .order_by("id").values_list("order_id", "item_id", "quantity", "unit_price"))
+    for order_id, *line in lines:
+        snapshots[order_id]["lines"].append(_line(*line))
+    now = timezone.now()
+    record([
+        OrderEvent(order_id=pk, type=OrderEvent.LINES_CHANGED, created_at=now, payload=payload)
+        for pk, payload in snapshots.items()
+    ])
+
+
+def record_deleted(order: Order):
+    """
+    Записывает удаление заказа.
+    """
+    record([OrderEvent(order_id=order.pk, type=OrderEvent.DELETED)])
+
+
+def apply_event(orders: dict, order_id: int, event_type: str, payload: dict):
+    """
+    Применяет событие к состоянию заказов {ID заказа: состояние}.
+
+    Состояние заказа - словарь полей SNAPSHOT_FIELDS и строк
+    "lines" {ID блюда: (количество, цена за единицу)}.
+    """
+    if event_type == OrderEvent.DELETED:
+        orders.pop(order_id, None)
+        return
+    if event_type == OrderEvent.CREATED:
+        orders[order_id] = {"table_number": None, "status": None,
+                            "total_price": Decimal(0), "paid_at": None, "lines": {}}
+    state = orders.get(order_id)
+    if state is None:
+        # Заказ создан до начала журнала
+        return
+
+    for field in SNAPSHOT_FIELDS:
+        if field in payload:
+            state[field] = payload[field]
+    if isinstance(state["total_price"], str):
+        state["total_price"] = Decimal(state["total_price"])
+    if isinstance(state["paid_at"], str):
+        state["paid_at"] = parse_datetime(state["paid_at"])
+
+    lines = state["lines"]
+    if "lines" in payload:
+        lines.clear()
+    if payload.get("clear"):
+        lines.clear()
+    for item_id in payload.get("remove", ()):
+        lines.pop(item_id, None)
+    for item_id, quantity, unit_price in payload.get("lines", []) + payload.get("upsert", []):
+        lines[item_id] = (quantity, Decimal(unit_price) if unit_price is not None else None)
+
+
+def replay(at: Optional[datetime.datetime] = None, order_ids: Optional[Iterable[int]] = None,
+           chunk_size: int = 2000) -> dict:
+    """
+    Восстанавливает состояние заказов на момент at по журналу событий.
+
+    События читаются по порядку записи порциями по chunk_size, выборка по
+    времени использует индекс по created_at (или (order_id, created_at)
+    для отдельных заказов).
+
+    Args:
+        at (datetime, optional): Момент времени. По умолчанию - текущее состояние.
+        order_ids (Iterable[int], optional): Восстановить только эти заказы.
+        chunk_size (int): Количество событий, читаемых за один запрос.
+
+    Returns:
+        dict: Состояние заказов, существовавших на момент at, {ID заказа: состояние}.
+    """
+    events = OrderEvent.objects.order_by("id")
+    if at is not None:
+        events = events.filter(created_at__lte=at)
+    if order_ids is not None:
+        events = events.filter(order_id__in=list(order_ids))
+
+    orders = {}
+    for order_id, event_type, payload in (events.values_list("order_id", "type", "payload")
+                                          .iterator(chunk_size=chunk_size)):
+        apply_event(orders, order_id, event_type, payload)
+    return orders
@@ -0,0 +1,229 @@
+"""
+Потоковая выгрузка заказов со строками в CSV и JSON Lines для бухгалтерии.
+
+Заказы читаются порциями по ID (WHERE id > последний ID ORDER BY id LIMIT n),
+строки порции - одним запросом, и каждая порция сразу форматируется
+и отдается клиенту. В памяти одновременно находится только одна порция,
+поэтому расход памяти не зависит от размера таблицы.
+
+Форматы:
+    csv   - строка на каждую строку заказа (заказ без блюд - одна строка
+            с пустыми полями блюда);
+    jsonl - объект на каждый заказ со списком строк в поле "lines".
+
+Выгружаются текущие заказы (Order) или заказы из архива (ArchivedOrder).
+"""
+import csv
+import datetime
+import io
+import json
+from decimal import Decimal
+from typing import Iterator, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from orders.analytics import parse_moment
+from orders.catalogue import item_catalogue
+from orders.models import ArchivedOrder, CompactJSONEncoder, Order, OrderLine
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+CSV_HEADER = ("order_id", "table_number", "status", "created_at", "paid_at", "order_total",
+              "item_id", "item_name", "quantity", "unit_price", "line_total")
+
+ORDER_FIELDS = ("id", "table_number", "status", "created_at", "paid_at", "total_price")
+
+
+class ExportQuery:
+    """
+    Параметры выгрузки и чтение заказов порциями.
+
+    Attributes:
+        status (str, optional): Выгружать только заказы с этим статусом.
+        start (datetime, optional): Заказы, созданные не раньше этого момента.
+        end (datetime, optional): Заказы, созданные раньше этого момента.
+        archive (bool): Выгружать заказы из архива.
+        chunk_size (int): Количество заказов в порции.
+    """
+    def __init__(self, status: Optional[str] = None,
+                 start: Optional[datetime.datetime] = None,
+                 end: Optional[datetime.datetime] = None,
+                 archive: bool = False, chunk_size: Optional[int] = None):
+        self.status = status
+        self.start = start
+        self.end = end
+        self.archive = archive
+        self.chunk_size = chunk_size or settings.ORDERS_EXPORT_CHUNK_SIZE
+
+    def get_queryset(self):
+        queryset = (ArchivedOrder if self.archive else Order).objects.all()
+        if self.status is not None:
+            queryset = queryset.filter(status=self.status)
+        if self.start is not None:
+            queryset = queryset.filter(created_at__gte=self.start)
+        if self.end is not None:
+            queryset = queryset.filter(created_at__lt=self.end)
+        return queryset
+
+    def fetch_chunk(self, after: int) -> list:
+        """
+        Читает порцию заказов с ID больше after вместе со строками: два запроса.
+
+        Returns:
+            list: Словари полей заказа со списком строк
+            [ID блюда, количество, цена за единицу] в поле "lines".
+        """
+        fields = ORDER_FIELDS + (("lines",) if self.archive else ())
+        orders = list(
+            self.get_queryset().filter(id__gt=after).order_by("id")
+            .values(*fields)[:self.chunk_size]
+        )
+        if self.archive:
+            # Цены в строках архивного заказа записаны в JSON строками
+            for order in orders:
+                order["lines"] = [
+                    (item_id, quantity, Decimal(unit_price) if unit_price is not None else None)
+                    for item_id, quantity, unit_price in order["lines"]
+                ]
+        elif orders:
+            by_id = {order["id"]: order for order in orders}
+            for order in orders:
+                order["lines"] = []
+            for order_id, *line in (
+                OrderLine.objects.filter(order_id__in=by_id)
+                .order_by("order_id", "id").values_list("order_id", "item_id", "quantity", "unit_price")
+            ):
+                by_id[order_id]["lines"].append(line)
+        return orders
+
+    def chunks(self) -> Iterator[list]:
+        """
+        Порции заказов до конца выборки.
+        """
+        after = 0
+        while True:
+            orders = self.fetch_chunk(after)
+            if not orders:
+                return
+            yield orders
+            if len(orders) < self.chunk_size:
+                return
+            after = orders[-1]["id"]
+
+    async def achunks(self):
+        """
+        Асинхронная версия chunks: каждая порция читается в потоке sync_to_async.
+        """
+        after = 0
+        while True:
+            orders = await sync_to_async(self.fetch_chunk)(after)
+            if not orders:
+                return
+            yield orders
+            if len(orders) < self.chunk_size:
+                return
+            after = orders[-1]["id"]
+
+
+def parse_params(params) -> tuple:
+    """
+    Разбирает параметры выгрузки из запроса: format (csv или jsonl,
+    по умолчанию csv), status, start и end (период создания заказов,
+    YYYY-MM-DD - конец включительно), archive=1 - заказы из архива.
+
+    Returns:
+        tuple: (ExportQuery, формат).
+
+    Raises:
+        ValueError: Параметр выгрузки некорректен.
+    """
+    export_format = params.get("format") or "csv"
+    if export_format not in FORMATS:
+        raise ValueError("Формат выгрузки: csv или jsonl")
+    status = params.get("status") or None
+    if status is not None and status not in Order.STATUS_LABELS:
+        raise ValueError("Not allowed status")
+    period = {}
+    for name, end in (("start", False), ("end", True)):
+        if params.get(name):
+            period[name] = parse_moment(params[name], end=end)
+            if period[name] is None:
+                raise ValueError("Дата должна быть в формате ГГГГ-ММ-ДД")
+    query = ExportQuery(status=status, archive=params.get("archive") == "1", **period)
+    return query, export_format
+
+
+def _csv_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+def csv_header() -> str:
+    """
+    Строка заголовка CSV.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(CSV_HEADER)
+    return buffer.getvalue()
+
+
+def format_csv(orders: list) -> str:
+    """
+    Форматирует порцию заказов в CSV.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    items = item_catalogue.get_many({item_id for order in orders for item_id, *_ in order["lines"]})
+    for order in orders:
+        order_values = [_csv_value(order[field]) for field in ORDER_FIELDS]
+        if not order["lines"]:
+            writer.writerow(order_values + [""] * 5)
+        for item_id, quantity, unit_price in order["lines"]:
+            item = items.get(item_id)
+            line_total = quantity * unit_price if unit_price is not None else None
+            writer.writerow(order_values + [item_id, item.name if item else "", quantity,
+                                            _csv_value(unit_price), _csv_value(line_total)])
+    return buffer.getvalue()
+
+
+def format_jsonl(orders: list) -> str:
+    """
+    Форматирует порцию заказов в JSON Lines: объект на каждый заказ.
+    """
+    return "".join(
+        json.dumps({
+            **{field: order[field] for field in ORDER_FIELDS},
+            "lines": [{"item": item_id, "quantity": quantity, "unit_price": unit_price}
+                      for item_id, quantity, unit_price in order["lines"]],
+        }, cls=CompactJSONEncoder, ensure_ascii=False) + "\n"
+        for order in orders
+    )
+
+
+FORMATTERS = {"csv": format_csv, "jsonl": format_jsonl}
+
+
+def stream(query: ExportQuery, export_format: str) -> Iterator[str]:
+    """
+    Выгрузка по порциям: по одному фрагменту текста на порцию заказов.
+    Заголовок CSV отдается и для пустой выборки.
+    """
+    if export_format == "csv":
+        yield csv_header()
+    for orders in query.chunks():
+        yield FORMATTERS[export_format](orders)
+
+
+async def astream(query: ExportQuery, export_format: str):
+    """
+    Асинхронная версия stream для ASGI.
+    """
+    if export_format == "csv":
+        yield csv_header()
+    async for orders in query.achunks():
+        yield FORMATTERS[export_format](orders)
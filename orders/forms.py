@@ -1,12 +1,34 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db import transaction
 
-from orders.models import Order, Item
+from orders.catalogue import item_catalogue
+from orders.models import Order
+
+
+def catalogue_item_choices():
+    return item_catalogue.choices()
+
+
+class CatalogueItemsField(forms.MultipleChoiceField):
+    """
+    Поле выбора блюд из каталога меню (orders.catalogue) без запросов к БД.
+    Возвращает список объектов Item.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(choices=catalogue_item_choices, **kwargs)
+
+    def clean(self, value):
+        value = super().clean(value)
+        items = item_catalogue.get_many(value)
+        return [items[int(pk)] for pk in value if int(pk) in items]
 
 
 class CreateOrderForm(forms.ModelForm):
-    items = forms.ModelMultipleChoiceField(
-        queryset=Item.objects.all(),
+    # Максимальное количество одного блюда в заказе
+    max_quantity = 99
+
+    items = CatalogueItemsField(
         widget=forms.CheckboxSelectMultiple,
         error_messages={
             'required': 'Заказ не может быть пустым.',  # Кастомное сообщение
@@ -22,3 +44,62 @@ class CreateOrderForm(forms.ModelForm):
                 'placeholder': 'Номер стола'
             }),
         }
+
+    @staticmethod
+    def quantity_field_name(item_pk) -> str:
+        """
+        Имя поля с количеством для блюда (quantity_<ID блюда>).
+        """
+        return f"quantity_{item_pk}"
+
+    def clean_table_number(self):
+        """
+        Проверяет, что у стола нет открытого заказа.
+
+        Ограничение unique_active_table_number зависит от статуса, которого
+        нет среди полей формы, поэтому ModelForm его не проверяет.
+        """
+        table_number = self.cleaned_data["table_number"]
+        if Order.objects.active().filter(table_number=table_number).exists():
+            raise ValidationError("Заказ для этого стола уже существует.")
+        return table_number
+
+    def clean(self):
+        """
+        Собирает количество для каждого выбранного блюда.
+        Если количество не передано, блюдо добавляется в одном экземпляре.
+        """
+        cleaned_data = super().clean()
+        quantity_field = forms.IntegerField(min_value=1, max_value=self.max_quantity)
+        quantities = {}
+        for item in cleaned_data.get("items", []):
+            raw_quantity = self.data.get(self.quantity_field_name(item.pk)) or "1"
+            try:
+                quantities[item] = quantity_field.clean(raw_quantity)
+            except ValidationError:
+                self.add_error(
+                    "items",
+                    ValidationError(
+                        f"Количество блюда «{item.name}» должно быть от 1 до {self.max_quantity}."
+                    )
+                )
+        cleaned_data["quantities"] = quantities
+        return cleaned_data
+
+    def save(self, commit=True):
+        """
+        Сохраняет заказ и его строки.
+        Строки записываются пакетно через Order.set_lines.
+        """
+        order = super().save(commit=False)
+
+        def save_lines():
+            order.set_lines(self.cleaned_data["quantities"])
+
+        if commit:
+            with transaction.atomic():
+                order.save()
+                save_lines()
+        else:
+            self.save_m2m = save_lines
+        return order
@@ -0,0 +1,47 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.archive import archive_closed_orders
+
+
+class Command(BaseCommand):
+    """
+    Переносит закрытые (оплаченные) заказы в архив пакетами.
+
+    Рассчитана на запуск по расписанию (cron, systemd timer).
+
+    Примеры:
+        python manage.py archive_orders
+        python manage.py archive_orders --older-than 0 --batch-size 500
+    """
+    help = "Переносит оплаченные заказы в архив"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=float,
+            default=settings.ORDERS_ARCHIVE_AFTER_HOURS,
+            help="Сколько часов оплаченный заказ остается в таблице текущих заказов",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество заказов, переносимых в одной транзакции",
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=None,
+            help="Максимальное количество пакетов за запуск",
+        )
+
+    def handle(self, *args, **options):
+        archived = archive_closed_orders(
+            older_than=datetime.timedelta(hours=options["older_than"]),
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Перенесено в архив заказов: {archived}"))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import export
+
+
+class Command(BaseCommand):
+    """
+    Выгружает заказы со строками в CSV или JSON Lines порциями
+    (orders.export): память не зависит от количества заказов.
+
+    Примеры:
+        python manage.py export_orders --output orders.csv
+        python manage.py export_orders --format jsonl --status paid --start 2025-01-01 --end 2025-01-31
+        python manage.py export_orders --archive --output archive.csv
+    """
+    help = "Выгружает заказы со строками в CSV или JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            choices=sorted(export.FORMATS),
+            default="csv",
+            help="Формат выгрузки",
+        )
+        parser.add_argument("--status", help="Выгрузить только заказы с этим статусом")
+        parser.add_argument("--start", help="Начало периода создания заказов (YYYY-MM-DD)")
+        parser.add_argument("--end", help="Конец периода создания заказов (YYYY-MM-DD включительно)")
+        parser.add_argument(
+            "--archive",
+            action="store_true",
+            help="Выгрузить заказы из архива",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=None,
+            help="Количество заказов, читаемых за один запрос",
+        )
+        parser.add_argument(
+            "--output",
+            help="Файл выгрузки. По умолчанию - стандартный вывод",
+        )
+
+    def handle(self, *args, **options):
+        params = {name: options[name] for name in ("format", "status", "start", "end")}
+        params["archive"] = "1" if options["archive"] else None
+        try:
+            query, export_format = export.parse_params(params)
+        except ValueError as error:
+            raise CommandError(str(error))
+        if options["chunk_size"]:
+            query.chunk_size = options["chunk_size"]
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as output:
+                for chunk in export.stream(query, export_format):
+                    output.write(chunk)
+        else:
+            for chunk in export.stream(query, export_format):
+                self.stdout.write(chunk, ending="")
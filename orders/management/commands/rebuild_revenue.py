@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from orders.revenue import rebuild_revenue
+
+
+class Command(BaseCommand):
+    """
+    Пересобирает счетчики выручки (за все время и по дням)
+    по текущим оплаченным заказам.
+
+    Пример:
+        python manage.py rebuild_revenue
+    """
+    help = "Пересчитывает счетчики выручки по оплаченным заказам"
+
+    def handle(self, *args, **options):
+        total = rebuild_revenue()
+        self.stdout.write(self.style.SUCCESS(f"Выручка за все время: {total}"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.analytics import parse_period, rebuild_rollups
+
+
+class Command(BaseCommand):
+    """
+    Пересобирает часовые агрегаты продаж (по столам и блюдам)
+    по оплаченным заказам, текущим и архивным.
+
+    Примеры:
+        python manage.py rebuild_sales_rollups
+        python manage.py rebuild_sales_rollups --start 2025-01-01 --end 2025-01-31
+    """
+    help = "Пересчитывает часовые агрегаты продаж по оплаченным заказам"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start",
+            help="Начало периода (YYYY-MM-DD или YYYY-MM-DDTHH:MM). По умолчанию - все время",
+        )
+        parser.add_argument(
+            "--end",
+            help="Конец периода (YYYY-MM-DD включительно или YYYY-MM-DDTHH:MM)",
+        )
+
+    def handle(self, *args, **options):
+        start = end = None
+        if options["start"] or options["end"]:
+            if not (options["start"] and options["end"]):
+                raise CommandError("Период задается параметрами --start и --end вместе")
+            try:
+                start, end = parse_period(options["start"], options["end"])
+            except ValueError as error:
+                raise CommandError(str(error))
+        rows = rebuild_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Записано строк агрегатов по столам: {rows}"))
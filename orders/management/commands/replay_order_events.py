@@ -0,0 +1,89 @@
+import datetime
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from orders.eventlog import replay
+from orders.revenue import parse_day
+
+
+def parse_moment(value: str) -> datetime.datetime:
+    """
+    Разбирает момент времени: дату и время в формате ISO 8601
+    или дату YYYY-MM-DD (конец этого дня по местному времени).
+    """
+    day = parse_day(value)
+    if day is not None:
+        moment = datetime.datetime.combine(day, datetime.time.max)
+    else:
+        try:
+            moment = parse_datetime(value)
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise CommandError(f"Некорректный момент времени: {value}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    """
+    Восстанавливает состояние заказов на момент времени по журналу событий.
+
+    Примеры:
+        python manage.py replay_order_events --at 2025-01-23T18:00
+        python manage.py replay_order_events --at 2025-01-23 --order 15 16
+        python manage.py replay_order_events --json
+    """
+    help = "Восстанавливает состояние заказов на момент времени по журналу событий"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--at",
+            type=parse_moment,
+            help="Момент времени (YYYY-MM-DDTHH:MM[:SS] или YYYY-MM-DD - конец дня). "
+                 "По умолчанию - текущее состояние",
+        )
+        parser.add_argument(
+            "--order",
+            type=int,
+            nargs="+",
+            help="ID заказов, состояние которых нужно восстановить",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Вывести состояние в формате JSON",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Количество событий, читаемых за один запрос",
+        )
+
+    def handle(self, *args, **options):
+        orders = replay(at=options["at"], order_ids=options["order"],
+                        chunk_size=options["batch_size"])
+
+        if options["json"]:
+            data = {
+                order_id: {**state, "lines": [[item_id, *line] for item_id, line in state["lines"].items()]}
+                for order_id, state in sorted(orders.items())
+            }
+            self.stdout.write(json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2))
+            return
+
+        for order_id, state in sorted(orders.items()):
+            lines = ", ".join(
+                f"{item_id} x {quantity}" for item_id, (quantity, _) in state["lines"].items()
+            )
+            self.stdout.write(
+                f"Заказ #{order_id}: стол {state['table_number']}, статус {state['status']}, "
+                f"сумма {state['total_price']}, блюда: {lines or '-'}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Заказов: {len(orders)}"))
@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+
+from orders.models import Order
+from orders.signals import recalculate_orders
+
+
+class Command(BaseCommand):
+    """
+    Проверяет, что total_price каждого заказа равен сумме стоимости его строк
+    (количество * цена за единицу).
+
+    Примеры:
+        python manage.py verify_order_totals
+        python manage.py verify_order_totals --fix
+    """
+    help = "Проверяет и при необходимости исправляет total_price заказов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Исправить расхождения, записав пересчитанную сумму",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество заказов, обрабатываемых за один запрос",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        mismatched = []
+        checked = 0
+
+        orders = (
+            Order.objects
+            .annotate(expected_total=Sum(
+                F("lines__quantity") * F("lines__unit_price"),
+                output_field=DecimalField(max_digits=10, decimal_places=2)
+            ))
+            .only("id", "total_price")
+            .order_by("id")
+        )
+        for order in orders.iterator(chunk_size=batch_size):
+            checked += 1
+            expected_total = order.expected_total or Decimal(0)
+            if order.total_price != expected_total:
+                self.stdout.write(
+                    f"Заказ #{order.pk}: total_price={order.total_price}, "
+                    f"сумма блюд={expected_total}"
+                )
+                mismatched.append((order.pk, order.total_price, expected_total))
+
+        if mismatched and options["fix"]:
+            # Суммы пересчитываются по строкам тем же путем, что и после изменения
+            # строк в админке: с выручкой, журналом событий, агрегатами и кэшем
+            with transaction.atomic():
+                fixed = recalculate_orders(order_pk for order_pk, _, _ in mismatched)
+            self.stdout.write(self.style.SUCCESS(f"Исправлено заказов: {fixed}"))
+
+        self.stdout.write(
+            f"Проверено заказов: {checked}, расхождений: {len(mismatched)}"
+        )
@@ -0,0 +1,268 @@
+"""
+Метрики запросов: задержка, SQL-запросы, попадания в кэш и размер ответа по views.
+
+MetricsMiddleware измеряет каждый запрос и записывает результат в реестр
+процесса (registry), который отдается в текстовом формате Prometheus
+(orders.views.metrics, /metrics). В ответ добавляется заголовок
+Server-Timing с временем БД, числом запросов и результатом кэша,
+который видно во вкладке Network инструментов разработчика браузера.
+
+SQL-запросы считаются через execute_wrapper соединений с БД (orders.sqlhooks), попадания
+в кэш - декоратором orders.cache.cache_view. Данные текущего запроса
+хранятся в contextvar, поэтому учитываются и запросы к БД асинхронных
+views, выполняемые через sync_to_async.
+
+Включается настройкой ORDERS_METRICS. Если она выключена, middleware
+исключается из цепочки при запуске (MiddlewareNotUsed), а execute_wrapper
+не устанавливается, так что накладных расходов нет.
+
+Реестр свой в каждом процессе: при нескольких воркерах Prometheus
+видит метрики того воркера, который ответил на запрос /metrics.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from orders import sqlhooks
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+UNRESOLVED_VIEW = "<unresolved>"
+
+
+class Histogram:
+    """
+    Гистограмма Prometheus: количество наблюдений по верхним границам корзин.
+
+    Attributes:
+        buckets (tuple): Верхние границы корзин по возрастанию.
+        counts (list[int]): Количество наблюдений в каждой корзине (без накопления).
+        sum (float): Сумма наблюдений.
+        count (int): Количество наблюдений.
+    """
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        Пары (граница, накопленное количество), последняя граница +Inf.
+        """
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestStats:
+    """
+    Данные одного запроса, собираемые во время его обработки.
+
+    Attributes:
+        queries (int): Количество SQL-запросов.
+        db_time (float): Время выполнения SQL-запросов, секунд.
+        cache (str, optional): Результат кэша страницы: hit или miss.
+    """
+    __slots__ = ("queries", "db_time", "cache")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache = None
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "orders_request_stats", default=None
+)
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса по views. Потокобезопасен.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.durations = {}
+            self.queries = {}
+            self.db_time = {}
+            self.cache = {}
+            self.sizes = {}
+
+    def record(self, view: str, method: str, status: int, duration: float,
+               stats: RequestStats, size: Optional[int]):
+        """
+        Записывает результат запроса к view.
+
+        Args:
+            view (str): Имя маршрута view (namespace:name).
+            method (str): HTTP-метод.
+            status (int): Код ответа.
+            duration (float): Время обработки, секунд.
+            stats (RequestStats): SQL-запросы и кэш запроса.
+            size (int, optional): Размер тела ответа (None для потоковых ответов).
+        """
+        with self.lock:
+            key = (view, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self._histogram(self.durations, view, DURATION_BUCKETS).observe(duration)
+            self._histogram(self.queries, view, QUERIES_BUCKETS).observe(stats.queries)
+            self.db_time[view] = self.db_time.get(view, 0) + stats.db_time
+            if stats.cache is not None:
+                key = (view, stats.cache)
+                self.cache[key] = self.cache.get(key, 0) + 1
+            if size is not None:
+                self._histogram(self.sizes, view, SIZE_BUCKETS).observe(size)
+
+    @staticmethod
+    def _histogram(histograms: dict, view: str, buckets: tuple) -> Histogram:
+        if view not in histograms:
+            histograms[view] = Histogram(buckets)
+        return histograms[view]
+
+    def render(self) -> str:
+        """
+        Метрики в текстовом формате Prometheus (version 0.0.4).
+        """
+        lines = []
+
+        def header(name, kind, description):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histograms(name, values):
+            for view, histogram in sorted(values.items()):
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+
+        with self.lock:
+            header("cafeorders_requests_total", "counter", "HTTP requests by view, method and status.")
+            for (view, method, status), count in sorted(self.requests.items()):
+                lines.append(f'cafeorders_requests_total{{view="{view}",method="{method}",'
+                             f'status="{status}"}} {count}')
+            header("cafeorders_request_duration_seconds", "histogram", "Request processing time.")
+            histograms("cafeorders_request_duration_seconds", self.durations)
+            header("cafeorders_db_queries", "histogram", "SQL queries per request.")
+            histograms("cafeorders_db_queries", self.queries)
+            header("cafeorders_db_query_seconds_total", "counter", "Time spent in SQL queries.")
+            for view, seconds in sorted(self.db_time.items()):
+                lines.append(f'cafeorders_db_query_seconds_total{{view="{view}"}} {seconds}')
+            header("cafeorders_cache_requests_total", "counter", "Page cache lookups by result.")
+            for (view, result), count in sorted(self.cache.items()):
+                lines.append(f'cafeorders_cache_requests_total{{view="{view}",result="{result}"}} {count}')
+            header("cafeorders_response_size_bytes", "histogram", "Response body size.")
+            histograms("cafeorders_response_size_bytes", self.sizes)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def record_cache(hit: bool):
+    """
+    Отмечает результат поиска страницы в кэше для текущего запроса.
+    Вне измеряемого запроса ничего не делает.
+    """
+    stats = _current.get()
+    if stats is not None:
+        stats.cache = "hit" if hit else "miss"
+
+
+def _record_query(sql: str, duration: float):
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += duration
+
+
+def install():
+    """
+    Устанавливает счетчик SQL-запросов на открытые и новые соединения с БД.
+    """
+    sqlhooks.register(_record_query)
+
+
+def server_timing(duration: float, stats: RequestStats) -> str:
+    """
+    Значение заголовка Server-Timing (длительности в миллисекундах).
+    """
+    parts = [f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"']
+    if stats.cache is not None:
+        parts.append(f'cache;desc="{stats.cache}"')
+    parts.append(f"total;dur={duration * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Middleware, измеряющее запросы для реестра метрик и заголовка Server-Timing.
+
+    Поддерживает синхронную и асинхронную цепочку обработчиков, чтобы не
+    переключать асинхронные views под ASGI в поток.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.ORDERS_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, started = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats, started = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    @staticmethod
+    def finish(request, response, stats, duration):
+        match = request.resolver_match
+        registry.record(
+            view=match.view_name if match is not None else UNRESOLVED_VIEW,
+            method=request.method,
+            status=response.status_code,
+            duration=duration,
+            stats=stats,
+            size=None if response.streaming else len(response.content),
+        )
+        response["Server-Timing"] = server_timing(duration, stats)
+        return response
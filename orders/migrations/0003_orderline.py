@@ -0,0 +1,70 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_order_items_to_lines(apps, schema_editor):
+    """
+    Переносит связи заказов с блюдами в строки заказа.
+    Цена за единицу берется из текущей стоимости блюда.
+    """
+    Order = apps.get_model("orders", "Order")
+    OrderLine = apps.get_model("orders", "OrderLine")
+    OrderItems = Order.items.through
+
+    lines = []
+    for link in OrderItems.objects.select_related("item").iterator(chunk_size=1000):
+        lines.append(OrderLine(order_id=link.order_id,
+                               item_id=link.item_id,
+                               quantity=1,
+                               unit_price=link.item.price))
+        if len(lines) >= 1000:
+            OrderLine.objects.bulk_create(lines)
+            lines = []
+    OrderLine.objects.bulk_create(lines)
+
+
+def copy_lines_to_order_items(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    OrderLine = apps.get_model("orders", "OrderLine")
+    OrderItems = Order.items.through
+
+    OrderItems.objects.bulk_create(
+        [OrderItems(order_id=order_id, item_id=item_id)
+         for order_id, item_id in OrderLine.objects.values_list("order_id", "item_id")],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_alter_order_table_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1, verbose_name='Количество')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=8, null=True, verbose_name='Цена за единицу')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_lines', to='orders.item', verbose_name='Блюдо')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='orders.order', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Строка заказа',
+                'verbose_name_plural': 'Строки заказа',
+                'constraints': [models.UniqueConstraint(fields=('order', 'item'), name='unique_order_line_item')],
+            },
+        ),
+        migrations.RunPython(copy_order_items_to_lines, copy_lines_to_order_items),
+        migrations.RemoveField(
+            model_name='order',
+            name='items',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items',
+            field=models.ManyToManyField(through='orders.OrderLine', to='orders.item'),
+        ),
+    ]
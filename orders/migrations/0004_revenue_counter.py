@@ -0,0 +1,44 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:35
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def init_total_revenue(apps, schema_editor):
+    """
+    Заполняет счетчик выручки за все время по уже оплаченным заказам.
+    Время оплаты этих заказов неизвестно, поэтому дневные счетчики не создаются.
+    """
+    Order = apps.get_model("orders", "Order")
+    RevenueCounter = apps.get_model("orders", "RevenueCounter")
+
+    total = Order.objects.filter(status="paid").aggregate(amount=Sum("total_price"))["amount"]
+    RevenueCounter.objects.create(key="total", amount=total or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_orderline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=10, unique=True, verbose_name='Период')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Выручка',
+                'verbose_name_plural': 'Выручка',
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Время оплаты'),
+        ),
+        migrations.RunPython(init_total_revenue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_revenue_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'id'], name='order_status_id_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_status_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Изменено'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Изменено'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='revenuecounter',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Изменено'),
+            preserve_default=False,
+        ),
+    ]
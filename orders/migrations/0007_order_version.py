@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='version',
+            field=models.PositiveIntegerField(default=1, verbose_name='Версия'),
+        ),
+    ]
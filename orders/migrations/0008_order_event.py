@@ -0,0 +1,30 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:02
+
+import django.utils.timezone
+import orders.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField(verbose_name='ID заказа')),
+                ('type', models.CharField(choices=[('created', 'Создан'), ('updated', 'Изменен'), ('status', 'Смена статуса'), ('lines', 'Изменение блюд'), ('deleted', 'Удален')], max_length=7, verbose_name='Событие')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время')),
+                ('payload', models.JSONField(default=dict, encoder=orders.models.CompactJSONEncoder, verbose_name='Данные')),
+            ],
+            options={
+                'verbose_name': 'Событие заказа',
+                'verbose_name_plural': 'Журнал событий заказов',
+                'indexes': [models.Index(fields=['created_at'], name='order_event_created_idx'), models.Index(fields=['order_id', 'created_at'], name='order_event_order_idx')],
+            },
+        ),
+    ]
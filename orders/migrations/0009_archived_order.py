@@ -0,0 +1,45 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:05
+
+import django.utils.timezone
+import orders.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID заказа')),
+                ('table_number', models.PositiveIntegerField(db_index=True, verbose_name='Номер стола')),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Сумма заказа')),
+                ('status', models.CharField(choices=[('pending', 'В ожидании'), ('ready', 'Готово'), ('paid', 'Оплачено')], max_length=7, verbose_name='Статус')),
+                ('paid_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Время оплаты')),
+                ('updated_at', models.DateTimeField(verbose_name='Изменено')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Перенесено в архив')),
+                ('lines', models.JSONField(default=list, encoder=orders.models.CompactJSONEncoder, verbose_name='Строки заказа')),
+            ],
+            options={
+                'verbose_name': 'Архивный заказ',
+                'verbose_name_plural': 'Архив заказов',
+            },
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='table_number',
+            field=models.PositiveIntegerField(verbose_name='Номер стола'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['table_number'], name='order_table_number_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'paid'), _negated=True), fields=('table_number',), name='unique_active_table_number', violation_error_message='Заказ для этого стола уже существует.'),
+        ),
+    ]
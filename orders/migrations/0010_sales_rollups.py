@@ -0,0 +1,72 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:11
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def init_created_at(apps, schema_editor):
+    """
+    Заполняет время создания уже существующих заказов: по событию created
+    журнала событий, если оно есть, иначе - временем последнего изменения.
+    """
+    Order = apps.get_model("orders", "Order")
+    OrderEvent = apps.get_model("orders", "OrderEvent")
+
+    created_events = OrderEvent.objects.filter(order_id=OuterRef("pk"), type="created")
+    Order.objects.update(created_at=Coalesce(
+        Subquery(created_events.order_by("id").values("created_at")[:1]),
+        F("updated_at"),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_archived_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='created_at',
+            field=models.DateTimeField(null=True, verbose_name='Создано'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Создано'),
+        ),
+        migrations.CreateModel(
+            name='ItemSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('item_id', models.BigIntegerField(verbose_name='ID блюда')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Продано')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Продажи блюда за час',
+                'verbose_name_plural': 'Продажи блюд по часам',
+                'constraints': [models.UniqueConstraint(fields=('hour', 'item_id'), name='unique_item_sales_rollup_hour_item')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('table_number', models.PositiveIntegerField(verbose_name='Номер стола')),
+                ('orders_count', models.IntegerField(default=0, verbose_name='Оплачено заказов')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Продажи за час по столу',
+                'verbose_name_plural': 'Продажи по часам и столам',
+                'constraints': [models.UniqueConstraint(fields=('hour', 'table_number'), name='unique_sales_rollup_hour_table')],
+            },
+        ),
+        migrations.RunPython(init_created_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='order_created_at_idx'),
+        ),
+    ]
@@ -1,5 +1,24 @@
-from django.db import models
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
 from django.shortcuts import reverse
+from django.utils import timezone
+
+
+class CompactJSONEncoder(DjangoJSONEncoder):
+    """
+    JSON без пробелов между элементами: для часто записываемых данных
+    (журнал событий заказов). Decimal и datetime записываются строками.
+    """
+    def __init__(self, *args, **kwargs):
+        kwargs["separators"] = (",", ":")
+        super().__init__(*args, **kwargs)
+
 
 class Item(models.Model):
     name = models.CharField(max_length=155,
@@ -7,6 +26,8 @@ class Item(models.Model):
     price = models.DecimalField(max_digits=8,
                                 decimal_places=2,
                                 verbose_name="Стоимость")
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name="Изменено")
 
     def __str__(self):
         return f"Блюдо: {self.name}. Стоимость: {self.price}"
@@ -16,15 +37,227 @@ class Item(models.Model):
         verbose_name_plural = "Блюда"
 
 
+# Сигнал об изменении total_price заказов на одну и ту же величину delta
+# вне Order.save(). Аргументы: order_pks, delta.
+total_price_changed = Signal()
+
+# Сигнал об изменении строк заказов в обход m2m_changed (Order.set_lines).
+# Аргументы: order_pks; order - заказ с новой суммой, upserted - новые
+# и измененные строки, removed - ID блюд удаленных строк.
+order_lines_changed = Signal()
+
+# Сигнал о создании заказов пакетным INSERT в обход post_save
+# (OrderQuerySet.create_with_lines). Аргументы: orders, lines - строки заказов.
+orders_created = Signal()
+
+# Сигнал о переходе заказов в новый статус условным UPDATE в обход post_save
+# (Order.transition_to, OrderQuerySet.change_status). Аргументы: orders - заказы
+# с новыми значениями полей и прежними в saved_state, status - новый статус.
+# Отправляется внутри транзакции перехода, обработчикам (выручка, кэш,
+# рассылка событий) не нужны дополнительные запросы.
+orders_status_changed = Signal()
+
+
+class InvalidStatusTransition(Exception):
+    """
+    Переход заказа в статус, не разрешенный графом Order.STATUS_TRANSITIONS.
+
+    Attributes:
+        source (str): Текущий статус заказа.
+        target (str): Запрошенный статус.
+    """
+    def __init__(self, source, target):
+        super().__init__(f"Недопустимый переход статуса заказа: {source} -> {target}")
+        self.source = source
+        self.target = target
+
+
+class OrderVersionConflict(Exception):
+    """
+    Заказ изменен в БД после загрузки: версия строки не совпала с ожидаемой.
+
+    Attributes:
+        order (Order): Заказ, изменения которого не записаны.
+    """
+    def __init__(self, order):
+        super().__init__(f"Заказ #{order.pk} изменен другим запросом")
+        self.order = order
+
+
+# Стоимость строки заказа: количество * цена за единицу
+LINE_TOTAL = models.ExpressionWrapper(
+    F("quantity") * F("unit_price"),
+    output_field=models.DecimalField(max_digits=10, decimal_places=2)
+)
+
+
+class OrderQuerySet(models.QuerySet):
+    """
+    QuerySet заказов с готовыми выборками для списков и API.
+    """
+    def active(self):
+        """
+        Открытые (не оплаченные) заказы.
+        """
+        return self.exclude(status=Order.CLOSED_STATUS)
+
+    def with_items(self):
+        """
+        Подгружает строки и блюда всех заказов фиксированным числом
+        дополнительных запросов вместо отдельного запроса на каждый заказ.
+        """
+        return self.prefetch_related("lines__item")
+
+    def for_list(self):
+        """
+        Выборка для отображения списка заказов: заказы в порядке ID
+        вместе с блюдами. Количество запросов не зависит от числа заказов.
+        """
+        return self.with_items().order_by("id")
+
+    def recalculate_totals(self):
+        """
+        Пересчитывает total_price выбранных заказов по их строкам
+        одним UPDATE на стороне БД. Сумма считается заново по строкам,
+        поэтому версия заказов увеличивается без проверки.
+
+        Returns:
+            int: Количество обновленных заказов.
+        """
+        lines_total = (
+            OrderLine.objects
+            .filter(order=OuterRef("pk"))
+            .values("order")
+            .annotate(total=Sum(LINE_TOTAL))
+            .values("total")
+        )
+        return self.update(
+            total_price=Coalesce(
+                Subquery(lines_total),
+                Value(Decimal(0)),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2)
+            ),
+            updated_at=timezone.now(),
+            version=F("version") + 1,
+        )
+
+    def change_status(self, new_status):
+        """
+        Переводит выбранные заказы в статус new_status одним UPDATE.
+
+        Записываются только поля status, paid_at и updated_at, версия заказов
+        увеличивается. Изменяются только заказы, для которых переход
+        разрешен графом Order.STATUS_TRANSITIONS, остальные (в том числе
+        уже находящиеся в этом статусе) пропускаются. После записи
+        отправляется сигнал orders_status_changed (выручка, кэш).
+
+        Args:
+            new_status (str): Новый статус из Order.STATUS_CHOICES.
+
+        Returns:
+            list[Order]: Заказы, статус которых изменился.
+        """
+        now = timezone.now()
+        paid_at = now if new_status == "paid" else None
+        with transaction.atomic():
+            orders = list(
+                self.filter(status__in=Order.STATUS_SOURCES[new_status])
+                .select_for_update()
+                .only("version", *Order.tracked_fields)
+            )
+            if not orders:
+                return []
+            # Строки заблокированы select_for_update, поэтому версии
+            # увеличиваются без проверки
+            Order.objects.filter(pk__in=[order.pk for order in orders]).update(
+                status=new_status, paid_at=paid_at, updated_at=now,
+                version=F("version") + 1
+            )
+            for order in orders:
+                order.status = new_status
+                order.paid_at = paid_at
+                order.updated_at = now
+                order.version += 1
+            orders_status_changed.send(sender=Order, orders=orders, status=new_status)
+
+        for order in orders:
+            order.remember_saved_state()
+        return orders
+
+    def create_with_lines(self, orders):
+        """
+        Создает заказы вместе со строками в одной транзакции.
+
+        Заказы и строки записываются пакетными INSERT, суммы заказов
+        считаются заранее по текущей стоимости блюд. После записи
+        отправляется сигнал orders_created (выручка, кэш, журнал событий).
+
+        Args:
+            orders (list[tuple[Order, dict]]): Новые заказы и количество
+                для каждого блюда заказа {Item: int}.
+
+        Returns:
+            list[Order]: Созданные заказы.
+        """
+        now = timezone.now()
+        for order, quantities in orders:
+            order.total_price = sum(
+                (item.price * quantity for item, quantity in quantities.items() if quantity > 0),
+                Decimal(0)
+            )
+            if order.status == "paid":
+                order.paid_at = now
+
+        with transaction.atomic():
+            created = self.bulk_create([order for order, _ in orders])
+            lines = OrderLine.objects.bulk_create([
+                OrderLine(order=order, item=item, quantity=quantity, unit_price=item.price)
+                for order, quantities in orders
+                for item, quantity in quantities.items() if quantity > 0
+            ])
+            orders_created.send(sender=Order, orders=created, lines=lines)
+
+        for order in created:
+            order.remember_saved_state()
+        return created
+
+
+def _transition_sources(transitions):
+    """
+    Обращает граф переходов: для каждого статуса - статусы, из которых в него можно перейти.
+    """
+    sources = {status: set() for status in transitions}
+    for source, targets in transitions.items():
+        for target in targets:
+            sources[target].add(source)
+    return {status: frozenset(statuses) for status, statuses in sources.items()}
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'В ожидании'),
         ('ready', 'Готово'),
         ('paid', 'Оплачено'),
     ]
+    # Граф переходов статусов: из какого статуса в какие можно перейти.
+    # Оплаченный заказ закрыт. Переходы выполняет Order.transition_to
+    # (OrderQuerySet.change_status для нескольких заказов).
+    STATUS_TRANSITIONS = {
+        'pending': frozenset({'ready', 'paid'}),
+        'ready': frozenset({'pending', 'paid'}),
+        'paid': frozenset(),
+    }
+    # Статус закрытого заказа: стол освобождается, заказ переносится
+    # в архив командой archive_orders
+    CLOSED_STATUS = 'paid'
+    # Таблицы, вычисленные один раз при загрузке модуля:
+    # название статуса и статусы, из которых в него можно перейти
+    STATUS_LABELS = dict(STATUS_CHOICES)
+    STATUS_SOURCES = _transition_sources(STATUS_TRANSITIONS)
 
-    table_number = models.PositiveIntegerField(verbose_name="Номер стола",
-                                               unique=True)
+    # Номер стола уникален только среди открытых заказов
+    # (ограничение unique_active_table_number)
+    table_number = models.PositiveIntegerField(verbose_name="Номер стола")
     total_price = models.DecimalField(max_digits=10,
                                       decimal_places=2,
                                       default=0,
@@ -32,7 +265,113 @@ class Order(models.Model):
     status = models.CharField(max_length=7,
                               choices=STATUS_CHOICES,
                               default="pending", verbose_name="Статус")
-    items = models.ManyToManyField(to=Item)
+    items = models.ManyToManyField(to=Item, through="OrderLine")
+    paid_at = models.DateTimeField(null=True,
+                                   blank=True,
+                                   verbose_name="Время оплаты")
+    created_at = models.DateTimeField(default=timezone.now,
+                                      editable=False,
+                                      verbose_name="Создано")
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name="Изменено")
+    # Версия строки для оптимистичной блокировки: каждое изменение заказа
+    # записывается условием WHERE version = <загруженная версия>
+    # и увеличивает ее (см. Order._do_update)
+    version = models.PositiveIntegerField(default=1,
+                                          verbose_name="Версия")
+
+    objects = OrderQuerySet.as_manager()
+
+    # Поля, значения которых запоминаются при загрузке из БД,
+    # чтобы сигналы могли определить, что изменилось при сохранении
+    tracked_fields = ("status", "total_price", "paid_at", "table_number")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_saved_state()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        # Перечитанные значения - это значения в БД: иначе сигналы сравнивали бы
+        # следующее сохранение с состоянием на момент первой загрузки
+        saved_state = dict(self.saved_state)
+        for field in self.tracked_fields:
+            if (fields is None or field in fields) and field in self.__dict__:
+                saved_state[field] = self.__dict__[field]
+        self._saved_state = saved_state
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            # Время изменения записывается при любом сохранении,
+            # время оплаты - вместе со статусом (см. signals.set_paid_at)
+            update_fields = {*update_fields, "updated_at", "version"}
+            if "status" in update_fields:
+                update_fields.add("paid_at")
+            kwargs["update_fields"] = update_fields
+        try:
+            # Обработчики post_save (выручка, журнал событий) выполняются
+            # в одной транзакции с записью заказа
+            with transaction.atomic(using=kwargs.get("using"), savepoint=False):
+                super().save(*args, **kwargs)
+        except OrderVersionConflict:
+            # Условный UPDATE не изменил ни одной строки, поэтому транзакцию
+            # можно продолжить (например, прочитать текущее состояние заказа)
+            using = kwargs.get("using") or router.db_for_write(Order, instance=self)
+            if transaction.get_connection(using).in_atomic_block:
+                transaction.set_rollback(False, using=using)
+            raise
+        # Обработчики post_save видят прежние значения в saved_state
+        self.remember_saved_state()
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        """
+        Записывает изменения существующего заказа, только если его версия
+        в БД совпадает с self.version, и увеличивает версию.
+
+        Raises:
+            OrderVersionConflict: Заказ изменен или удален другим запросом.
+        """
+        if self._state.adding or not values:
+            return super()._do_update(base_qs, using, pk_val, values,
+                                      update_fields, forced_update)
+        expected_version = self.version
+        version_field = self._meta.get_field("version")
+        values = [value for value in values if value[0] is not version_field]
+        values.append((version_field, None, F("version") + 1))
+        updated = super()._do_update(base_qs.filter(version=expected_version), using,
+                                     pk_val, values, update_fields, forced_update)
+        if not updated:
+            raise OrderVersionConflict(self)
+        self.version = expected_version + 1
+        return updated
+
+    def remember_saved_state(self):
+        """
+        Запоминает текущие значения отслеживаемых полей как сохраненные в БД.
+        """
+        self._saved_state = {
+            field: self.__dict__[field]
+            for field in self.tracked_fields if field in self.__dict__
+        }
+
+    @property
+    def saved_state(self) -> dict:
+        """
+        Значения отслеживаемых полей на момент загрузки или последнего сохранения.
+        Для нового заказа - пустой словарь.
+        """
+        return getattr(self, "_saved_state", {})
+
+    @property
+    def last_modified(self):
+        """
+        Время последнего изменения заказа или блюд в его строках.
+        Строки с блюдами должны быть подгружены (OrderQuerySet.with_items).
+        """
+        return max([self.updated_at, *(line.item.updated_at for line in self.lines.all())])
 
     def __str__(self):
         return f"Заказ #{self.id}. Статус: {self.status}"
@@ -42,6 +381,389 @@ class Order(models.Model):
             "order_pk": self.pk
         })
 
+    def can_transition_to(self, new_status) -> bool:
+        """
+        Проверяет, разрешен ли переход заказа из текущего статуса в new_status.
+        """
+        return new_status in self.STATUS_TRANSITIONS.get(self.status, ())
+
+    def transition_to(self, new_status) -> bool:
+        """
+        Переводит заказ в статус new_status одним условным UPDATE.
+
+        UPDATE выполняется при условии, что статус заказа в БД допускает
+        переход (Order.STATUS_SOURCES) и версия не изменилась. Записываются
+        только поля status, paid_at, updated_at и version. В той же транзакции
+        отправляется сигнал orders_status_changed (выручка, кэш, рассылка).
+
+        Args:
+            new_status (str): Новый статус из Order.STATUS_CHOICES.
+
+        Returns:
+            bool: True, если статус изменен, False, если заказ уже в этом статусе.
+
+        Raises:
+            InvalidStatusTransition: Переход не разрешен графом STATUS_TRANSITIONS.
+            OrderVersionConflict: Заказ изменен или удален другим запросом.
+        """
+        if new_status == self.status:
+            return False
+        if not self.can_transition_to(new_status):
+            raise InvalidStatusTransition(self.status, new_status)
+
+        now = timezone.now()
+        paid_at = now if new_status == "paid" else None
+        with transaction.atomic():
+            updated = Order.objects.filter(
+                pk=self.pk, version=self.version, status__in=self.STATUS_SOURCES[new_status]
+            ).update(status=new_status, paid_at=paid_at, updated_at=now,
+                     version=F("version") + 1)
+            if not updated:
+                raise OrderVersionConflict(self)
+            self.status = new_status
+            self.paid_at = paid_at
+            self.updated_at = now
+            self.version += 1
+            orders_status_changed.send(sender=Order, orders=[self], status=new_status)
+
+        self.remember_saved_state()
+        return True
+
+    async def atransition_to(self, new_status) -> bool:
+        """
+        Асинхронная версия transition_to.
+        """
+        return await sync_to_async(self.transition_to)(new_status)
+
+    def update_versioned(self, **fields):
+        """
+        Обновляет поля заказа одним UPDATE ... WHERE version = self.version
+        и увеличивает версию. Используется вместо save() для изменений
+        выражениями (total_price + delta).
+
+        Raises:
+            OrderVersionConflict: Заказ изменен или удален другим запросом.
+        """
+        updated = Order.objects.filter(pk=self.pk, version=self.version).update(
+            version=F("version") + 1, **fields
+        )
+        if not updated:
+            raise OrderVersionConflict(self)
+        self.version += 1
+
+    def set_lines(self, quantities):
+        """
+        Заменяет состав заказа и пересчитывает total_price.
+
+        Число запросов не зависит от количества строк: один SELECT
+        текущих строк, по одному DELETE, INSERT и UPDATE для удаленных,
+        новых и изменившихся строк и один UPDATE суммы, времени изменения
+        и версии заказа при условии, что версия не изменилась.
+        После изменения строк и суммы отправляются сигналы
+        order_lines_changed и total_price_changed.
+        Цена новых строк фиксируется по текущей стоимости блюда.
+
+        Args:
+            quantities (dict): Количество для каждого блюда {Item: int}.
+                Блюда с количеством 0 удаляются из заказа.
+
+        Raises:
+            OrderVersionConflict: Заказ изменен другим запросом,
+                изменения строк откатываются.
+        """
+        existing = {line.item_id: line for line in self.lines.all()}
+        old_total_price = sum((line.total_price for line in existing.values()), Decimal(0))
+        to_create, to_update = [], []
+        total_price = Decimal(0)
+
+        for item, quantity in quantities.items():
+            if quantity < 1:
+                continue
+            line = existing.pop(item.pk, None)
+            if line is None:
+                line = OrderLine(order=self, item=item,
+                                 quantity=quantity, unit_price=item.price)
+                to_create.append(line)
+            elif line.quantity != quantity:
+                line.quantity = quantity
+                to_update.append(line)
+            total_price += line.total_price
+
+        with transaction.atomic():
+            if existing:
+                OrderLine.objects.filter(
+                    pk__in=[line.pk for line in existing.values()]
+                ).delete()
+            if to_create:
+                OrderLine.objects.bulk_create(to_create)
+            if to_update:
+                OrderLine.objects.bulk_update(to_update, ["quantity"])
+            # Разница применяется выражением total_price + delta,
+            # как и в сигнале m2m_changed
+            delta = total_price - old_total_price
+            if existing or to_create or to_update:
+                updated_at = timezone.now()
+                self.update_versioned(total_price=F("total_price") + delta,
+                                      updated_at=updated_at)
+                self.total_price = self.total_price + delta
+                self.updated_at = updated_at
+                order_lines_changed.send(sender=Order, order_pks=[self.pk], order=self,
+                                         upserted=to_create + to_update,
+                                         removed=list(existing))
+                if delta:
+                    total_price_changed.send(sender=Order, order_pks=[self.pk], delta=delta)
+
+        self.__dict__.setdefault("_saved_state", {})["total_price"] = self.total_price
+        # Сбрасываем подгруженные строки, чтобы не отдавать устаревшие данные
+        getattr(self, "_prefetched_objects_cache", {}).pop("lines", None)
+
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        indexes = [
+            # Поиск и списки по статусу с сортировкой по ID.
+            # Префикс (status) покрывает и фильтр только по статусу.
+            models.Index(fields=["status", "id"], name="order_status_id_idx"),
+            # Поиск по номеру стола среди всех заказов, включая закрытые
+            models.Index(fields=["table_number"], name="order_table_number_idx"),
+            # Отчеты по заказам за период (analytics.top_items)
+            models.Index(fields=["created_at"], name="order_created_at_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["table_number"],
+                                    condition=~Q(status="paid"),
+                                    name="unique_active_table_number",
+                                    violation_error_message="Заказ для этого стола уже существует."),
+        ]
+
+
+class OrderLine(models.Model):
+    """
+    Строка заказа: блюдо, количество и цена за единицу на момент заказа.
+    """
+    order = models.ForeignKey(to=Order,
+                              on_delete=models.CASCADE,
+                              related_name="lines",
+                              verbose_name="Заказ")
+    item = models.ForeignKey(to=Item,
+                             on_delete=models.CASCADE,
+                             related_name="order_lines",
+                             verbose_name="Блюдо")
+    quantity = models.PositiveIntegerField(default=1,
+                                           verbose_name="Количество")
+    # Заполняется ценой блюда при добавлении строки
+    unit_price = models.DecimalField(max_digits=8,
+                                     decimal_places=2,
+                                     null=True,
+                                     verbose_name="Цена за единицу")
+
+    def __str__(self):
+        return f"{self.item.name} x {self.quantity}"
+
+    @property
+    def total_price(self):
+        return self.quantity * (self.unit_price or 0)
+
+    class Meta:
+        verbose_name = "Строка заказа"
+        verbose_name_plural = "Строки заказа"
+        constraints = [
+            models.UniqueConstraint(fields=["order", "item"],
+                                    name="unique_order_line_item"),
+        ]
+
+
+class OrderEventQuerySet(models.QuerySet):
+    """
+    QuerySet журнала событий: записи только добавляются.
+    """
+    def update(self, **kwargs):
+        raise TypeError("Журнал событий заказов не изменяется")
+
+    def delete(self):
+        raise TypeError("Журнал событий заказов не изменяется")
+
+
+class OrderEvent(models.Model):
+    """
+    Запись журнала событий заказа (только добавление).
+
+    Хранит, что произошло с заказом и когда, в компактном JSON: только
+    изменившиеся поля заказа и строк. Записывается в одной транзакции
+    с изменением заказа (orders.eventlog) и не ссылается на заказ внешним
+    ключом, чтобы история удаленных заказов сохранялась. Состояние заказов
+    на любой момент восстанавливается командой replay_order_events.
+    """
+    CREATED = "created"
+    UPDATED = "updated"
+    STATUS_CHANGED = "status"
+    LINES_CHANGED = "lines"
+    DELETED = "deleted"
+    TYPE_CHOICES = [
+        (CREATED, "Создан"),
+        (UPDATED, "Изменен"),
+        (STATUS_CHANGED, "Смена статуса"),
+        (LINES_CHANGED, "Изменение блюд"),
+        (DELETED, "Удален"),
+    ]
+
+    order_id = models.BigIntegerField(verbose_name="ID заказа")
+    type = models.CharField(max_length=7,
+                            choices=TYPE_CHOICES,
+                            verbose_name="Событие")
+    created_at = models.DateTimeField(default=timezone.now,
+                                      verbose_name="Время")
+    payload = models.JSONField(default=dict,
+                               encoder=CompactJSONEncoder,
+                               verbose_name="Данные")
+
+    objects = OrderEventQuerySet.as_manager()
+
+    def __str__(self):
+        return f"Заказ #{self.order_id}: {self.get_type_display()} ({self.created_at})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise TypeError("Журнал событий заказов не изменяется")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError("Журнал событий заказов не изменяется")
+
+    class Meta:
+        verbose_name = "Событие заказа"
+        verbose_name_plural = "Журнал событий заказов"
+        indexes = [
+            # Выборка событий за период (replay_order_events)
+            models.Index(fields=["created_at"], name="order_event_created_idx"),
+            # История одного заказа за период
+            models.Index(fields=["order_id", "created_at"], name="order_event_order_idx"),
+        ]
+
+
+class ArchivedOrder(models.Model):
+    """
+    Закрытый заказ, перенесенный из таблицы заказов в архив.
+
+    Таблица Order содержит только текущие заказы, оплаченные заказы
+    переносятся сюда пакетами командой archive_orders (orders.archive).
+    ID заказа сохраняется, строки хранятся в JSON списками
+    [ID блюда, количество, цена за единицу], как в журнале событий.
+    """
+    id = models.BigIntegerField(primary_key=True,
+                                verbose_name="ID заказа")
+    table_number = models.PositiveIntegerField(db_index=True,
+                                               verbose_name="Номер стола")
+    total_price = models.DecimalField(max_digits=10,
+                                      decimal_places=2,
+                                      verbose_name="Сумма заказа")
+    status = models.CharField(max_length=7,
+                              choices=Order.STATUS_CHOICES,
+                              verbose_name="Статус")
+    paid_at = models.DateTimeField(null=True,
+                                   blank=True,
+                                   db_index=True,
+                                   verbose_name="Время оплаты")
+    created_at = models.DateTimeField(null=True,
+                                      verbose_name="Создано")
+    updated_at = models.DateTimeField(verbose_name="Изменено")
+    archived_at = models.DateTimeField(default=timezone.now,
+                                       verbose_name="Перенесено в архив")
+    lines = models.JSONField(default=list,
+                             encoder=CompactJSONEncoder,
+                             verbose_name="Строки заказа")
+
+    def __str__(self):
+        return f"Архивный заказ #{self.id}. Статус: {self.status}"
+
+    def get_absolute_url(self):
+        return reverse("orders:archived-order-detail", kwargs={"pk": self.pk})
+
+    class Meta:
+        verbose_name = "Архивный заказ"
+        verbose_name_plural = "Архив заказов"
+
+
+class RevenueCounter(models.Model):
+    """
+    Счетчик выручки по оплаченным заказам.
+
+    Ключ "total" хранит выручку за все время, ключи вида "2025-01-23" -
+    выручку за день оплаты. Счетчики обновляются вместе с заказами
+    (orders.revenue) и пересобираются командой rebuild_revenue.
+    """
+    key = models.CharField(max_length=10,
+                           unique=True,
+                           verbose_name="Период")
+    amount = models.DecimalField(max_digits=14,
+                                 decimal_places=2,
+                                 default=0,
+                                 verbose_name="Выручка")
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name="Изменено")
+
+    def __str__(self):
+        return f"Выручка {self.key}: {self.amount}"
+
+    class Meta:
+        verbose_name = "Выручка"
+        verbose_name_plural = "Выручка"
+
+
+class SalesRollup(models.Model):
+    """
+    Продажи за час по столу: количество оплаченных заказов и выручка.
+
+    Строки изменяются вместе с оплатой заказов (orders.analytics)
+    и пересобираются командой rebuild_sales_rollups. Час хранится
+    началом часа в UTC, отчеты за любой период суммируют строки
+    вместо чтения заказов.
+    """
+    hour = models.DateTimeField(verbose_name="Час")
+    table_number = models.PositiveIntegerField(verbose_name="Номер стола")
+    orders_count = models.IntegerField(default=0,
+                                       verbose_name="Оплачено заказов")
+    revenue = models.DecimalField(max_digits=14,
+                                  decimal_places=2,
+                                  default=0,
+                                  verbose_name="Выручка")
+
+    def __str__(self):
+        return f"Продажи {self.hour:%Y-%m-%d %H:00}, стол {self.table_number}: {self.revenue}"
+
+    class Meta:
+        verbose_name = "Продажи за час по столу"
+        verbose_name_plural = "Продажи по часам и столам"
+        constraints = [
+            # Индекс ограничения покрывает выборку по диапазону часов
+            models.UniqueConstraint(fields=["hour", "table_number"],
+                                    name="unique_sales_rollup_hour_table"),
+        ]
+
+
+class ItemSalesRollup(models.Model):
+    """
+    Продажи блюда за час: количество и выручка по строкам оплаченных заказов.
+
+    ID блюда хранится без внешнего ключа: удаление блюда из меню
+    не меняет прошлые продажи.
+    """
+    hour = models.DateTimeField(verbose_name="Час")
+    item_id = models.BigIntegerField(verbose_name="ID блюда")
+    quantity = models.IntegerField(default=0,
+                                   verbose_name="Продано")
+    revenue = models.DecimalField(max_digits=14,
+                                  decimal_places=2,
+                                  default=0,
+                                  verbose_name="Выручка")
+
+    def __str__(self):
+        return f"Продажи {self.hour:%Y-%m-%d %H:00}, блюдо {self.item_id}: {self.quantity}"
+
+    class Meta:
+        verbose_name = "Продажи блюда за час"
+        verbose_name_plural = "Продажи блюд по часам"
+        constraints = [
+            models.UniqueConstraint(fields=["hour", "item_id"],
+                                    name="unique_item_sales_rollup_hour_item"),
+        ]
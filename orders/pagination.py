@@ -0,0 +1,120 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import QuerySet
+from rest_framework.pagination import CursorPagination
+
+
+def get_page_size(value: Optional[str] = None) -> int:
+    """
+    Возвращает размер страницы с учетом ограничений из настроек.
+
+    Args:
+        value (str, optional): Размер страницы, переданный клиентом.
+
+    Returns:
+        int: Размер страницы от 1 до ORDERS_MAX_PAGE_SIZE.
+            Если значение не передано или некорректно, ORDERS_PAGE_SIZE.
+    """
+    if value is None or not str(value).isdecimal() or int(value) < 1:
+        return settings.ORDERS_PAGE_SIZE
+    return min(int(value), settings.ORDERS_MAX_PAGE_SIZE)
+
+
+def parse_cursor(value: Optional[str]) -> Optional[int]:
+    """
+    Преобразует курсор из параметров запроса в ID заказа.
+
+    Returns:
+        int | None: ID, от которого строится страница, или None.
+    """
+    if value is None or not value.isdecimal():
+        return None
+    return int(value)
+
+
+@dataclass
+class KeysetPage:
+    """
+    Страница выборки, построенная по ключу (ID) без OFFSET.
+
+    Attributes:
+        object_list (list): Объекты текущей страницы в порядке возрастания ID.
+        next_cursor (int | None): Курсор для следующей страницы.
+        previous_cursor (int | None): Курсор для предыдущей страницы.
+    """
+    object_list: list
+    next_cursor: Optional[int] = None
+    previous_cursor: Optional[int] = None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginate_by_id(queryset: QuerySet,
+                   page_size: int,
+                   after: Optional[int] = None,
+                   before: Optional[int] = None) -> KeysetPage:
+    """
+    Возвращает страницу выборки по ключу ID.
+
+    Страница строится условием id > after (или id < before) и LIMIT,
+    поэтому стоимость запроса не зависит от номера страницы, а вставка
+    новых записей не сдвигает уже выданные страницы.
+
+    Args:
+        queryset (QuerySet): Исходная выборка.
+        page_size (int): Размер страницы.
+        after (int, optional): Вернуть записи с ID больше указанного.
+        before (int, optional): Вернуть записи с ID меньше указанного.
+
+    Returns:
+        KeysetPage: Страница с курсорами соседних страниц.
+    """
+    if before is not None:
+        # Берем на одну запись больше, чтобы узнать, есть ли страница раньше
+        rows = list(queryset.filter(id__lt=before).order_by("-id")[:page_size + 1])
+        has_more = len(rows) > page_size
+        object_list = rows[:page_size][::-1]
+        return KeysetPage(
+            object_list=object_list,
+            next_cursor=object_list[-1].id if object_list else None,
+            previous_cursor=object_list[0].id if has_more else None,
+        )
+
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    rows = list(queryset.order_by("id")[:page_size + 1])
+    has_more = len(rows) > page_size
+    object_list = rows[:page_size]
+    return KeysetPage(
+        object_list=object_list,
+        next_cursor=object_list[-1].id if has_more else None,
+        previous_cursor=object_list[0].id if after is not None and object_list else None,
+    )
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация DRF по полю id.
+
+    Размер страницы задается параметром page_size и ограничен
+    настройкой ORDERS_MAX_PAGE_SIZE.
+    """
+    ordering = "id"
+    page_size_query_param = "page_size"
+
+    def get_page_size(self, request):
+        return get_page_size(request.query_params.get(self.page_size_query_param))
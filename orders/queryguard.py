@@ -0,0 +1,204 @@
+"""
+Обнаружение N+1 и медленных SQL-запросов.
+
+QueryGuard следит за SQL-запросами внутри блока кода и находит:
+    повторы    - запросы одной формы (SQL без значений параметров и чисел),
+                 выполненные больше max_repeats раз, например order.items.all()
+                 для каждого заказа в шаблоне списка;
+    медленные  - запросы дольше slow_ms миллисекунд;
+    превышение - больше max_queries запросов всего.
+
+В тестах QueryGuard используется как контекстный менеджер или декоратор
+и при нарушении бросает QueryBudgetExceeded (подкласс AssertionError,
+поэтому тест завершается как упавший, а не как ошибка):
+
+    with QueryGuard(max_queries=3, max_repeats=1):
+        self.client.get(reverse("orders:orders_list"))
+
+В продакшене те же проверки выполняет QueryGuardMiddleware для каждого
+запроса и пишет нарушения в лог orders.queries. Включается настройкой
+ORDERS_QUERY_GUARD, пороги - ORDERS_QUERY_GUARD_MAX_REPEATS и
+ORDERS_SLOW_QUERY_MS. Если проверка выключена, middleware исключается
+из цепочки при запуске (MiddlewareNotUsed).
+
+Запросы перехватываются execute_wrapper соединений с БД (orders.sqlhooks), активные проверки
+хранятся в contextvar, поэтому учитываются и запросы асинхронных views,
+выполняемые через sync_to_async.
+"""
+import contextvars
+import logging
+import re
+from collections import Counter
+from contextlib import ContextDecorator
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from orders import sqlhooks
+
+logger = logging.getLogger("orders.queries")
+
+# Длина SQL в сообщениях о нарушениях
+SQL_PREVIEW_LENGTH = 200
+
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+def query_shape(sql: str) -> str:
+    """
+    Форма запроса: SQL без значений. Строки и числа заменяются на ?,
+    списки параметров IN (%s, %s, ...) - на (...), чтобы запросы,
+    отличающиеся только значениями, считались одинаковыми.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    SQL-запросы блока нарушили ограничения QueryGuard.
+
+    Attributes:
+        problems (list[str]): Описания нарушений.
+    """
+    def __init__(self, problems: list):
+        self.problems = problems
+        super().__init__("\n".join(problems))
+
+
+_active: contextvars.ContextVar[tuple] = contextvars.ContextVar("orders_query_guards", default=())
+
+
+class QueryGuard(ContextDecorator):
+    """
+    Проверка SQL-запросов блока кода: количество, повторы одной формы и время.
+
+    Args:
+        max_queries (int, optional): Допустимое количество запросов.
+        max_repeats (int, optional): Сколько раз допустимо выполнить запрос одной формы.
+        slow_ms (float, optional): Порог медленного запроса, миллисекунд.
+        raise_errors (bool): Бросать QueryBudgetExceeded при выходе из блока.
+
+    Attributes:
+        queries (list[tuple[str, float]]): Выполненные запросы: SQL и время, секунд.
+    """
+    def __init__(self, max_queries: Optional[int] = None, max_repeats: Optional[int] = None,
+                 slow_ms: Optional[float] = None, raise_errors: bool = True):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.slow_ms = slow_ms
+        self.raise_errors = raise_errors
+        self.queries = []
+
+    def __enter__(self):
+        install()
+        self.queries = []
+        self._token = _active.set(_active.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active.reset(self._token)
+        if exc_type is None and self.raise_errors:
+            problems = self.problems()
+            if problems:
+                raise QueryBudgetExceeded(problems)
+        return False
+
+    def repeated(self) -> dict:
+        """
+        Формы запросов, выполненные больше max_repeats раз.
+
+        Returns:
+            dict[str, int]: Форма запроса и количество выполнений.
+        """
+        if self.max_repeats is None:
+            return {}
+        shapes = Counter(query_shape(sql) for sql, _ in self.queries)
+        return {shape: count for shape, count in shapes.items() if count > self.max_repeats}
+
+    def slow(self) -> list:
+        """
+        Запросы дольше slow_ms.
+
+        Returns:
+            list[tuple[str, float]]: SQL и время, миллисекунд.
+        """
+        if self.slow_ms is None:
+            return []
+        return [(sql, duration * 1000) for sql, duration in self.queries
+                if duration * 1000 > self.slow_ms]
+
+    def problems(self) -> list:
+        """
+        Описания всех нарушений.
+        """
+        problems = []
+        if self.max_queries is not None and len(self.queries) > self.max_queries:
+            problems.append(f"Выполнено {len(self.queries)} SQL-запросов, "
+                            f"допустимо {self.max_queries}")
+        for shape, count in self.repeated().items():
+            problems.append(f"Запрос выполнен {count} раз (возможен N+1): "
+                            f"{shape[:SQL_PREVIEW_LENGTH]}")
+        for sql, duration in self.slow():
+            problems.append(f"Медленный запрос {duration:.1f} ms: {sql[:SQL_PREVIEW_LENGTH]}")
+        return problems
+
+
+def _record_query(sql: str, duration: float):
+    for guard in _active.get():
+        guard.queries.append((sql, duration))
+
+
+def install():
+    """
+    Устанавливает перехват SQL-запросов на открытые и новые соединения с БД.
+    """
+    sqlhooks.register(_record_query)
+
+
+class QueryGuardMiddleware:
+    """
+    Middleware, проверяющее SQL-запросы каждого запроса и пишущее
+    нарушения (N+1, медленные запросы) в лог orders.queries.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.ORDERS_QUERY_GUARD:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install()
+
+    def make_guard(self) -> QueryGuard:
+        return QueryGuard(max_repeats=settings.ORDERS_QUERY_GUARD_MAX_REPEATS,
+                          slow_ms=settings.ORDERS_SLOW_QUERY_MS, raise_errors=False)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with self.make_guard() as guard:
+            response = self.get_response(request)
+        self.report(request, guard)
+        return response
+
+    async def __acall__(self, request):
+        with self.make_guard() as guard:
+            response = await self.get_response(request)
+        self.report(request, guard)
+        return response
+
+    @staticmethod
+    def report(request, guard: QueryGuard):
+        for problem in guard.problems():
+            logger.warning("%s %s: %s", request.method, request.path, problem)
@@ -0,0 +1,225 @@
+import datetime
+import re
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from orders.models import ArchivedOrder, Order, RevenueCounter
+
+# Ключ счетчика выручки за все время. Счетчики по дням хранятся
+# под ключами вида "2025-01-23" (локальная дата оплаты).
+TOTAL_KEY = "total"
+
+
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def parse_day(value: str) -> Optional[datetime.date]:
+    """
+    Разбирает дату в формате YYYY-MM-DD.
+
+    Returns:
+        date | None: Дата или None, если формат неверный или такой даты нет.
+    """
+    if not DATE_RE.match(value):
+        return None
+    try:
+        return parse_date(value)
+    except ValueError:
+        # Формат верный, но такой даты нет (например, 2025-13-01)
+        return None
+
+
+def day_key(paid_at: Optional[datetime.datetime]) -> Optional[str]:
+    """
+    Возвращает ключ дневного счетчика для времени оплаты.
+    """
+    if paid_at is None:
+        return None
+    return timezone.localdate(paid_at).isoformat()
+
+
+def _increment(key: str, amount: Decimal):
+    """
+    Увеличивает счетчик на amount выражением UPDATE ... SET amount = amount + X.
+    Если счетчика еще нет, создает его.
+    """
+    counter = RevenueCounter.objects.filter(key=key)
+    if counter.update(amount=F("amount") + amount, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            RevenueCounter.objects.create(key=key, amount=amount)
+    except IntegrityError:
+        # Счетчик успел создать параллельный запрос
+        counter.update(amount=F("amount") + amount, updated_at=timezone.now())
+
+
+def add_revenue(amount, paid_at: Optional[datetime.datetime]):
+    """
+    Изменяет выручку за все время и за день оплаты на amount.
+
+    Args:
+        amount: Изменение выручки (может быть отрицательным).
+        paid_at (datetime, optional): Время оплаты заказа.
+    """
+    if not amount:
+        return
+    amount = Decimal(str(amount))
+    with transaction.atomic():
+        _increment(TOTAL_KEY, amount)
+        key = day_key(paid_at)
+        if key:
+            _increment(key, amount)
+
+
+def add_revenue_changes(changes: Iterable[tuple]):
+    """
+    Применяет несколько изменений выручки, суммируя их по дням:
+    по одному UPDATE на общий счетчик и на каждый затронутый день.
+
+    Args:
+        changes: Пары (изменение выручки, время оплаты заказа).
+    """
+    total = Decimal(0)
+    by_day = {}
+    for amount, paid_at in changes:
+        total += amount
+        key = day_key(paid_at)
+        if key:
+            by_day[key] = by_day.get(key, Decimal(0)) + amount
+    with transaction.atomic():
+        if total:
+            _increment(TOTAL_KEY, total)
+        for key, amount in by_day.items():
+            if amount:
+                _increment(key, amount)
+
+
+def add_orders_revenue(orders: Iterable[Order]):
+    """
+    Учитывает в выручке новые оплаченные заказы.
+    """
+    add_revenue_changes(
+        (order.total_price, order.paid_at) for order in orders if order.status == "paid"
+    )
+
+
+def on_status_changed(orders: Iterable[Order]):
+    """
+    Учитывает в выручке смену статуса заказов: оплаченные заказы
+    добавляются, заказы, вышедшие из статуса "paid", вычитаются
+    из дня прежней оплаты.
+    """
+    changes = []
+    for order in orders:
+        saved_state = order.saved_state
+        if saved_state.get("status") == "paid":
+            changes.append((-saved_state["total_price"], saved_state.get("paid_at")))
+        if order.status == "paid":
+            changes.append((order.total_price, order.paid_at))
+    add_revenue_changes(changes)
+
+
+def on_total_delta(order_pks: Iterable[int], delta):
+    """
+    Учитывает в выручке изменение total_price оплаченных заказов на delta.
+    """
+    if not delta:
+        return
+    paid_orders = Order.objects.filter(pk__in=order_pks, status="paid")
+    for paid_at in paid_orders.values_list("paid_at", flat=True):
+        add_revenue(delta, paid_at)
+
+
+@contextmanager
+def track_total_changes(order_pks: Iterable[int]):
+    """
+    Контекстный менеджер для произвольного пересчета total_price заказов.
+
+    Запоминает суммы оплаченных заказов до выполнения блока
+    и учитывает в выручке разницу после него.
+    """
+    order_pks = list(order_pks)
+
+    def paid_totals():
+        return {
+            pk: (total_price, paid_at)
+            for pk, total_price, paid_at in
+            Order.objects.filter(pk__in=order_pks, status="paid")
+            .values_list("pk", "total_price", "paid_at")
+        }
+
+    before = paid_totals()
+    yield
+    for pk, (total_price, paid_at) in paid_totals().items():
+        old_total = before.get(pk, (total_price, paid_at))[0]
+        add_revenue(total_price - old_total, paid_at)
+
+
+def get_revenue_counter(day: Optional[datetime.date] = None) -> tuple:
+    """
+    Возвращает выручку за все время или за указанный день и время
+    последнего изменения счетчика одним запросом по ключу счетчика.
+
+    Returns:
+        tuple: (Decimal, datetime | None).
+    """
+    key = day.isoformat() if day else TOTAL_KEY
+    row = RevenueCounter.objects.filter(key=key).values_list("amount", "updated_at").first()
+    return row if row is not None else (Decimal(0), None)
+
+
+async def aget_revenue_counter(day: Optional[datetime.date] = None) -> tuple:
+    """
+    Асинхронная версия get_revenue_counter.
+    """
+    key = day.isoformat() if day else TOTAL_KEY
+    row = await RevenueCounter.objects.filter(key=key).values_list("amount", "updated_at").afirst()
+    return row if row is not None else (Decimal(0), None)
+
+
+def get_revenue(day: Optional[datetime.date] = None) -> Decimal:
+    """
+    Возвращает выручку за все время или за указанный день.
+    """
+    return get_revenue_counter(day)[0]
+
+
+def rebuild_revenue() -> Decimal:
+    """
+    Пересчитывает все счетчики выручки по оплаченным заказам,
+    текущим и перенесенным в архив.
+
+    Returns:
+        Decimal: Выручка за все время.
+    """
+    with transaction.atomic():
+        by_day = {}
+        total = Decimal(0)
+        for model in (Order, ArchivedOrder):
+            paid_orders = model.objects.filter(status="paid")
+            rows = (
+                paid_orders
+                .filter(paid_at__isnull=False)
+                .annotate(day=TruncDate("paid_at", tzinfo=timezone.get_current_timezone()))
+                .values("day")
+                .annotate(amount=Sum("total_price"))
+            )
+            for row in rows:
+                key = row["day"].isoformat()
+                by_day[key] = by_day.get(key, Decimal(0)) + row["amount"]
+            total += paid_orders.aggregate(amount=Sum("total_price"))["amount"] or Decimal(0)
+
+        counters = [RevenueCounter(key=key, amount=amount) for key, amount in by_day.items()]
+        counters.append(RevenueCounter(key=TOTAL_KEY, amount=total))
+
+        RevenueCounter.objects.all().delete()
+        RevenueCounter.objects.bulk_create(counters)
+    return total
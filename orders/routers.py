@@ -0,0 +1,180 @@
+"""
+Чтение с реплик БД для списков, поиска и отчетов.
+
+ReplicaRoutingMiddleware выбирает для запроса БД чтения, а ReplicaRouter
+(DATABASE_ROUTERS) направляет в нее все чтения запроса:
+    реплика  - GET/HEAD/OPTIONS к view, отмеченной use_replica (HTML и AJAX),
+               или к действиям ViewSet из replica_actions (по умолчанию
+               list и retrieve);
+    основная - все остальные запросы и все записи.
+
+Read-your-writes: после изменяющего запроса (POST, PUT, PATCH, DELETE)
+клиент получает cookie ORDERS_REPLICA_PIN_COOKIE, и следующие
+ORDERS_REPLICA_PIN_SECONDS секунд все его запросы читают из основной БД,
+пока реплика догоняет основную. Клиенты без cookie (скрипты API)
+могут читать с реплики данные с задержкой репликации.
+
+Реплики перечислены в ORDERS_REPLICA_DATABASES. Если список пуст,
+middleware исключается из цепочки при запуске (MiddlewareNotUsed),
+и все запросы идут в основную БД.
+
+Выбор хранится в contextvar, поэтому действует и для запросов к БД
+асинхронных views через sync_to_async. Запросы потоковых ответов,
+выполняемые после выхода из middleware, идут в основную БД.
+"""
+import contextvars
+import random
+import time
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Действия ViewSet, которые читают с реплики, если в классе не задан replica_actions
+REPLICA_ACTIONS = frozenset({"list", "retrieve"})
+
+
+class ReadRouting:
+    """
+    БД чтения текущего запроса.
+
+    Attributes:
+        alias (str, optional): Псевдоним реплики или None - основная БД.
+    """
+    __slots__ = ("alias",)
+
+    def __init__(self):
+        self.alias = None
+
+
+_routing: contextvars.ContextVar[Optional[ReadRouting]] = contextvars.ContextVar(
+    "orders_read_routing", default=None
+)
+
+
+def use_replica(view):
+    """
+    Отмечает view, которая только читает данные и может читать с реплики.
+    Для class-based views вместо декоратора задается атрибут use_replica = True.
+    """
+    view.use_replica = True
+    return view
+
+
+def reads_from_replica(view_func, method: str) -> bool:
+    """
+    Проверяет, может ли запрос к view читать с реплики.
+
+    Args:
+        view_func (callable): View из URLconf.
+        method (str): HTTP-метод запроса.
+    """
+    if method not in SAFE_METHODS:
+        return False
+    actions = getattr(view_func, "actions", None)
+    if actions is not None:
+        # ViewSet DRF: действие определяется методом запроса
+        replica_actions = getattr(view_func.cls, "replica_actions", REPLICA_ACTIONS)
+        return actions.get(method.lower()) in replica_actions
+    view_class = getattr(view_func, "view_class", None)
+    return getattr(view_class or view_func, "use_replica", False)
+
+
+def is_replica_read(request) -> bool:
+    """
+    Проверяет, читает ли запрос с реплики. Страницы, построенные по данным
+    реплики, могут отставать от основной БД, поэтому кэшируются недолго
+    и не получают ETag (orders.cache).
+    """
+    return getattr(request, "read_database", DEFAULT_DB_ALIAS) != DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """
+    Роутер БД: чтения запроса - в выбранную middleware реплику, записи - в основную БД.
+    """
+    def db_for_read(self, model, **hints):
+        # Основная БД задается явно: иначе Django читает связанные объекты
+        # из БД экземпляра, а он мог быть прочитан с реплики
+        routing = _routing.get()
+        if routing is None or routing.alias is None:
+            return DEFAULT_DB_ALIAS
+        return routing.alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.ORDERS_REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Middleware, выбирающее БД чтения для запроса и закрепляющее клиента
+    за основной БД после изменяющих запросов.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.ORDERS_REPLICA_DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = _routing.set(ReadRouting())
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = _routing.set(ReadRouting())
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        request.replica_pinned = self.is_pinned(request)
+        if not request.replica_pinned and reads_from_replica(view_func, request.method):
+            routing.alias = random.choice(settings.ORDERS_REPLICA_DATABASES)
+        request.read_database = routing.alias or DEFAULT_DB_ALIAS
+        return None
+
+    @staticmethod
+    def is_pinned(request) -> bool:
+        """
+        Проверяет, закреплен ли клиент за основной БД после недавней записи.
+        """
+        pinned_until = request.COOKIES.get(settings.ORDERS_REPLICA_PIN_COOKIE, "")
+        try:
+            return float(pinned_until) > time.time()
+        except ValueError:
+            return False
+
+    @staticmethod
+    def pin(request, response):
+        """
+        Закрепляет клиента за основной БД после изменяющего запроса.
+        """
+        if request.method not in SAFE_METHODS:
+            seconds = settings.ORDERS_REPLICA_PIN_SECONDS
+            response.set_cookie(settings.ORDERS_REPLICA_PIN_COOKIE, str(time.time() + seconds),
+                                max_age=seconds, httponly=True, samesite="Lax")
+        return response
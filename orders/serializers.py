@@ -1,5 +1,12 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
-from orders.models import Order, Item
+from rest_framework.validators import UniqueValidator
+
+from orders.catalogue import item_catalogue
+from orders.models import ArchivedOrder, Order, OrderLine, Item
 
 class ItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,7 +14,208 @@ class ItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'price']
 
 
+class CatalogueItemField(serializers.PrimaryKeyRelatedField):
+    """
+    Поле ID блюда, проверяемое по каталогу меню (orders.catalogue) без запроса к БД.
+    """
+    def __init__(self, **kwargs):
+        if not kwargs.get('read_only'):
+            kwargs.setdefault('queryset', Item.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not isinstance(data, (str, int)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        item = item_catalogue.get(data)
+        if item is None:
+            self.fail('does_not_exist', pk_value=data)
+        return item
+
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    item = CatalogueItemField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+    class Meta:
+        model = OrderLine
+        fields = ['item', 'quantity', 'unit_price']
+        read_only_fields = ['unit_price']
+
+
+class OrderListSerializer(serializers.ListSerializer):
+    """
+    Пакетное создание заказов (OrderViewSet.bulk_create).
+
+    Уникальность номеров столов среди открытых заказов проверяется для всего
+    пакета одним запросом, заказы и строки записываются пакетными INSERT.
+    """
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('allow_empty', False)
+        kwargs.setdefault('max_length', settings.ORDERS_BULK_MAX_SIZE)
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        # Ошибки уникальности возвращаются списком по заказам,
+        # как и ошибки проверки отдельных заказов
+        attrs = super().to_internal_value(data)
+        # Закрытые заказы стол не занимают
+        table_numbers = [order['table_number'] for order in attrs
+                         if order.get('status') != Order.CLOSED_STATUS]
+        taken = set(
+            Order.objects.active().filter(table_number__in=table_numbers)
+            .values_list('table_number', flat=True)
+        )
+        errors, seen = [], set()
+        for order in attrs:
+            table_number = order['table_number']
+            if order.get('status') == Order.CLOSED_STATUS:
+                errors.append({})
+                continue
+            if table_number in taken or table_number in seen:
+                errors.append({'table_number': ["Заказ для этого стола уже существует."]})
+            else:
+                errors.append({})
+            seen.add(table_number)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        orders = []
+        for attrs in validated_data:
+            quantities = OrderSerializer._pop_quantities(attrs)
+            attrs.pop('version', None)
+            orders.append((Order(**attrs), quantities))
+        return Order.objects.create_with_lines(orders)
+
+
 class OrderSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор заказа.
+
+    Состав заказа передается либо списком ID блюд в поле items
+    (повтор ID увеличивает количество), либо списком строк в поле lines
+    с явным количеством: [{"item": 1, "quantity": 3}].
+
+    Поле version содержит текущую версию заказа. Переданное при изменении,
+    оно задает версию, которую видел клиент: если заказ с тех пор изменен,
+    сохранение завершается исключением OrderVersionConflict.
+    """
+    items = CatalogueItemField(many=True, required=False, write_only=True)
+    lines = OrderLineSerializer(many=True, required=False)
+
     class Meta:
         model = Order
-        fields = ['id', 'table_number', 'total_price', 'status', 'items']
\ No newline at end of file
+        fields = ['id', 'table_number', 'total_price', 'status', 'items', 'lines', 'version',
+                  'created_at']
+        extra_kwargs = {'version': {'required': False, 'min_value': 1}}
+        list_serializer_class = OrderListSerializer
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if isinstance(self.parent, OrderListSerializer):
+            # При пакетном создании уникальность проверяет OrderListSerializer
+            fields['table_number'].validators = [
+                validator for validator in fields['table_number'].validators
+                if not isinstance(validator, UniqueValidator)
+            ]
+        return fields
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # ID блюд берем из уже подгруженных строк, без отдельного запроса
+        data['items'] = [line['item'] for line in data['lines']]
+        return data
+
+    def validate_status(self, value):
+        # Статус существующего заказа меняется только по графу переходов
+        if self.instance is not None and value != self.instance.status \
+                and not self.instance.can_transition_to(value):
+            raise serializers.ValidationError(
+                f"Нельзя изменить статус «{self.instance.get_status_display()}» "
+                f"на «{Order.STATUS_LABELS[value]}»."
+            )
+        return value
+
+    def validate(self, attrs):
+        if self.instance is None and not attrs.get('items') and not attrs.get('lines'):
+            raise serializers.ValidationError(
+                {"items": "Заказ не может быть пустым."}
+            )
+        return attrs
+
+    @staticmethod
+    def _pop_quantities(validated_data):
+        """
+        Извлекает состав заказа из данных в виде {Item: количество}.
+
+        Returns:
+            dict | None: Количество по блюдам или None, если состав не передан.
+        """
+        items = validated_data.pop('items', None)
+        lines = validated_data.pop('lines', None)
+        if lines:
+            quantities = Counter()
+            for line in lines:
+                quantities[line['item']] += line['quantity']
+            return quantities
+        if items:
+            return Counter(items)
+        return None
+
+    def create(self, validated_data):
+        quantities = self._pop_quantities(validated_data)
+        validated_data.pop('version', None)
+        with transaction.atomic():
+            order = Order.objects.create(**validated_data)
+            order.set_lines(quantities)
+        return order
+
+    def update(self, instance, validated_data):
+        quantities = self._pop_quantities(validated_data)
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+            if quantities is not None:
+                instance.set_lines(quantities)
+        return instance
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """
+    Заказ из архива (только чтение).
+
+    Строки возвращаются в том же виде, что и у текущих заказов:
+    [{"item": 1, "quantity": 3, "unit_price": "150.00"}].
+    """
+    items = serializers.SerializerMethodField()
+    lines = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ['id', 'table_number', 'total_price', 'status', 'created_at', 'paid_at',
+                  'archived_at', 'items', 'lines']
+        read_only_fields = fields
+
+    def get_items(self, instance):
+        return [item_id for item_id, _, _ in instance.lines]
+
+    def get_lines(self, instance):
+        # Цена за единицу уже записана в JSON строкой ("150.00")
+        return [
+            {'item': item_id, 'quantity': quantity, 'unit_price': unit_price}
+            for item_id, quantity, unit_price in instance.lines
+        ]
+
+
+class BulkStatusSerializer(serializers.Serializer):
+    """
+    Данные пакетной смены статуса: ID заказов и новый статус.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.ORDERS_BULK_MAX_SIZE,
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
@@ -1,17 +1,381 @@
-from django.db.models.signals import m2m_changed
+from decimal import Decimal
+
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
 from django.dispatch import receiver
-from orders.models import Order
+from django.utils import timezone
+
+from orders import analytics, broadcast, eventlog, revenue
+from orders.cache import invalidate_orders, invalidate_items
+from orders.models import (Order, OrderLine, Item, LINE_TOTAL,
+                           total_price_changed, order_lines_changed,
+                           orders_created, orders_status_changed)
+
+
+def _lines_total(lines) -> Decimal:
+    """
+    Возвращает сумму стоимости строк заказа одним запросом.
+    """
+    total = lines.aggregate(total=Sum(LINE_TOTAL))["total"]
+    return total or Decimal(0)
+
+
+def _fill_unit_prices(lines):
+    """
+    Записывает в строки без цены текущую стоимость блюда одним UPDATE.
+
+    Строки, добавленные через order.items.add() / set(), создаются без
+    цены, так как through_defaults общие для всех блюд.
+    """
+    lines.filter(unit_price__isnull=True).update(
+        unit_price=Subquery(
+            Item.objects.filter(pk=OuterRef("item_id")).values("price")[:1]
+        )
+    )
 
 
 @receiver(m2m_changed, sender=Order.items.through)
-def update_total_price_on_items_change(sender, instance, action, **kwargs):
+def update_total_price_on_items_change(sender, instance, action, reverse, pk_set, **kwargs):
     """
     Сигнал для обновления общей стоимости заказа при изменении списка блюд.
+
+    Вместо пересчета всех блюд заказа считается только разница по
+    изменившимся строкам (pk_set), которая применяется к total_price
+    атомарным выражением UPDATE ... SET total_price = total_price + delta
+    с проверкой версии заказа (Order.update_versioned).
+    Изменения со стороны блюда (item.order_set) затрагивают несколько
+    заказов с разным количеством, поэтому их суммы пересчитываются в БД.
+    """
+    if reverse:
+        _update_orders_on_item_change(instance, action, pk_set)
+        return
+
+    if action.startswith("post_"):
+        invalidate_orders([instance.pk])
+
+    lines = OrderLine.objects.filter(order_id=instance.pk)
+
+    if action in ("pre_remove", "pre_clear"):
+        # До удаления считаем стоимость строк, которые действительно есть:
+        # в pk_set при remove могут оказаться блюда, которых нет в заказе
+        if action == "pre_remove":
+            lines = lines.filter(item_id__in=pk_set)
+        instance._total_price_delta = -_lines_total(lines)
+        return
+
+    if action == "post_add":
+        added_lines = lines.filter(item_id__in=pk_set)
+        _fill_unit_prices(added_lines)
+        # Строки читаются одним запросом: для суммы и для журнала событий
+        added = list(added_lines.values_list("item_id", "quantity", "unit_price"))
+        delta = sum((quantity * unit_price for _, quantity, unit_price in added), Decimal(0))
+    elif action in ("post_remove", "post_clear"):
+        delta = getattr(instance, "_total_price_delta", Decimal(0))
+        instance._total_price_delta = Decimal(0)
+    else:
+        return
+
+    if delta:
+        updated_at = timezone.now()
+        instance.update_versioned(total_price=F("total_price") + delta,
+                                  updated_at=updated_at)
+        instance.total_price = instance.total_price + delta
+        instance.updated_at = updated_at
+        instance.__dict__.setdefault("_saved_state", {})["total_price"] = instance.total_price
+        total_price_changed.send(sender=Order, order_pks=[instance.pk], delta=delta)
+
+    # Строки оплаченного заказа исправлены: пересчитываем час его оплаты
+    analytics.refresh_orders([instance])
+
+    if action == "post_add":
+        eventlog.record_lines_changed(instance, upserted=added)
+    elif action == "post_remove":
+        eventlog.record_lines_changed(instance, removed=pk_set)
+    else:
+        eventlog.record_lines_changed(instance, clear=True)
+
+
+def _update_orders_on_item_change(item, action, pk_set):
+    """
+    Пересчитывает суммы заказов, в которые блюдо добавлено или из которых удалено.
+    """
+    if action == "pre_clear":
+        # Запоминаем заказы до очистки связей
+        item._total_price_order_pks = set(
+            OrderLine.objects.filter(item_id=item.pk).values_list("order_id", flat=True)
+        )
+        return
+
+    if action == "post_add":
+        _fill_unit_prices(OrderLine.objects.filter(item_id=item.pk, order_id__in=pk_set))
+        order_pks = pk_set
+    elif action == "post_remove":
+        order_pks = pk_set
+    elif action == "post_clear":
+        order_pks = getattr(item, "_total_price_order_pks", set())
+        item._total_price_order_pks = set()
+    else:
+        return
+
+    if order_pks:
+        recalculate_orders(order_pks)
+
+
+def recalculate_orders(order_pks):
+    """
+    Пересчитывает суммы заказов по их строкам, измененным в обход Order.set_lines
+    и m2m_changed заказа, или разошедшимся со строками (verify_order_totals --fix):
+    учитывает разницу в выручке, записывает строки в журнал событий,
+    обновляет часовые агрегаты и инвалидирует кэш.
+
+    Args:
+        order_pks (Iterable[int]): ID заказов.
+
+    Returns:
+        int: Количество пересчитанных заказов.
+    """
+    order_pks = list(order_pks)
+    with revenue.track_total_changes(order_pks):
+        updated = Order.objects.filter(pk__in=order_pks).recalculate_totals()
+    eventlog.record_lines_snapshot(order_pks)
+    analytics.refresh_order_pks(order_pks)
+    invalidate_orders(order_pks)
+    return updated
+
+
+@receiver(total_price_changed, sender=Order)
+def update_revenue_on_total_price_change(sender, order_pks, delta, **kwargs):
+    """
+    Учитывает в выручке изменение суммы оплаченных заказов.
+    """
+    revenue.on_total_delta(order_pks, delta)
+
+
+@receiver(orders_created, sender=Order)
+def update_revenue_on_orders_created(sender, orders, **kwargs):
+    """
+    Учитывает в выручке оплаченные заказы, созданные пакетно.
+    """
+    revenue.add_orders_revenue(orders)
+
+
+@receiver(orders_status_changed, sender=Order)
+def update_revenue_on_orders_status_change(sender, orders, **kwargs):
+    """
+    Учитывает в выручке пакетную смену статуса заказов.
+    """
+    revenue.on_status_changed(orders)
+
+
+@receiver(pre_save, sender=Order)
+def set_paid_at(sender, instance, **kwargs):
+    """
+    Фиксирует время оплаты при переходе заказа в статус "paid"
+    и сбрасывает его при выходе из этого статуса.
+    """
+    was_paid = instance.saved_state.get("status") == "paid"
+    if instance.status == "paid" and not was_paid:
+        instance.paid_at = timezone.now()
+    elif instance.status != "paid" and was_paid:
+        instance.paid_at = None
+
+
+@receiver(post_save, sender=Order)
+def update_revenue_on_order_save(sender, instance, created, update_fields, **kwargs):
+    """
+    Обновляет счетчики выручки, если заказ перешел в статус "paid",
+    вышел из него или у оплаченного заказа изменилась сумма.
+    """
+    saved_state = instance.saved_state
+    was_paid = saved_state.get("status") == "paid"
+    old_total = saved_state.get("total_price", Decimal(0))
+
+    if update_fields is not None and not {"status", "total_price"} & set(update_fields):
+        return
+
+    if was_paid and instance.status == "paid":
+        revenue.add_revenue(instance.total_price - old_total, instance.paid_at)
+    elif was_paid:
+        revenue.add_revenue(-old_total, saved_state.get("paid_at"))
+    elif instance.status == "paid":
+        revenue.add_revenue(instance.total_price, instance.paid_at)
+
+
+@receiver(post_delete, sender=Order)
+def update_revenue_on_order_delete(sender, instance, **kwargs):
+    """
+    Исключает из выручки удаленный оплаченный заказ.
+    """
+    saved_state = instance.saved_state
+    if saved_state.get("status") == "paid":
+        revenue.add_revenue(-saved_state["total_price"], saved_state.get("paid_at"))
+
+
+@receiver(post_save, sender=Order)
+def update_rollups_on_order_save(sender, instance, created, update_fields, **kwargs):
+    """
+    Обновляет часовые агрегаты продаж, если заказ оплачен, вышел из статуса
+    "paid" или у оплаченного заказа изменились сумма, стол или время оплаты.
+    """
+    if update_fields is not None and not {"status", "total_price", "table_number"} & set(update_fields):
+        return
+    saved_state = instance.saved_state
+    if not created and all(
+        getattr(instance, field) == saved_state.get(field) for field in Order.tracked_fields
+    ):
+        return
+    analytics.on_orders_changed([instance])
+
+
+@receiver(post_delete, sender=Order)
+def update_rollups_on_order_delete(sender, instance, **kwargs):
+    """
+    Пересчитывает час оплаты удаленного оплаченного заказа.
+    """
+    saved_state = instance.saved_state
+    if saved_state.get("status") == "paid" and saved_state.get("paid_at") is not None:
+        analytics.refresh_hours([analytics.hour_start(saved_state["paid_at"])])
+
+
+@receiver(orders_created, sender=Order)
+def update_rollups_on_orders_created(sender, orders, **kwargs):
+    """
+    Учитывает в агрегатах продаж оплаченные заказы, созданные пакетно.
+    """
+    analytics.add_paid_orders(orders)
+
+
+@receiver(orders_status_changed, sender=Order)
+def update_rollups_on_orders_status_change(sender, orders, **kwargs):
+    """
+    Учитывает в агрегатах продаж смену статуса заказов.
+    """
+    analytics.on_orders_changed(orders)
+
+
+@receiver(order_lines_changed, sender=Order)
+def update_rollups_on_order_lines_change(sender, order, **kwargs):
+    """
+    Пересчитывает час оплаты оплаченного заказа, строки которого изменены.
+    """
+    analytics.refresh_orders([order])
+
+
+@receiver(post_save, sender=Order)
+def log_order_save(sender, instance, created, update_fields, **kwargs):
+    """
+    Записывает в журнал событий создание и изменение заказа.
+    """
+    eventlog.record_saved(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=Order)
+def log_order_delete(sender, instance, **kwargs):
+    """
+    Записывает в журнал событий удаление заказа.
+    """
+    eventlog.record_deleted(instance)
+
+
+@receiver(orders_created, sender=Order)
+def log_orders_created(sender, orders, lines=(), **kwargs):
+    """
+    Записывает в журнал событий заказы, созданные пакетно, одним INSERT.
+    """
+    eventlog.record_created(orders, lines)
+
+
+@receiver(orders_status_changed, sender=Order)
+def log_orders_status_change(sender, orders, **kwargs):
+    """
+    Записывает в журнал событий смену статуса заказов одним INSERT.
+    """
+    eventlog.record_status_changed(orders)
+
+
+@receiver(order_lines_changed, sender=Order)
+def log_order_lines_change(sender, order, upserted, removed, **kwargs):
+    """
+    Записывает в журнал событий изменение строк заказа (Order.set_lines).
+    """
+    eventlog.record_lines_changed(order, upserted=upserted, removed=removed)
+
+
+@receiver(order_lines_changed, sender=Order)
+@receiver(total_price_changed, sender=Order)
+def invalidate_cache_on_order_lines_change(sender, order_pks, **kwargs):
+    """
+    Инвалидирует кэш страниц заказов при изменении строк или суммы.
     """
-    # Проверяем, что сигнал сработал после добавления, удаления или очистки блюд
-    if action in ('post_add', 'post_remove', 'post_clear'):
-        # Пересчитываем total_price
-        instance.total_price = sum(item.price for item in instance.items.all())
+    invalidate_orders(order_pks)
+
 
-        # Сохраняем заказ, но обновляем только поле total_price
-        instance.save(update_fields=['total_price'])
\ No newline at end of file
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_cache_on_order_change(sender, instance, **kwargs):
+    """
+    Инвалидирует кэш списков заказов и страницы заказа.
+    """
+    invalidate_orders([instance.pk])
+
+
+@receiver(orders_created, sender=Order)
+def invalidate_cache_on_orders_created(sender, orders, **kwargs):
+    """
+    Инвалидирует кэш списков заказов после пакетного создания.
+    """
+    invalidate_orders()
+
+
+@receiver(orders_status_changed, sender=Order)
+def invalidate_cache_on_orders_status_change(sender, orders, **kwargs):
+    """
+    Инвалидирует кэш списков и страниц заказов после пакетной смены статуса.
+    """
+    invalidate_orders([order.pk for order in orders])
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def invalidate_cache_on_item_change(sender, instance, **kwargs):
+    """
+    Инвалидирует кэш страниц, на которых отображаются блюда.
+    """
+    invalidate_items()
+
+
+@receiver(post_save, sender=Order)
+def broadcast_order_save(sender, instance, created, **kwargs):
+    """
+    Рассылает подключенным экранам создание заказа и смену его статуса.
+    """
+    if created:
+        broadcast.publish_order_event("order_created", instance)
+    elif instance.status != instance.saved_state.get("status"):
+        broadcast.publish_order_event("order_status_changed", instance)
+
+
+@receiver(post_delete, sender=Order)
+def broadcast_order_delete(sender, instance, **kwargs):
+    """
+    Рассылает подключенным экранам удаление заказа.
+    """
+    broadcast.publish_order_event("order_deleted", instance)
+
+
+@receiver(orders_created, sender=Order)
+def broadcast_orders_created(sender, orders, **kwargs):
+    """
+    Рассылает создание заказов, созданных пакетно.
+    """
+    for order in orders:
+        broadcast.publish_order_event("order_created", order)
+
+
+@receiver(orders_status_changed, sender=Order)
+def broadcast_orders_status_change(sender, orders, **kwargs):
+    """
+    Рассылает пакетную смену статуса заказов.
+    """
+    for order in orders:
+        broadcast.publish_order_event("order_status_changed", order)
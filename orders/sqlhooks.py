@@ -0,0 +1,50 @@
+"""
+Общий перехват SQL-запросов для метрик (orders.metrics) и проверки
+запросов (orders.queryguard).
+
+На каждое соединение с БД устанавливается один execute_wrapper, который
+измеряет время запроса и передает SQL и время всем зарегистрированным
+обработчикам. Обработчики сами решают, учитывать ли запрос (по своему
+contextvar), поэтому вне измеряемых запросов они ничего не делают.
+Пока обработчиков нет, execute_wrapper не устанавливается.
+"""
+import time
+from typing import Callable
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_observers: list = []
+
+
+def _execute(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for observer in _observers:
+            observer(sql, duration)
+
+
+def _install_wrapper(connection):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install_wrapper(connection)
+
+
+def register(observer: Callable[[str, float], None]):
+    """
+    Подключает обработчик SQL-запросов к открытым и новым соединениям с БД.
+
+    Args:
+        observer (callable): Функция (sql, время выполнения в секундах).
+    """
+    if observer not in _observers:
+        _observers.append(observer)
+    connection_created.connect(_on_connection_created, dispatch_uid="orders.sqlhooks")
+    for connection in connections.all(initialized_only=True):
+        _install_wrapper(connection)
@@ -59,6 +59,34 @@ $(document).ready(function () {
         $("#newOrderStatusInput").val(selectedValue)
     });
 
+    // Отображение статуса заказа и запоминание его версии
+    function showOrderStatus(order) {
+        $("#orderCard").data("version", order.version)
+        $(".actual-order-status")
+            .html(`<h5>${order.status_display}</h5>`)
+            .removeClass()
+            .addClass(`order-status-${order.status}`)
+            .addClass(`ms-2`)
+            .addClass(`actual-order-status`)
+    }
+
+    // Обновление статуса заказа по событиям сервера (SSE) без перезагрузки страницы
+    var eventsUrl = $("#orderCard").data("events_url");
+    if (eventsUrl && window.EventSource) {
+        var orderEvents = new EventSource(eventsUrl);
+
+        orderEvents.addEventListener("order_status_changed", function (e) {
+            showOrderStatus(JSON.parse(e.data));
+        });
+
+        orderEvents.addEventListener("order_deleted", function () {
+            orderEvents.close();
+            $('#openModalForDeleteButton').remove();
+            $('.order-list-card').addClass("blur-4");
+            $(".table").after(`<h4 class="text-danger">Заказ удален</h4>`)
+        });
+    }
+
     $("#changeOrderStatusForm").submit(function (e) { 
         e.preventDefault();
 
@@ -66,6 +94,7 @@ $(document).ready(function () {
         var urlForRequest = $(this).attr("action")
         var csrfToken = $(this).data("csrf_token")
         var newStatus = $("#newOrderStatusInput").val()
+        var version = $("#orderCard").data("version")
 
         $.ajax({
             type: "PATCH",
@@ -73,7 +102,10 @@ $(document).ready(function () {
             contentType: "application/json",
             dataType: "json",
             data: JSON.stringify({  // Преобразуем объект в JSON
-                new_status: newStatus
+                new_status: newStatus,
+                // Версия заказа, которую видит пользователь: если заказ
+                // уже изменен другим запросом, сервер вернет 409
+                version: version
             }),
             headers: {
                 "X-CSRFToken": csrfToken
@@ -82,7 +114,6 @@ $(document).ready(function () {
                 if (response.success) {
                     var messageParts = response.message.split("_");
                     var messageForAlert = messageParts[0]
-                    var newActualStatus = messageParts[1]
 
                     showSuccessAlert(messageForAlert);
 
@@ -90,16 +121,23 @@ $(document).ready(function () {
                     $("#confirmChangeOrderStatusButton").addClass("d-none")
                     $("#cancelChangeOrderStatusButton").addClass("d-none")
                     $("#changeOrderStatusButton").removeClass("d-none")
-                    $(".actual-order-status")
-                        .html(`<h5>${newActualStatus}</h5>`)
-                        .removeClass()
-                        .addClass(`order-status-${newStatus}`)
-                        .addClass(`ms-2`)
-                        .addClass(`actual-order-status`)
+                    // Состояние и версия заказа - из ответа сервера. Событие SSE
+                    // о более позднем изменении могло прийти раньше ответа
+                    var shownVersion = $("#orderCard").data("version")
+                    if (!(shownVersion > response.data.version)) {
+                        showOrderStatus(response.data)
+                    }
                     // setTimeout(function () {
                     //     window.location.reload()
                     // }, 2000);   
                 }
+            },
+            error: function (xhr) {
+                if (xhr.status === 409) {
+                    // Заказ изменен другим пользователем: показываем текущий статус
+                    showOrderStatus(xhr.responseJSON.data);
+                    showDangerAlert(xhr.responseJSON.message);
+                }
             }
         });
         
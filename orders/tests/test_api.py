@@ -1,7 +1,18 @@
+import datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
-from orders.models import Order, Item
+from orders.catalogue import item_catalogue
+from orders.archive import archive_closed_orders
+from orders.models import ArchivedOrder, Order, Item
+from orders.queryguard import QueryGuard
+from orders.revenue import get_revenue
 
 
 class BaseOrderViewSetTests(APITestCase):
@@ -63,6 +74,346 @@ class OrderViewSetTests(BaseOrderViewSetTests):
         self.assertEqual(new_order.table_number, 15)
         self.assertEqual(new_order.total_price, expected_total_price)
 
+    def test_list_orders_queries_count_is_constant(self):
+        """
+        Проверка, что список заказов загружается фиксированным числом запросов
+        """
+        list_url = reverse('orders:order-list')
+
+        with self.assertNumQueries(3):
+            response = self.client.get(list_url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for table_number in range(100, 130):
+            order = Order.objects.create(table_number=table_number)
+            order.items.set([self.item_1, self.item_2])
+
+        with self.assertNumQueries(3):
+            response = self.client.get(list_url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 34)
+
+    def test_list_orders_cursor_pagination(self):
+        """
+        Проверка курсорной пагинации списка заказов
+        """
+        list_url = reverse('orders:order-list')
+
+        response = self.client.get(list_url, {"page_size": 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_page_ids = [order["id"] for order in response.data["results"]]
+        self.assertEqual(first_page_ids, [self.order_1.id, self.order_2.id, self.order_3.id])
+        self.assertIsNotNone(response.data["next"])
+
+        # Новый заказ, созданный между запросами, не сдвигает страницы
+        Order.objects.create(table_number=99)
+
+        response = self.client.get(response.data["next"], format='json')
+        second_page_ids = [order["id"] for order in response.data["results"]]
+        self.assertEqual(second_page_ids[0], self.order_4.id)
+        self.assertEqual(len(second_page_ids), 2)
+
+    def test_list_orders_page_size_limit(self):
+        """
+        Проверка ограничения размера страницы настройкой ORDERS_MAX_PAGE_SIZE
+        """
+        list_url = reverse('orders:order-list')
+
+        with self.settings(ORDERS_MAX_PAGE_SIZE=2):
+            response = self.client.get(list_url, {"page_size": 100}, format='json')
+
+        self.assertEqual(len(response.data["results"]), 2)
+
+        # Цифры вне ASCII проходят str.isnumeric, но не int(): размер по умолчанию
+        response = self.client.get(list_url, {"page_size": "²"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 4)
+
+    def test_create_order_with_lines(self):
+        """
+        Проверка создания заказа с количеством блюд
+        """
+        list_url = reverse('orders:order-list')
+        data = {
+            "table_number": 16,
+            "lines": [
+                {"item": self.item_2.id, "quantity": 3},
+                {"item": self.item_1.id},
+            ]
+        }
+        response = self.client.post(list_url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["total_price"], "1050.00")
+        self.assertEqual(response.data["items"], [self.item_2.id, self.item_1.id])
+
+        new_order = Order.objects.get(id=response.data["id"])
+        quantities = dict(new_order.lines.values_list("item_id", "quantity"))
+        self.assertEqual(quantities, {self.item_2.id: 3, self.item_1.id: 1})
+
+    def test_create_order_with_unknown_item(self):
+        """
+        Проверка, что ID блюд проверяются по каталогу меню.
+        """
+        url = reverse('orders:order-list')
+        for items in ([999], ["abc"], [{"id": 1}]):
+            response = self.client.post(url, {"table_number": 12, "items": items}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("items", response.data)
+
+        self.assertFalse(Order.objects.filter(table_number=12).exists())
+
+    def test_create_order_without_items(self):
+        """
+        Проверка, что пустой заказ не создается
+        """
+        list_url = reverse('orders:order-list')
+        response = self.client.post(list_url, {"table_number": 17}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("items", response.data)
+
+    def test_bulk_create_orders(self):
+        """
+        Проверка пакетного создания заказов
+        """
+        url = reverse('orders:order-bulk-create')
+        data = [
+            {"table_number": 21, "items": [self.item_1.id, self.item_2.id]},
+            {"table_number": 22, "lines": [{"item": self.item_3.id, "quantity": 2}]},
+            {"table_number": 23, "items": [self.item_2.id], "status": "paid"},
+        ]
+        revenue_before = get_revenue()
+
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([order["total_price"] for order in response.data],
+                         ["650.00", "5000.00", "200.00"])
+        self.assertEqual(response.data[1]["lines"][0]["quantity"], 2)
+        self.assertEqual(Order.objects.get(table_number=22).lines.get().unit_price, 2500)
+        self.assertIsNotNone(Order.objects.get(table_number=23).paid_at)
+        self.assertEqual(get_revenue(), revenue_before + 200)
+
+    def test_bulk_create_orders_queries_count_is_constant(self):
+        """
+        Проверка, что число запросов не зависит от размера пакета
+        """
+        url = reverse('orders:order-bulk-create')
+
+        def post(table_numbers):
+            data = [{"table_number": number, "items": [self.item_1.id, self.item_3.id]}
+                    for number in table_numbers]
+            item_catalogue.all()  # Прогрев каталога меню
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(post(range(30, 32)), post(range(40, 60)))
+
+    def test_create_order_for_table_with_closed_order(self):
+        """
+        Проверка, что оплаченный заказ не занимает стол
+        """
+        url = reverse('orders:order-list')
+        response = self.client.post(url, {"table_number": self.order_4.table_number,
+                                          "items": [self.item_2.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(url, {"table_number": self.order_1.table_number,
+                                          "items": [self.item_2.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("table_number", response.data)
+
+        response = self.client.post(reverse('orders:order-bulk-create'), [
+            {"table_number": self.order_3.table_number, "items": [self.item_2.id]},
+            {"table_number": 41, "items": [self.item_2.id], "status": "paid"},
+            {"table_number": 41, "items": [self.item_2.id]},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_archived_orders_list(self):
+        """
+        Проверка чтения архива заказов
+        """
+        archive_closed_orders(older_than=datetime.timedelta(0))
+
+        url = reverse('orders:archived-order-list')
+        response = self.client.get(url, {"table_number": self.order_3.table_number})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([order["id"] for order in response.data["results"]], [self.order_3.id])
+        archived = response.data["results"][0]
+        self.assertEqual(archived["status"], "paid")
+        self.assertEqual(sorted(archived["items"]),
+                         sorted([self.item_1.id, self.item_2.id, self.item_3.id]))
+        self.assertEqual({line["unit_price"] for line in archived["lines"]},
+                         {"450.00", "200.00", "2500.00"})
+
+        response = self.client.get(reverse('orders:archived-order-detail', args=[self.order_4.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+
+        response = self.client.get(url, {"table_number": "²"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [])
+
+        response = self.client.delete(reverse('orders:archived-order-detail', args=[self.order_4.id]))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_bulk_create_orders_validates_batch(self):
+        """
+        Проверка, что при ошибке в одном заказе не создается ни один
+        """
+        url = reverse('orders:order-bulk-create')
+        data = [
+            {"table_number": 31, "items": [self.item_1.id]},
+            {"table_number": 31, "items": [self.item_2.id]},
+            {"table_number": self.order_1.table_number, "items": [self.item_2.id]},
+            {"table_number": 32},
+        ]
+
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("items", response.data[3])
+        self.assertFalse(Order.objects.filter(table_number__in=[31, 32]).exists())
+
+        del data[3]
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("table_number", response.data[1])
+        self.assertIn("table_number", response.data[2])
+        self.assertFalse(Order.objects.filter(table_number=31).exists())
+
+    def test_change_status_writes_only_status(self):
+        """
+        Проверка, что смена статуса не перезаписывает остальные поля заказа
+        """
+        url = reverse('orders:order-change-status', args=[self.order_1.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {"status": "ready"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        update_sql = [query["sql"] for query in queries if query["sql"].startswith("UPDATE \"orders_order\"")]
+        self.assertEqual(len(update_sql), 1)
+        self.assertNotIn("table_number", update_sql[0])
+        self.assertNotIn("total_price", update_sql[0])
+
+    def test_change_status_not_allowed_transition(self):
+        """
+        Проверка, что оплаченный заказ нельзя вернуть в другой статус
+        """
+        url = reverse('orders:order-change-status', args=[self.order_3.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {"status": "pending"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['allowed'], [])
+        self.assertFalse([query for query in queries if query["sql"].startswith("UPDATE")])
+        self.order_3.refresh_from_db()
+        self.assertEqual(self.order_3.status, 'paid')
+
+        detail_url = reverse('orders:order-detail', args=[self.order_3.id])
+        response = self.client.patch(detail_url, {"status": "ready"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('status', response.data)
+
+    def test_change_status_version_conflict(self):
+        """
+        Проверка ответа 409 при смене статуса заказа, измененного другим запросом
+        """
+        url = reverse('orders:order-change-status', args=[self.order_1.id])
+        version = self.order_1.version
+        response = self.client.post(url, {"status": "ready", "version": version}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], version + 1)
+
+        response = self.client.post(url, {"status": "paid", "version": version}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['current']['status'], 'ready')
+        self.assertEqual(response.data['current']['version'], version + 1)
+        self.order_1.refresh_from_db()
+        self.assertEqual(self.order_1.status, 'ready')
+
+    def test_update_order_version_conflict(self):
+        """
+        Проверка ответа 409 при изменении заказа по устаревшей версии
+        """
+        Order.objects.filter(pk=self.order_1.pk).update(version=5)
+
+        detail_url = reverse('orders:order-detail', args=[self.order_1.id])
+        data = {
+            "table_number": self.order_1.table_number,
+            "lines": [{"item": self.item_1.id, "quantity": 3}],
+            "version": 4
+        }
+        response = self.client.put(detail_url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['current']['version'], 5)
+        self.assertFalse(self.order_1.lines.filter(quantity=3).exists())
+
+    def test_bulk_status(self):
+        """
+        Проверка пакетной смены статуса
+        """
+        url = reverse('orders:order-bulk-status')
+        revenue_before = get_revenue()
+        data = {"ids": [self.order_1.id, self.order_2.id, self.order_3.id, 999], "status": "paid"}
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], {
+            self.order_1.id: "updated",
+            self.order_2.id: "updated",
+            self.order_3.id: "unchanged",
+            999: "not_found",
+        })
+        order_updates = [query for query in queries
+                         if query["sql"].startswith("UPDATE \"orders_order\"")]
+        self.assertEqual(len(order_updates), 1)
+
+        self.order_1.refresh_from_db()
+        self.assertEqual(self.order_1.status, "paid")
+        self.assertIsNotNone(self.order_1.paid_at)
+        self.assertEqual(get_revenue(),
+                         revenue_before + self.order_1.total_price + self.order_2.total_price)
+
+        # Оплаченные заказы закрыты: переход из "paid" не разрешен
+        response = self.client.post(url, {"ids": [self.order_1.id, self.order_4.id],
+                                          "status": "ready"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], {
+            self.order_1.id: "not_allowed",
+            self.order_4.id: "not_allowed",
+        })
+        self.assertEqual(get_revenue(),
+                         revenue_before + self.order_1.total_price + self.order_2.total_price)
+        self.order_4.refresh_from_db()
+        self.assertEqual(self.order_4.status, "paid")
+
+    def test_bulk_status_invalid_data(self):
+        """
+        Проверка пакетной смены статуса с невалидными данными
+        """
+        url = reverse('orders:order-bulk-status')
+        for data in ({"ids": [self.order_1.id], "status": "cooking"},
+                     {"ids": [], "status": "paid"},
+                     {"ids": ["abc"], "status": "paid"}):
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.order_1.refresh_from_db()
+        self.assertEqual(self.order_1.status, "pending")
+
     def test_get_single_order(self):
         """
         Проверка получения заказа по ID
@@ -113,3 +464,170 @@ class OrderViewSetTests(BaseOrderViewSetTests):
         # Проверка отсутствия заказа в базе
         with self.assertRaises(Order.DoesNotExist):
             Order.objects.get(id=order_for_delete_id)
+
+
+class AnalyticsTests(BaseOrderViewSetTests):
+    """
+    Тесты отчетов о продажах /api/analytics/
+    """
+    def test_summary(self):
+        self.order_1.transition_to("paid")
+        today = timezone.localdate().isoformat()
+
+        response = self.client.get(reverse('orders:analytics-list'), {"start": today, "end": today})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["orders_count"], 3)
+        self.assertEqual(response.data["revenue"], get_revenue())
+        self.assertEqual(response.data["items_sold"], 8)
+
+    def test_reports(self):
+        url = reverse('orders:analytics-items')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Отчет суммирует агрегаты, не читая заказы
+        self.assertFalse([query for query in queries.captured_queries
+                          if "orders_order" in query["sql"]])
+        self.assertEqual(response.data["results"][0],
+                         {"item_id": self.item_3.id, "name": "Стейк",
+                          "quantity": 2, "revenue": Decimal("5000.00")})
+
+        response = self.client.get(reverse('orders:analytics-tables'))
+        self.assertEqual([row["table_number"] for row in response.data["results"]], [2, 7])
+
+        response = self.client.get(reverse('orders:analytics-daily'))
+        self.assertEqual(response.data["results"],
+                         [{"day": timezone.localdate(), "revenue": Decimal("6300.00"),
+                           "orders_count": 2}])
+
+        response = self.client.get(reverse('orders:analytics-hourly'))
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_period_validation(self):
+        url = reverse('orders:analytics-list')
+        for params in ({"start": "2025-13-01"}, {"start": "yesterday"},
+                       {"start": "2025-02-01", "end": "2025-01-01"}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("error", response.data)
+
+        response = self.client.get(url, {"start": "2020-01-01", "end": "2020-01-31"})
+        self.assertEqual(response.data["revenue"], 0)
+        self.assertEqual(response.data["orders_count"], 0)
+
+
+class TopItemsTests(BaseOrderViewSetTests):
+    """
+    Тесты отчета о самых продаваемых блюдах /api/items/top/
+    """
+    url = reverse('orders:item-top')
+
+    def test_top_items(self):
+        self.item_3.refresh_from_db()
+        self.order_1.set_lines({self.item_1: 1, self.item_3: 3})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Один сгруппированный запрос по строкам заказов
+        self.assertEqual(len([query for query in queries.captured_queries
+                              if "orders_orderline" in query["sql"]]), 1)
+        self.assertEqual(response.data["results"][0],
+                         {"item_id": self.item_3.id, "name": "Стейк", "quantity": 6,
+                          "orders_count": 4, "revenue": Decimal("15000.00")})
+        self.assertEqual([row["item_id"] for row in response.data["results"]],
+                         [self.item_3.id, self.item_1.id, self.item_2.id])
+
+        response = self.client.get(self.url, {"status": "paid", "ordering": "revenue", "limit": 2})
+        self.assertEqual([(row["item_id"], row["quantity"]) for row in response.data["results"]],
+                         [(self.item_3.id, 2), (self.item_1.id, 2)])
+
+        yesterday = (timezone.localdate() - datetime.timedelta(days=1)).isoformat()
+        response = self.client.get(self.url, {"end": yesterday})
+        self.assertEqual(response.data["results"], [])
+
+    def test_top_items_include_archived_orders(self):
+        """
+        Проверка, что перенос оплаченных заказов в архив не меняет отчет
+        """
+        params = {"status": "paid", "start": timezone.localdate().isoformat()}
+        before = self.client.get(self.url, params).data["results"]
+
+        archive_closed_orders(older_than=datetime.timedelta(0), batch_size=1, max_batches=1)
+        self.assertEqual(ArchivedOrder.objects.count(), 1)
+        cache.clear()
+
+        self.assertEqual(self.client.get(self.url, params).data["results"], before)
+        self.assertEqual(before[0], {"item_id": self.item_3.id, "name": "Стейк", "quantity": 2,
+                                     "orders_count": 2, "revenue": Decimal("5000.00")})
+        # Архив хранит только оплаченные заказы
+        response = self.client.get(self.url, {"status": "pending"})
+        self.assertEqual(response.data["results"][0]["orders_count"], 2)
+
+    def test_top_items_cache_invalidated_on_order_change(self):
+        response = self.client.get(self.url, {"status": "pending"})
+        self.assertEqual(response.data["results"][0]["quantity"], 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {"status": "pending"})
+        self.assertEqual(len(queries), 0)
+
+        self.item_2.refresh_from_db()
+        self.order_1.set_lines({self.item_2: 5})
+        response = self.client.get(self.url, {"status": "pending"})
+        self.assertEqual(response.data["results"][0],
+                         {"item_id": self.item_2.id, "name": "Чай", "quantity": 6,
+                          "orders_count": 2, "revenue": Decimal("1200.00")})
+
+    def test_top_items_validation(self):
+        for params in ({"status": "closed"}, {"ordering": "name"}, {"start": "2025-02-30"}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Некорректный limit заменяется размером по умолчанию
+        response = self.client.get(self.url, {"limit": "²"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 3)
+
+
+class QueryBudgetTests(BaseOrderViewSetTests):
+    """
+    Класс для тестирования количества SQL-запросов маршрутов API (orders.queryguard)
+    """
+    def setUp(self):
+        super().setUp()
+        for table_number in range(100, 120):
+            order = Order.objects.create(table_number=table_number)
+            order.items.set([self.item_1, self.item_2])
+        # Бюджеты относятся к ответам, построенным без кэша
+        cache.clear()
+
+    def test_read_routes_query_budget(self):
+        """
+        Проверка количества запросов маршрутов чтения без повторов одной формы
+        """
+        budgets = [
+            (reverse("orders:order-list"), 3),
+            (reverse("orders:order-detail", args=[self.order_2.pk]), 3),
+            (reverse("orders:item-list"), 1),
+            # Строки текущих заказов и архив
+            (reverse("orders:item-top"), 2),
+            (reverse("orders:analytics-list"), 2),
+            (reverse("orders:archived-order-list"), 1),
+        ]
+        for url, max_queries in budgets:
+            with self.subTest(url=url):
+                with QueryGuard(max_queries=max_queries, max_repeats=1):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @QueryGuard(max_queries=14, max_repeats=2)
+    def test_create_order_query_budget(self):
+        """
+        Проверка количества запросов создания заказа без N+1 по блюдам
+        """
+        response = self.client.post(reverse("orders:order-list"),
+                                    {"table_number": 50, "items": [self.item_1.pk, self.item_2.pk]},
+                                    format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -1,6 +1,18 @@
-from django.db import IntegrityError
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
-from orders.models import Item, Order
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from orders.cache import get_versions, order_version_key
+from orders.eventlog import replay
+from orders import analytics
+from orders.models import (ArchivedOrder, Item, ItemSalesRollup, Order, OrderEvent,
+                           InvalidStatusTransition, OrderVersionConflict, SalesRollup,
+                           orders_status_changed)
+from orders.revenue import get_revenue, rebuild_revenue
 
 
 # Test for Item model
@@ -115,6 +127,18 @@ class OrderModelTest(TestCase):
         with self.assertRaises(IntegrityError):
             Order.objects.create(table_number=20)
 
+    def test_order_table_number_reusable_after_paid(self):
+        """
+        Проверка, что оплаченный заказ освобождает стол
+        """
+        new_order = Order.objects.create(table_number=20)
+        new_order.transition_to("paid")
+
+        Order.objects.create(table_number=20)
+
+        self.assertEqual(Order.objects.filter(table_number=20).count(), 2)
+        self.assertEqual(Order.objects.active().filter(table_number=20).count(), 1)
+
 
     def test_order_read(self):
         """
@@ -179,23 +203,510 @@ class OrderModelTest(TestCase):
         self.assertEqual(str(order), expected_str)
 
 
+class OrderTotalPriceSignalTest(TestCase):
+    """
+    Класс для тестирования пересчета total_price при изменении блюд заказа
+    """
+    def setUp(self):
+        self.item_1 = Item.objects.create(name="Яичница", price=450.00)
+        self.item_2 = Item.objects.create(name="Чай", price=200.00)
+        self.item_3 = Item.objects.create(name="Стейк", price=2500.00)
+
+        self.order = Order.objects.create(table_number=1)
+        self.order.items.set([self.item_1, self.item_3])
+
+    def test_remove_items(self):
+        """
+        Проверка уменьшения total_price при удалении блюда
+        """
+        self.order.items.remove(self.item_3)
+        self.order.refresh_from_db()
+
+        self.assertEqual(self.order.total_price, Decimal("450.00"))
+
+    def test_remove_item_not_in_order(self):
+        """
+        Проверка, что удаление блюда, которого нет в заказе, не меняет total_price
+        """
+        self.order.items.remove(self.item_2)
+        self.order.refresh_from_db()
+
+        self.assertEqual(self.order.total_price, Decimal("2950.00"))
+
+    def test_clear_items(self):
+        """
+        Проверка обнуления total_price при очистке списка блюд
+        """
+        self.order.items.clear()
+        self.order.refresh_from_db()
+
+        self.assertEqual(self.order.total_price, Decimal("0"))
+
+    def test_add_order_from_item_side(self):
+        """
+        Проверка пересчета total_price при добавлении заказа со стороны блюда
+        """
+        self.item_2.order_set.add(self.order)
+        self.order.refresh_from_db()
+
+        self.assertEqual(self.order.total_price, Decimal("3150.00"))
+
+    def test_add_item_queries_count(self):
+        """
+        Проверка, что добавление блюд не перечитывает все блюда заказа
+        """
+        for number in range(30):
+            self.order.items.add(Item.objects.create(name=f"Блюдо {number}", price=10))
+
+        # Поиск существующих связей, INSERT строки, UPDATE цены строки,
+        # чтение новых строк, UPDATE заказа, проверка оплаты, INSERT события
+        with self.assertNumQueries(7):
+            self.order.items.add(self.item_2)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal("3450.00"))
+
+
+class OrderSetLinesTest(TestCase):
+    """
+    Класс для тестирования пакетной записи строк заказа
+    """
+    def setUp(self):
+        self.items = [
+            Item.objects.create(name=f"Блюдо {number}", price=100)
+            for number in range(50)
+        ]
+        self.order = Order.objects.create(table_number=1)
+
+    def test_set_lines_queries_count(self):
+        """
+        Проверка, что 50 строк записываются фиксированным числом запросов
+        """
+        quantities = {item: 2 for item in self.items}
+
+        # SELECT строк, SAVEPOINT, INSERT строк, UPDATE заказа,
+        # INSERT события, проверка оплаты для счетчика выручки, RELEASE SAVEPOINT
+        with self.assertNumQueries(7):
+            self.order.set_lines(quantities)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.lines.count(), 50)
+        self.assertEqual(self.order.total_price, Decimal("10000.00"))
+
+    def test_set_lines_changes_quantities(self):
+        """
+        Проверка изменения количества, удаления и добавления строк
+        """
+        item_1, item_2, item_3 = self.items[:3]
+        self.order.set_lines({item_1: 1, item_2: 1})
+
+        # SELECT строк, DELETE, INSERT, UPDATE количества, UPDATE заказа,
+        # INSERT события, проверка оплаты и SAVEPOINT / RELEASE SAVEPOINT вокруг них
+        with self.assertNumQueries(9):
+            self.order.set_lines({item_1: 3, item_3: 2})
+
+        self.order.refresh_from_db()
+        quantities = dict(self.order.lines.values_list("item_id", "quantity"))
+        self.assertEqual(quantities, {item_1.pk: 3, item_3.pk: 2})
+        self.assertEqual(self.order.total_price, Decimal("500.00"))
+
+    def test_unit_price_is_captured(self):
+        """
+        Проверка, что цена строки не меняется при изменении цены блюда
+        """
+        item = Item.objects.get(pk=self.items[0].pk)
+        self.order.items.add(item, through_defaults={"quantity": 3})
+
+        Item.objects.filter(pk=item.pk).update(price=999)
+
+        line = self.order.lines.get()
+        self.order.refresh_from_db()
+        self.assertEqual(line.unit_price, Decimal("100.00"))
+        self.assertEqual(self.order.total_price, Decimal("300.00"))
+
+
+class OrderVersionTest(TestCase):
+    """
+    Класс для тестирования оптимистичной блокировки заказа по версии
+    """
+    def setUp(self):
+        self.item = Item.objects.create(name="Чай", price=200)
+        self.order = Order.objects.create(table_number=1)
+        # Тот же заказ, загруженный другим запросом
+        self.stale_order = Order.objects.get(pk=self.order.pk)
+        self.order.status = "ready"
+        self.order.save(update_fields=["status"])
+
+    def test_save_increments_version(self):
+        """
+        Проверка, что каждое сохранение увеличивает версию заказа
+        """
+        self.assertEqual(self.order.version, 2)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.version, 2)
+
+    def test_stale_save_conflict(self):
+        """
+        Проверка, что изменения устаревшей копии заказа не записываются
+        """
+        self.stale_order.status = "paid"
+        with self.assertRaises(OrderVersionConflict):
+            self.stale_order.save()
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "ready")
+        self.assertIsNone(self.order.paid_at)
+
+    def test_stale_items_change_conflict(self):
+        """
+        Проверка, что изменение блюд устаревшей копии заказа откатывается
+        """
+        with self.assertRaises(OrderVersionConflict):
+            with transaction.atomic():
+                self.stale_order.items.add(self.item)
+
+        with self.assertRaises(OrderVersionConflict):
+            self.stale_order.set_lines({self.item: 2})
+
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.lines.exists())
+        self.assertEqual(self.order.total_price, Decimal("0"))
+
+    def test_refresh_from_db_updates_saved_state(self):
+        """
+        Проверка, что после refresh_from_db сохранение сравнивается с перечитанными
+        значениями: оплата, сделанная другой копией, не учитывается в выручке повторно
+        """
+        self.order.items.add(self.item)
+        self.stale_order.refresh_from_db()
+        self.order.refresh_from_db()
+        self.order.status = "paid"
+        self.order.save()
+
+        self.stale_order.refresh_from_db()
+        self.assertEqual(self.stale_order.saved_state["status"], "paid")
+        self.stale_order.table_number = 5
+        self.stale_order.save()
+
+        self.assertEqual(get_revenue(), Decimal("200.00"))
+        self.assertEqual(rebuild_revenue(), get_revenue())
+
+
+class OrderStatusTransitionTest(TestCase):
+    """
+    Класс для тестирования переходов статусов заказа
+    """
+    def setUp(self):
+        self.item = Item.objects.create(name="Чай", price=200)
+        self.order = Order.objects.create(table_number=1)
+        self.order.items.add(self.item)
 
+    def test_transition_table(self):
+        """
+        Проверка обращенной таблицы переходов
+        """
+        self.assertEqual(Order.STATUS_SOURCES["paid"], {"pending", "ready"})
+        self.assertEqual(Order.STATUS_SOURCES["pending"], {"ready"})
+        self.assertEqual(set(Order.STATUS_LABELS), set(Order.STATUS_TRANSITIONS))
+
+    def test_transition_is_single_update(self):
+        """
+        Проверка, что переход выполняется одним UPDATE и вызывает обработчики переходов
+        """
+        received = []
 
+        def receiver(sender, orders, status, **kwargs):
+            received.extend((order.saved_state["status"], status) for order in orders)
 
+        orders_status_changed.connect(receiver)
+        self.addCleanup(orders_status_changed.disconnect, receiver)
 
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.order.transition_to("paid"))
 
+        # Заказ не перечитывается, статус записывается одним UPDATE
+        order_queries = [query["sql"] for query in queries if "\"orders_order\"" in query["sql"]]
+        self.assertEqual(len(order_queries), 1)
+        self.assertTrue(order_queries[0].startswith("UPDATE"))
+        self.assertEqual(received, [("pending", "paid")])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "paid")
+        self.assertIsNotNone(self.order.paid_at)
 
+    def test_not_allowed_transition(self):
+        """
+        Проверка, что оплаченный заказ нельзя вернуть в ожидание
+        """
+        self.order.transition_to("paid")
 
+        with self.assertNumQueries(0):
+            with self.assertRaises(InvalidStatusTransition):
+                self.order.transition_to("pending")
+            self.assertFalse(self.order.transition_to("paid"))
 
+    def test_transition_of_changed_order(self):
+        """
+        Проверка, что переход не выполняется, если статус в БД уже изменен
+        """
+        Order.objects.filter(pk=self.order.pk).update(status="paid")
 
+        with self.assertRaises(OrderVersionConflict):
+            self.order.transition_to("ready")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "paid")
 
 
-# TODO: не забудь для UPDATE написать тест для signal (total_price)
+class OrderEventLogTest(TestCase):
+    """
+    Класс для тестирования журнала событий заказов и восстановления состояния
+    """
+    def setUp(self):
+        self.item_1 = Item.objects.create(name="Чай", price=200)
+        self.item_2 = Item.objects.create(name="Стейк", price=2500)
 
+    def test_order_lifecycle_is_logged(self):
+        """
+        Проверка записи событий жизненного цикла и восстановления состояния на момент времени
+        """
+        order = Order.objects.create(table_number=5)
+        order.items.add(self.item_1)
+        order.set_lines({self.item_1: 2, self.item_2: 1})
+        before_payment = timezone.now()
+        order.transition_to("paid")
+        before_delete = timezone.now()
+        order_pk = order.pk
+        order.delete()
 
+        events = list(OrderEvent.objects.filter(order_id=order_pk)
+                      .order_by("id").values_list("type", flat=True))
+        self.assertEqual(events, ["created", "lines", "lines", "status", "deleted"])
 
+        state = replay(at=before_payment)[order_pk]
+        self.assertEqual(state["status"], "pending")
+        self.assertEqual(state["total_price"], Decimal("2900.00"))
+        self.assertEqual(state["lines"], {self.item_1.pk: (2, Decimal("200.00")),
+                                          self.item_2.pk: (1, Decimal("2500.00"))})
+
+        state = replay(at=before_delete)[order_pk]
+        self.assertEqual(state["status"], "paid")
+        self.assertIsNotNone(state["paid_at"])
+        self.assertNotIn(order_pk, replay())
+
+    def test_bulk_changes_are_logged_in_one_insert(self):
+        """
+        Проверка, что пакетные изменения записываются в журнал одним INSERT
+        """
+        with CaptureQueriesContext(connection) as queries:
+            orders = Order.objects.create_with_lines([
+                (Order(table_number=number), {self.item_1: number})
+                for number in range(1, 21)
+            ])
+            Order.objects.filter(pk__in=[order.pk for order in orders]).change_status("ready")
+
+        inserts = [query for query in queries
+                   if query["sql"].startswith('INSERT INTO "orders_orderevent"')]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(OrderEvent.objects.count(), 40)
+
+        state = replay()
+        self.assertEqual(len(state), 20)
+        self.assertEqual(state[orders[2].pk]["lines"], {self.item_1.pk: (3, Decimal("200.00"))})
+        self.assertEqual(state[orders[2].pk]["status"], "ready")
+
+    def test_events_are_append_only(self):
+        """
+        Проверка, что записи журнала нельзя изменить или удалить
+        """
+        order = Order.objects.create(table_number=5)
+        event = OrderEvent.objects.get(order_id=order.pk)
+
+        with self.assertRaises(TypeError):
+            OrderEvent.objects.update(payload={})
+        with self.assertRaises(TypeError):
+            event.save()
+        with self.assertRaises(TypeError):
+            OrderEvent.objects.all().delete()
+
+    def test_replay_command(self):
+        """
+        Проверка команды replay_order_events
+        """
+        order = Order.objects.create(table_number=5)
+        order.set_lines({self.item_2: 1})
+
+        out = StringIO()
+        call_command("replay_order_events", "--at", timezone.localdate().isoformat(),
+                     "--order", str(order.pk), stdout=out)
+
+        self.assertIn(f"Заказ #{order.pk}: стол 5, статус pending, сумма 2500", out.getvalue())
+        self.assertIn("Заказов: 1", out.getvalue())
+
+
+class ArchiveOrdersTest(TestCase):
+    """
+    Класс для тестирования переноса закрытых заказов в архив
+    """
+    def setUp(self):
+        self.item_1 = Item.objects.create(name="Чай", price=Decimal("200.00"))
+        self.item_2 = Item.objects.create(name="Стейк", price=Decimal("2500.00"))
+        self.open_order = Order.objects.create(table_number=1)
+        self.open_order.set_lines({self.item_1: 1})
+        self.paid_order = Order.objects.create(table_number=2)
+        self.paid_order.set_lines({self.item_1: 2, self.item_2: 1})
+        self.paid_order.transition_to("paid")
+
+    def test_archive_command(self):
+        """
+        Проверка, что команда переносит только оплаченные заказы вместе со строками
+        """
+        out = StringIO()
+        call_command("archive_orders", "--older-than", "0", stdout=out)
 
+        self.assertIn("Перенесено в архив заказов: 1", out.getvalue())
+        self.assertFalse(Order.objects.filter(pk=self.paid_order.pk).exists())
+        self.assertTrue(Order.objects.filter(pk=self.open_order.pk).exists())
 
+        archived = ArchivedOrder.objects.get(pk=self.paid_order.pk)
+        self.assertEqual(archived.table_number, 2)
+        self.assertEqual(archived.total_price, Decimal("2900.00"))
+        self.assertEqual(archived.paid_at, self.paid_order.paid_at)
+        self.assertEqual(sorted((item_id, quantity) for item_id, quantity, _ in archived.lines),
+                         sorted([(self.item_1.id, 2), (self.item_2.id, 1)]))
 
+    def test_archive_skips_recent_orders(self):
+        """
+        Проверка, что недавно оплаченные заказы остаются в таблице заказов
+        """
+        call_command("archive_orders", "--older-than", "1", stdout=StringIO())
+
+        self.assertTrue(Order.objects.filter(pk=self.paid_order.pk).exists())
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+    def test_archive_keeps_revenue_and_events(self):
+        """
+        Проверка, что перенос в архив не меняет выручку и журнал событий
+        """
+        revenue_before = get_revenue()
+        events_before = OrderEvent.objects.count()
+
+        call_command("archive_orders", "--older-than", "0", "--batch-size", "1",
+                     stdout=StringIO())
+
+        self.assertEqual(get_revenue(), revenue_before)
+        self.assertEqual(rebuild_revenue(), revenue_before)
+        self.assertEqual(OrderEvent.objects.count(), events_before)
+
+
+class SalesRollupTest(TestCase):
+    """
+    Класс для тестирования часовых агрегатов продаж
+    """
+    def setUp(self):
+        self.item_1 = Item.objects.create(name="Чай", price=Decimal("200.00"))
+        self.item_2 = Item.objects.create(name="Стейк", price=Decimal("2500.00"))
+        self.order_1 = Order.objects.create(table_number=1)
+        self.order_1.set_lines({self.item_1: 2, self.item_2: 1})
+        self.order_2 = Order.objects.create(table_number=2)
+        self.order_2.set_lines({self.item_1: 1})
+
+    def rollups(self):
+        tables = sorted(SalesRollup.objects.filter(orders_count__gt=0)
+                        .values_list("hour", "table_number", "orders_count", "revenue"))
+        items = sorted(ItemSalesRollup.objects.filter(quantity__gt=0)
+                       .values_list("hour", "item_id", "quantity", "revenue"))
+        return tables, items
+
+    def assertRollupsRebuilt(self):
+        """
+        Проверка, что агрегаты, обновленные по изменениям, совпадают с пересобранными
+        """
+        incremental = self.rollups()
+        analytics.rebuild_rollups()
+        self.assertEqual(incremental, self.rollups())
+        return incremental
+
+    def test_payment_updates_rollups(self):
+        self.order_1.transition_to("paid")
+        Order.objects.filter(pk=self.order_2.pk).change_status("paid")
+
+        tables, items = self.assertRollupsRebuilt()
+        hour = analytics.hour_start(timezone.now())
+        self.assertEqual(tables, [(hour, 1, 1, Decimal("2900.00")), (hour, 2, 1, Decimal("200.00"))])
+        self.assertEqual(items, [(hour, self.item_1.id, 3, Decimal("600.00")),
+                                 (hour, self.item_2.id, 1, Decimal("2500.00"))])
+
+    def test_corrections_update_rollups(self):
+        """
+        Проверка исправлений оплаченных заказов: состав, отмена оплаты, удаление, архив
+        """
+        self.order_1.transition_to("paid")
+        self.order_2.transition_to("paid")
+
+        self.order_1.set_lines({self.item_1: 1})
+        self.assertRollupsRebuilt()
+
+        self.order_2.items.add(self.item_2)
+        self.assertRollupsRebuilt()
+
+        self.order_1.refresh_from_db()
+        self.order_1.status = "pending"
+        self.order_1.save()
+        self.assertRollupsRebuilt()
+
+        self.order_2.delete()
+        tables, items = self.assertRollupsRebuilt()
+        self.assertEqual(tables, [])
+        self.assertEqual(items, [])
+
+    def test_archived_orders_stay_in_rollups(self):
+        Order.objects.create(table_number=3, status="paid").items.set([self.item_2])
+        before = self.rollups()
+
+        call_command("archive_orders", "--older-than", "0", stdout=StringIO())
+
+        self.assertEqual(self.assertRollupsRebuilt(), before)
+        self.assertEqual(before[0][0][2:], (1, Decimal("2500.00")))
+
+
+class VerifyOrderTotalsCommandTest(TestCase):
+    """
+    Класс для тестирования команды verify_order_totals
+    """
+    def setUp(self):
+        self.item = Item.objects.create(name="Чай", price=200.00)
+        self.order = Order.objects.create(table_number=1)
+        self.order.items.set([self.item])
+
+        # Искусственное расхождение total_price с суммой блюд
+        Order.objects.filter(pk=self.order.pk).update(total_price=1)
+
+    def test_verify_without_fix(self):
+        out = StringIO()
+        call_command("verify_order_totals", stdout=out)
+
+        self.order.refresh_from_db()
+        self.assertIn("расхождений: 1", out.getvalue())
+        self.assertEqual(self.order.total_price, Decimal("1"))
+
+    def test_verify_with_fix(self):
+        call_command("verify_order_totals", "--fix", stdout=StringIO())
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal("200.00"))
+
+    def test_fix_paid_order_updates_revenue_rollups_and_cache(self):
+        """
+        Проверка, что исправление оплаченного заказа обновляет выручку,
+        часовые агрегаты и версию кэша страницы заказа
+        """
+        self.order.refresh_from_db()
+        self.order.transition_to("paid")
+        self.assertEqual(get_revenue(), Decimal("1"))
+        cache_versions = get_versions([order_version_key(self.order.pk)])
 
+        call_command("verify_order_totals", "--fix", stdout=StringIO())
 
+        self.assertEqual(get_revenue(), Decimal("200.00"))
+        self.assertEqual(rebuild_revenue(), get_revenue())
+        self.assertEqual(SalesRollup.objects.get(table_number=1).revenue, Decimal("200.00"))
+        self.assertNotEqual(get_versions([order_version_key(self.order.pk)]), cache_versions)
@@ -1,13 +1,42 @@
+import asyncio
+import csv
+import datetime
 import json
+import time
+from contextlib import aclosing
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.contrib.auth.models import User
 from django.urls import reverse
-from django.test import RequestFactory, TestCase
+from django.db import connection, connections
+from django.test import (AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.management import call_command
 from django.db.models import Sum
+from django.utils import timezone
+from orders import broadcast, metrics, queryguard, sqlhooks
+from orders.async_views import (
+    AsyncDeleteOrderView, AsyncSearchOrderView, AsyncUpdateOrderView,
+    async_calculate_total_revenue, async_export_orders
+)
+from orders.catalogue import item_catalogue
+from orders.checks import check_shared_cache
+from orders.forms import CreateOrderForm
 from orders.views import (
     CreateOrderView, UpdateOrderView, DeleteOrderView,
-    SearchOrderView, calculate_total_revenue
+    SearchOrderView, calculate_total_revenue, export_orders, order_event_stream
 )
-from orders.models import Order, Item
+from orders.archive import archive_closed_orders
+from orders.conditional import orders_list_validators
+from orders.models import ArchivedOrder, Order, Item, RevenueCounter
+from orders.queryguard import QueryBudgetExceeded, QueryGuard, query_shape
+from orders.revenue import get_revenue
 
 
 class BaseOrderViewTest(TestCase):
@@ -36,6 +65,269 @@ class BaseOrderViewTest(TestCase):
         self.order_4.items.set([self.item_1, self.item_2, self.item_3])
 
 
+class OrderListViewTest(BaseOrderViewTest):
+    """
+    Класс для тестирования OrderListView
+    """
+    def _create_orders(self, count, first_table=100):
+        """
+        Создает count заказов с тремя блюдами в каждом
+        """
+        for table_number in range(first_table, first_table + count):
+            order = Order.objects.create(table_number=table_number)
+            order.items.set([self.item_1, self.item_2, self.item_3])
+
+    def _list_queries_count(self):
+        """
+        Возвращает количество запросов к БД при загрузке списка заказов
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("orders:orders_list"))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_orders_list_queries_count_is_constant(self):
+        """
+        Проверка, что количество запросов не растет вместе с числом заказов
+        """
+        queries_for_few_orders = self._list_queries_count()
+
+        self._create_orders(count=30)
+        queries_for_many_orders = self._list_queries_count()
+
+        self.assertEqual(queries_for_few_orders, queries_for_many_orders)
+
+    def test_orders_list_filter_by_status(self):
+        """
+        Проверка фильтрации списка заказов по статусу
+        """
+        response = self.client.get(
+            reverse("orders:orders_list"), {"status": "paid"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["orders"]), [self.order_3, self.order_4])
+
+    def test_orders_list_keyset_pagination(self):
+        """
+        Проверка постраничного вывода списка заказов по курсору
+        """
+        url = reverse("orders:orders_list")
+
+        response = self.client.get(url, {"page_size": 3})
+        page = response.context["page"]
+        self.assertEqual(list(page), [self.order_1, self.order_2, self.order_3])
+        self.assertEqual(page.next_cursor, self.order_3.id)
+        self.assertFalse(page.has_previous)
+
+        response = self.client.get(url, {"page_size": 3, "after": page.next_cursor})
+        page = response.context["page"]
+        self.assertEqual(list(page), [self.order_4])
+        self.assertFalse(page.has_next)
+        self.assertEqual(page.previous_cursor, self.order_4.id)
+
+        response = self.client.get(url, {"page_size": 3, "before": page.previous_cursor})
+        page = response.context["page"]
+        self.assertEqual(list(page), [self.order_1, self.order_2, self.order_3])
+        self.assertFalse(page.has_previous)
+
+    def test_orders_list_invalid_pagination_params(self):
+        """
+        Проверка, что некорректные размер страницы и курсоры, в том числе
+        цифры вне ASCII, заменяются значениями по умолчанию
+        """
+        url = reverse("orders:orders_list")
+
+        for value in ("²", "½", "-1", "abc"):
+            with self.subTest(value=value):
+                response = self.client.get(url, {"page_size": value, "after": value, "before": value})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.context["page"]),
+                                 [self.order_1, self.order_2, self.order_3, self.order_4])
+
+
+class CachedViewsTest(BaseOrderViewTest):
+    """
+    Класс для тестирования кэширования страниц заказов
+    """
+    def test_shared_cache_check(self):
+        """
+        Проверка предупреждения о кэше процесса при нескольких воркерах
+        """
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache",
+                             "LOCATION": "redis://127.0.0.1:6379"}}
+
+        with self.settings(ORDERS_WORKERS=4, CACHES=locmem):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ["orders.W001"])
+        with self.settings(ORDERS_WORKERS=1, CACHES=locmem):
+            self.assertEqual(check_shared_cache(None), [])
+        with self.settings(ORDERS_WORKERS=4, CACHES=redis):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_orders_list_is_cached(self):
+        """
+        Проверка, что повторный запрос списка заказов отдается из кэша
+        """
+        url = reverse("orders:orders_list")
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_orders_list_invalidated_on_order_create(self):
+        """
+        Проверка инвалидации списка заказов при создании заказа
+        """
+        url = reverse("orders:orders_list")
+        self.client.get(url)
+
+        new_order = Order.objects.create(table_number=50)
+        new_order.items.set([self.item_1])
+
+        response = self.client.get(url)
+        self.assertIn(new_order, list(response.context["orders"]))
+
+    def test_order_detail_invalidated_on_status_change(self):
+        """
+        Проверка инвалидации страницы заказа при изменении статуса
+        """
+        url = self.order_1.get_absolute_url()
+        # Первый запрос выдает CSRF cookie, второй кэширует страницу
+        self.client.get(url)
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.order_1.status = "ready"
+        self.order_1.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response.context["order"].status, "ready")
+
+    def test_order_detail_not_cached_without_csrf_cookie(self):
+        """
+        Проверка, что страница с CSRF-токеном не кэшируется для клиента без cookie
+        """
+        url = self.order_1.get_absolute_url()
+        self.client.get(url)
+        self.client.cookies.clear()
+
+        response = self.client.get(url)
+        self.assertIsNotNone(response.context)
+
+    def test_orders_list_invalidated_on_item_change(self):
+        """
+        Проверка инвалидации списка заказов при изменении блюда
+        """
+        url = reverse("orders:orders_list")
+        self.client.get(url)
+
+        self.item_1.name = "Омлет"
+        self.item_1.save()
+
+        response = self.client.get(url)
+        self.assertContains(response, "Омлет")
+
+
+class ConditionalGetTest(BaseOrderViewTest):
+    """
+    Класс для тестирования условных запросов (ETag, Last-Modified)
+    """
+    def test_order_detail_not_modified(self):
+        """
+        Проверка ответа 304 на повторный запрос неизменившейся страницы заказа
+        """
+        url = self.order_1.get_absolute_url()
+        response = self.client.get(url)
+        self.assertTrue(response.has_header("ETag"))
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        etag = response["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.order_1.status = "ready"
+        self.order_1.save(update_fields=["status"])
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_order_detail_if_modified_since(self):
+        """
+        Проверка ответа 304 по заголовку If-Modified-Since
+        """
+        url = self.order_1.get_absolute_url()
+        last_modified = self.client.get(url)["Last-Modified"]
+
+        response = self.client.get(url, headers={"If-Modified-Since": last_modified})
+        self.assertEqual(response.status_code, 304)
+
+    def test_updated_at_follows_item_changes(self):
+        """
+        Проверка, что время изменения заказа обновляется при изменении блюд
+        """
+        updated_at = self.order_1.updated_at
+
+        self.order_1.items.add(self.item_2)
+        self.order_1.refresh_from_db()
+        self.assertGreater(self.order_1.updated_at, updated_at)
+
+        updated_at = self.order_1.updated_at
+        self.order_1.set_lines({self.item_1: 2})
+        self.order_1.refresh_from_db()
+        self.assertGreater(self.order_1.updated_at, updated_at)
+
+    def test_api_order_not_modified(self):
+        """
+        Проверка условных запросов к заказу и списку заказов в API
+        """
+        for url in (reverse("orders:order-detail", args=[self.order_1.id]),
+                    reverse("orders:order-list")):
+            etag = self.client.get(url)["ETag"]
+
+            response = self.client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 304, url)
+
+            self.order_1.items.add(self.item_2)
+            response = self.client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 200, url)
+            self.order_1.items.remove(self.item_2)
+
+    def test_api_item_not_modified(self):
+        """
+        Проверка условных запросов к блюду в API
+        """
+        url = reverse("orders:item-detail", args=[self.item_1.id])
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.item_1.price = 500
+        self.item_1.save()
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_revenue_not_modified(self):
+        """
+        Проверка условных запросов выручки
+        """
+        url = reverse("orders:calculate_total_revenue")
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.order_1.status = "paid"
+        self.order_1.save(update_fields=["status"])
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+
 class CreateOrderViewTest(BaseOrderViewTest):
     """
     Класс для тестирования CreateOrderView
@@ -60,6 +352,45 @@ class CreateOrderViewTest(BaseOrderViewTest):
         self.assertEqual(orders_count_after_create, expected_orders_count)
         self.assertEqual(302, response.status_code)
 
+    def test_create_order_post_with_quantities(self):
+        """
+        Проверка создания Order с количеством блюд.
+        """
+        data = {
+            "table_number": 5,
+            "items": [self.item_1.id, self.item_2.id],
+            f"quantity_{self.item_2.id}": 3
+        }
+
+        request = self.factory.post(reverse("orders:create_order"), data)
+        response = CreateOrderView.as_view()(request)
+
+        new_order = Order.objects.get(table_number=5)
+        quantities = dict(new_order.lines.values_list("item_id", "quantity"))
+
+        self.assertEqual(302, response.status_code)
+        self.assertEqual(quantities, {self.item_1.id: 1, self.item_2.id: 3})
+        self.assertEqual(new_order.total_price, 1050)
+
+    def test_create_order_post_invalid_quantity(self):
+        """
+        Проверка создания Order с недопустимым количеством блюда.
+        """
+        data = {
+            "table_number": 5,
+            "items": [self.item_1.id],
+            f"quantity_{self.item_1.id}": 0
+        }
+
+        for quantity in (0, 100, "abc", "²"):
+            with self.subTest(quantity=quantity):
+                data[f"quantity_{self.item_1.id}"] = quantity
+                request = self.factory.post(reverse("orders:create_order"), data)
+                response = CreateOrderView.as_view()(request)
+
+                self.assertEqual(200, response.status_code)
+                self.assertFalse(Order.objects.filter(table_number=5).exists())
+
     def test_create_order_post_invalid_items(self):
         """
         Проверка создания Order с невалидными данными поля items.
@@ -81,12 +412,12 @@ class CreateOrderViewTest(BaseOrderViewTest):
 
     def test_create_order_post_not_unique_table(self):
         """
-        Проверка создания Order с неуникальным table_number
+        Проверка создания Order для стола, у которого есть открытый заказ
         """
         orders_count_before_create = Order.objects.all().count()
 
         data = {
-            "table_number": 7,
+            "table_number": 1,
             "items": [self.item_1.id, self.item_2.id]
         }
 
@@ -98,6 +429,56 @@ class CreateOrderViewTest(BaseOrderViewTest):
         self.assertEqual(orders_count_after_create, orders_count_before_create)
         self.assertEqual(200, response.status_code)
 
+    def test_create_order_for_table_with_closed_order(self):
+        """
+        Проверка, что оплаченный заказ не занимает стол.
+        """
+        data = {
+            "table_number": 7,
+            "items": [self.item_1.id]
+        }
+
+        request = self.factory.post(reverse("orders:create_order"), data)
+        response = CreateOrderView.as_view()(request)
+
+        self.assertEqual(302, response.status_code)
+        self.assertEqual(Order.objects.filter(table_number=7).count(), 2)
+
+    def test_create_order_form_reads_items_from_catalogue(self):
+        """
+        Проверка, что форма берет блюда из каталога меню без запросов к таблице блюд.
+        """
+        item_catalogue.all()  # Прогрев каталога
+        data = {
+            "table_number": 5,
+            "items": [self.item_1.id, self.item_2.id]
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            CreateOrderView.as_view()(self.factory.get(reverse("orders:create_order")))
+            form = CreateOrderForm(data)
+            self.assertTrue(form.is_valid())
+
+        item_table = Item._meta.db_table
+        self.assertFalse([query for query in queries if item_table in query["sql"]])
+        self.assertEqual(form.cleaned_data["items"], [self.item_1, self.item_2])
+
+    def test_catalogue_reloaded_on_item_change(self):
+        """
+        Проверка, что каталог перечитывается после изменения меню.
+        """
+        item_catalogue.all()
+        self.item_2.name = "Зеленый чай"
+        self.item_2.save()
+        new_item = Item.objects.create(name="Сок", price=300)
+
+        self.assertEqual(item_catalogue.get(self.item_2.id).name, "Зеленый чай")
+        self.assertEqual(item_catalogue.get(new_item.id), new_item)
+        self.assertIn(new_item.id, dict(CreateOrderForm().fields["items"].choices))
+
+        self.item_3.delete()
+        self.assertIsNone(item_catalogue.get(self.item_3.id))
+
 
 class UpdateOrderViewTest(BaseOrderViewTest):
     def test_update_order_status_no_status_data(self):
@@ -171,6 +552,51 @@ class UpdateOrderViewTest(BaseOrderViewTest):
         self.assertEqual(response_content, expected_content)
         self.assertEqual(response_status, 400)
 
+    def test_update_order_status_version_conflict(self):
+        """
+        Проверка, что статус заказа, измененного другим запросом, не перезаписывается.
+        """
+        order = self.order_1
+        # Клиент видел заказ до изменения другим запросом
+        seen_version = order.version
+        order.status = "ready"
+        order.save(update_fields=["status"])
+
+        request = self.factory.patch(
+            path=reverse("orders:change_order_status", args=[order.pk]),
+            data=json.dumps({"new_status": "paid", "version": seen_version}),
+            content_type="application/json"
+        )
+        response = UpdateOrderView.as_view()(request, order_pk=order.pk)
+
+        order.refresh_from_db()
+        response_content = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response_content["success"])
+        self.assertEqual(response_content["data"]["status"], "ready")
+        self.assertEqual(response_content["data"]["version"], order.version)
+        self.assertEqual(order.status, "ready")
+
+    def test_update_paid_order_status_not_allowed(self):
+        """
+        Проверка, что оплаченный заказ нельзя вернуть в ожидание.
+        """
+        order = self.order_3
+
+        request = self.factory.patch(
+            path=reverse("orders:change_order_status", args=[order.pk]),
+            data=json.dumps({"new_status": "pending"}),
+            content_type="application/json"
+        )
+        response = UpdateOrderView.as_view()(request, order_pk=order.pk)
+
+        order.refresh_from_db()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)["message"],
+                         "Нельзя изменить статус «Оплачено» на «В ожидании».")
+        self.assertEqual(order.status, "paid")
+
     def test_update_non_exist_order_status(self):
         """
         Проверка изменения статуса у несуществующего заказа.
@@ -228,7 +654,16 @@ class UpdateOrderViewTest(BaseOrderViewTest):
         expected_content = {
             'success': True,
             'message': 'Статус успешно обновлен_Оплачено',
-            'link': None
+            'link': None,
+            # Новое состояние заказа: клиент берет версию из ответа
+            'data': {
+                'id': order.pk,
+                'table_number': order.table_number,
+                'status': 'paid',
+                'status_display': 'Оплачено',
+                'total_price': str(order.total_price),
+                'version': order.version,
+            }
         }
 
         # Проверяем, что статус обновлен
@@ -239,6 +674,49 @@ class UpdateOrderViewTest(BaseOrderViewTest):
         self.assertEqual(200, response_status)
         self.assertEqual(response_content, expected_content)
 
+    def test_admin_order_lines_change(self):
+        """
+        Проверка, что изменение строк оплаченного заказа в админке
+        обновляет сумму, выручку и кэш страницы заказа
+        """
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.login(username="admin", password="password")
+        detail_url = reverse("orders:order_detail", args=[self.order_3.pk])
+        self.client.get(detail_url)
+        revenue_before = get_revenue()
+
+        lines = list(self.order_3.lines.order_by("pk"))
+        data = {
+            "table_number": self.order_3.table_number,
+            "total_price": self.order_3.total_price,
+            "status": self.order_3.status,
+            "paid_at_0": self.order_3.paid_at.strftime("%Y-%m-%d"),
+            "paid_at_1": self.order_3.paid_at.strftime("%H:%M:%S"),
+            "version": self.order_3.version,
+            "lines-TOTAL_FORMS": len(lines),
+            "lines-INITIAL_FORMS": len(lines),
+            "lines-MIN_NUM_FORMS": 0,
+            "lines-MAX_NUM_FORMS": 1000,
+        }
+        for number, line in enumerate(lines):
+            data.update({
+                f"lines-{number}-id": line.pk,
+                f"lines-{number}-order": self.order_3.pk,
+                f"lines-{number}-item": line.item_id,
+                # Количество чая увеличивается до трех
+                f"lines-{number}-quantity": 3 if line.item_id == self.item_2.pk else line.quantity,
+                f"lines-{number}-unit_price": line.unit_price,
+            })
+        response = self.client.post(
+            reverse("admin:orders_order_change", args=[self.order_3.pk]), data
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.order_3.refresh_from_db()
+        self.assertEqual(self.order_3.total_price, 3550)
+        self.assertEqual(get_revenue(), revenue_before + 400)
+        self.assertContains(self.client.get(detail_url), "3550")
+
 
 class DeleteOrderViewTest(BaseOrderViewTest):
     """
@@ -371,6 +849,16 @@ class SearchOrderViewTest(BaseOrderViewTest):
         self.assertEqual(response_content, expected_content)
         self.assertEqual(response.status_code, 400)
 
+    def test_search_order_by_non_ascii_digits(self):
+        """
+        Проверка поиска по ID и номеру стола с цифрами вне ASCII
+        """
+        for search_type in ("by_id", "by_table"):
+            with self.subTest(search_type=search_type):
+                response = self._request_response({"orderSearchType": search_type,
+                                                   "search_val": "²"})
+                self.assertEqual(response.status_code, 400)
+
     def test_search_order_by_valid_id(self):
         """
         Проверка поиска заказа по валидному ID
@@ -544,6 +1032,20 @@ class SearchOrderViewTest(BaseOrderViewTest):
         self.assertEqual(response_content, expected_content)
         self.assertEqual(response.status_code, 404)
 
+    def test_search_order_by_status_single_query(self):
+        """
+        Проверка, что поиск по статусу выполняется одним запросом
+        """
+        params = {
+            "orderSearchType": "by_status",
+            "search_val": "paid"
+        }
+
+        with self.assertNumQueries(1):
+            response = self._request_response(params)
+
+        self.assertEqual(response.status_code, 200)
+
     def test_search_order_by_status_success(self):
         """
         Проверка поиска заказов по статусу "paid"
@@ -570,6 +1072,33 @@ class SearchOrderViewTest(BaseOrderViewTest):
         self.assertEqual(response_content, expected_content)
         self.assertEqual(response.status_code, 200)
 
+    def test_search_by_table_with_closed_orders(self):
+        """
+        Проверка поиска по столу, у которого есть открытый и закрытый заказы
+        """
+        new_order = Order.objects.create(table_number=self.order_4.table_number)
+
+        response = self._request_response({"orderSearchType": "by_table",
+                                           "search_val": str(new_order.table_number)})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(new_order.get_absolute_url(), json.loads(response.content)["link"])
+
+    def test_search_in_archive(self):
+        """
+        Проверка поиска заказов в архиве с параметром archive=1
+        """
+        archive_closed_orders(older_than=datetime.timedelta(0))
+        archived = ArchivedOrder.objects.get(pk=self.order_4.pk)
+
+        for params in ({"orderSearchType": "by_id", "search_val": str(self.order_4.pk)},
+                       {"orderSearchType": "by_table", "search_val": "7"}):
+            response = self._request_response(params)
+            self.assertEqual(response.status_code, 404)
+
+            response = self._request_response({**params, "archive": "1"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content)["link"], archived.get_absolute_url())
+
 
 class CalculateTotalRevenueTest(BaseOrderViewTest):
     """
@@ -599,5 +1128,657 @@ class CalculateTotalRevenueTest(BaseOrderViewTest):
             'link': None}
 
         # Проверка ответа
-        self.assertEqual(response_content.get("message"), str(orders_total_revenue))
-        self.assertEqual(response.status_code, 200)
\ No newline at end of file
+        self.assertEqual(Decimal(response_content.get("message")), orders_total_revenue)
+        self.assertEqual(response.status_code, 200)
+
+    def _revenue(self, **params):
+        request = self.factory.get(
+            path=reverse("orders:calculate_total_revenue"),
+            query_params=params
+        )
+        response = calculate_total_revenue(request)
+        return Decimal(json.loads(response.content)["message"])
+
+    def test_total_revenue_is_read_from_counter(self):
+        """
+        Проверка, что выручка читается одним запросом к счетчику
+        """
+        request = self.factory.get(
+            path=reverse("orders:calculate_total_revenue")
+        )
+        with self.assertNumQueries(1):
+            calculate_total_revenue(request)
+
+    def test_revenue_follows_status_changes(self):
+        """
+        Проверка изменения выручки при оплате заказа и отмене оплаты
+        """
+        revenue_before = self._revenue()
+
+        self.order_1.status = "paid"
+        self.order_1.save()
+        self.assertEqual(self._revenue(), revenue_before + self.order_1.total_price)
+
+        self.order_1.status = "ready"
+        self.order_1.save()
+        self.assertEqual(self._revenue(), revenue_before)
+
+    def test_revenue_follows_paid_order_items(self):
+        """
+        Проверка изменения выручки при изменении блюд оплаченного заказа
+        """
+        revenue_before = self._revenue()
+
+        self.order_3.items.remove(self.item_3)
+
+        self.assertEqual(self._revenue(), revenue_before - Decimal("2500.00"))
+
+    def test_revenue_by_day(self):
+        """
+        Проверка выручки за день оплаты
+        """
+        self.order_1.status = "paid"
+        self.order_1.save()
+
+        today = timezone.localdate().isoformat()
+        paid_today = Order.objects.filter(status="paid").aggregate(
+            total_revenue=Sum("total_price"))["total_revenue"]
+
+        self.assertEqual(self._revenue(date=today), paid_today)
+        self.assertEqual(self._revenue(date="2000-01-01"), 0)
+
+    def test_revenue_by_invalid_day(self):
+        request = self.factory.get(
+            path=reverse("orders:calculate_total_revenue"),
+            query_params={"date": "yesterday"}
+        )
+        response = calculate_total_revenue(request)
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_revenue_command(self):
+        """
+        Проверка пересборки счетчиков выручки
+        """
+        revenue_before = self._revenue()
+        RevenueCounter.objects.all().delete()
+
+        call_command("rebuild_revenue", stdout=StringIO())
+
+        self.assertEqual(self._revenue(), revenue_before)
+
+
+class OrderEventsTest(BaseOrderViewTest):
+    """
+    Класс для тестирования рассылки событий заказов (SSE)
+    """
+    def change_status(self, order, new_status):
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = new_status
+            order.save(update_fields=["status"])
+
+    def delete_order(self, order):
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+
+    def test_status_change_is_broadcast(self):
+        """
+        Проверка, что смена статуса рассылается подписчикам после фиксации транзакции.
+        """
+        async def receive():
+            async with broadcast.hub.subscribe() as subscription:
+                await sync_to_async(self.change_status)(self.order_1, "ready")
+                return await asyncio.wait_for(subscription.get(), 1)
+
+        event = async_to_sync(receive)()
+
+        self.assertEqual(event["type"], "order_status_changed")
+        self.assertEqual(event["order"]["id"], self.order_1.id)
+        self.assertEqual(event["order"]["status"], "ready")
+        self.assertFalse(broadcast.hub.has_subscribers())
+
+    def test_order_events_stream(self):
+        """
+        Проверка потока событий одного заказа.
+        """
+        async def read():
+            chunks = order_event_stream(self.order_1.id)
+            # Генератор закрывается явно: подписка снимается до выхода из теста
+            async with aclosing(chunks):
+                first_chunk = await anext(chunks)
+                # Событие другого заказа в поток не попадает
+                await sync_to_async(self.change_status)(self.order_2, "ready")
+                await sync_to_async(self.change_status)(self.order_1, "paid")
+                chunk = await asyncio.wait_for(anext(chunks), 1)
+            return first_chunk, chunk
+
+        first_chunk, chunk = async_to_sync(read)()
+
+        self.assertTrue(first_chunk.startswith("retry:"))
+        self.assertIn("event: order_status_changed", chunk)
+        data = json.loads(chunk.split("data: ")[1])
+        self.assertEqual(data["id"], self.order_1.id)
+        self.assertEqual(data["status_display"], "Оплачено")
+        self.assertFalse(broadcast.hub.has_subscribers())
+
+    def test_order_events_response(self):
+        """
+        Проверка заголовков ответа потока событий.
+        """
+        response = async_to_sync(self.async_client.get)(
+            reverse("orders:order_events"), {"order": self.order_1.id}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+    def test_order_events_invalid_order(self):
+        """
+        Проверка потока событий с некорректным ID заказа.
+        """
+        for order_pk in ("abc", "²"):
+            with self.subTest(order=order_pk):
+                response = async_to_sync(self.async_client.get)(
+                    reverse("orders:order_events"), {"order": order_pk}
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_cache_broker(self):
+        """
+        Проверка передачи событий через общий кэш (несколько процессов).
+        """
+        async def receive():
+            async with broadcast.hub.subscribe() as subscription:
+                await sync_to_async(self.change_status)(self.order_1, "ready")
+                await sync_to_async(self.delete_order)(self.order_2)
+                events = [await asyncio.wait_for(subscription.get(), 1) for _ in range(2)]
+            await broadcast.get_broker()._listener
+            return events
+
+        deleted_order_pk = self.order_2.pk
+        with self.settings(ORDERS_EVENTS_BROKER="cache"), \
+                mock.patch.object(broadcast.CacheBroker, "poll_interval", 0.01):
+            events = async_to_sync(receive)()
+
+        self.assertEqual([event["type"] for event in events],
+                         ["order_status_changed", "order_deleted"])
+        self.assertEqual(events[1]["order"]["id"], deleted_order_pk)
+        self.assertLess(events[0]["id"], events[1]["id"])
+
+
+class ExportOrdersTest(BaseOrderViewTest):
+    """
+    Класс для тестирования потоковой выгрузки заказов
+    """
+    url = reverse("orders:export_orders")
+
+    @staticmethod
+    def content(response) -> str:
+        return b"".join(response.streaming_content).decode()
+
+    def test_export_csv(self):
+        """
+        Проверка выгрузки в CSV: строка на каждую строку заказа
+        """
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment", response["Content-Disposition"])
+        rows = list(csv.DictReader(self.content(response).splitlines()))
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(rows[0]["order_id"], str(self.order_1.id))
+        self.assertEqual(rows[0]["item_name"], "Яичница")
+        self.assertEqual(rows[0]["line_total"], "450.00")
+        self.assertEqual({row["order_id"] for row in rows if row["status"] == "paid"},
+                         {str(self.order_3.id), str(self.order_4.id)})
+
+    def test_export_reads_orders_in_chunks(self):
+        """
+        Проверка, что заказы читаются порциями: два запроса на порцию
+        """
+        with self.settings(ORDERS_EXPORT_CHUNK_SIZE=2):
+            response = export_orders(self.factory.get(self.url, {"format": "jsonl"}))
+            with CaptureQueriesContext(connection) as queries:
+                chunks = list(response.streaming_content)
+
+        self.assertEqual(len(chunks), 2)
+        # Две полные порции и запрос, который находит конец выборки
+        self.assertEqual(len(queries), 5)
+        orders = [json.loads(line) for chunk in chunks for line in chunk.decode().splitlines()]
+        self.assertEqual([order["id"] for order in orders],
+                         [self.order_1.id, self.order_2.id, self.order_3.id, self.order_4.id])
+        self.assertEqual(orders[0]["lines"],
+                         [{"item": self.item_1.id, "quantity": 1, "unit_price": "450.00"},
+                          {"item": self.item_3.id, "quantity": 1, "unit_price": "2500.00"}])
+
+    def test_export_filters(self):
+        """
+        Проверка фильтров по статусу, дате и выгрузки из архива
+        """
+        response = self.client.get(self.url, {"format": "jsonl", "status": "paid"})
+        self.assertEqual([json.loads(line)["id"] for line in self.content(response).splitlines()],
+                         [self.order_3.id, self.order_4.id])
+
+        yesterday = (timezone.localdate() - datetime.timedelta(days=1)).isoformat()
+        response = self.client.get(self.url, {"end": yesterday})
+        self.assertEqual(len(self.content(response).splitlines()), 1)
+
+        archive_closed_orders(older_than=datetime.timedelta(0))
+        response = self.client.get(self.url, {"format": "jsonl", "archive": "1"})
+        orders = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([order["id"] for order in orders], [self.order_3.id, self.order_4.id])
+        self.assertEqual(len(orders[0]["lines"]), 3)
+
+    def test_export_bad_params(self):
+        for params in ({"format": "xml"}, {"status": "cooking"}, {"start": "2025-02-30"}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command("export_orders", "--format", "jsonl", "--status", "pending", stdout=out)
+
+        self.assertEqual([json.loads(line)["id"] for line in out.getvalue().splitlines()],
+                         [self.order_1.id, self.order_2.id])
+
+
+class AsyncViewsTest(BaseOrderViewTest):
+    """
+    Класс для тестирования асинхронных AJAX views (orders.async_views)
+    """
+    def setUp(self):
+        super().setUp()
+        self.async_factory = AsyncRequestFactory()
+
+    async def test_async_search_order(self):
+        """
+        Проверка асинхронного поиска по ID, номеру стола и статусу.
+        """
+        view = AsyncSearchOrderView.as_view()
+        url = reverse("orders:search_order")
+        cases = [
+            ({"orderSearchType": "by_id", "search_val": self.order_1.id}, 200),
+            ({"orderSearchType": "by_id", "search_val": 999}, 404),
+            ({"orderSearchType": "by_id", "search_val": "abc"}, 400),
+            ({"orderSearchType": "by_id", "search_val": "²"}, 400),
+            ({"orderSearchType": "by_table", "search_val": self.order_2.table_number}, 200),
+            ({"orderSearchType": "by_table", "search_val": "²"}, 400),
+            ({"orderSearchType": "by_status", "search_val": "paid"}, 200),
+            ({"orderSearchType": "by_status", "search_val": "cooking"}, 400),
+            ({"orderSearchType": "by_name", "search_val": "x"}, 400),
+        ]
+        for params, status_code in cases:
+            response = await view(self.async_factory.get(url, params))
+            self.assertEqual(response.status_code, status_code, params)
+
+        response = await view(self.async_factory.get(
+            url, {"orderSearchType": "by_status", "search_val": "paid"}
+        ))
+        self.assertEqual(json.loads(response.content)["message"], "Найдено заказов: 2")
+
+    async def test_async_search_in_archive(self):
+        """
+        Проверка асинхронного поиска заказа в архиве с параметром archive=1.
+        """
+        await sync_to_async(archive_closed_orders)(older_than=datetime.timedelta(0))
+        view = AsyncSearchOrderView.as_view()
+        url = reverse("orders:search_order")
+        params = {"orderSearchType": "by_table", "search_val": "7"}
+
+        response = await view(self.async_factory.get(url, params))
+        self.assertEqual(response.status_code, 404)
+
+        response = await view(self.async_factory.get(url, {**params, "archive": "1"}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["link"],
+                         reverse("orders:archived-order-detail", kwargs={"pk": self.order_4.pk}))
+
+    async def test_async_update_order_status(self):
+        """
+        Проверка асинхронного изменения статуса заказа.
+        """
+        view = AsyncUpdateOrderView.as_view()
+        url = reverse("orders:change_order_status", args=[self.order_1.id])
+
+        response = await view(
+            self.async_factory.patch(url, json.dumps({"new_status": "paid"}),
+                                     content_type="application/json"),
+            order_pk=self.order_1.id
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["message"], "Статус успешно обновлен_Оплачено")
+
+        order = await Order.objects.aget(pk=self.order_1.id)
+        self.assertEqual(order.status, "paid")
+        self.assertEqual(json.loads(response.content)["data"]["version"], order.version)
+        self.assertIsNotNone(order.paid_at)
+
+        response = await view(
+            self.async_factory.patch(url, json.dumps({"new_status": "cooking"}),
+                                     content_type="application/json"),
+            order_pk=self.order_1.id
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_delete_order(self):
+        """
+        Проверка асинхронного удаления заказа.
+        """
+        view = AsyncDeleteOrderView.as_view()
+        url = reverse("orders:delete_order", args=[self.order_1.id])
+
+        response = await view(self.async_factory.delete(url), order_pk=self.order_1.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(await Order.objects.filter(pk=self.order_1.id).aexists())
+
+        response = await view(self.async_factory.delete(url), order_pk=self.order_1.id)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_calculate_total_revenue(self):
+        """
+        Проверка асинхронного расчета выручки.
+        """
+        url = reverse("orders:calculate_total_revenue")
+        expected = await Order.objects.filter(status="paid").aaggregate(total=Sum("total_price"))
+
+        response = await async_calculate_total_revenue(self.async_factory.get(url))
+        self.assertEqual(Decimal(json.loads(response.content)["message"]), expected["total"])
+
+        response = await async_calculate_total_revenue(
+            self.async_factory.get(url, {"date": "2025-13-01"})
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_export_orders(self):
+        """
+        Проверка асинхронной выгрузки: ответ отдается асинхронным итератором.
+        """
+        response = await async_export_orders(
+            self.async_factory.get(reverse("orders:export_orders"), {"format": "jsonl"})
+        )
+
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(b"".join(chunks).decode().splitlines()), 4)
+
+
+class MetricsTest(BaseOrderViewTest):
+    """
+    Класс для тестирования метрик запросов (orders.metrics)
+    """
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        # Соединение с тестовой БД открыто до подключения middleware
+        metrics.install()
+
+    def test_metrics_disabled(self):
+        response = self.client.get(reverse("orders:orders_list"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(self.client.get(reverse("orders:metrics")).status_code, 404)
+
+    def test_server_timing_and_registry(self):
+        """
+        Проверка заголовка Server-Timing и метрик списка заказов:
+        число SQL-запросов и попадание в кэш при повторном запросе
+        """
+        url = reverse("orders:orders_list")
+        with self.settings(ORDERS_METRICS=True):
+            with CaptureQueriesContext(connection) as context:
+                first = self.client.get(url)
+            # Следующий запрос очищает лог запросов соединения
+            queries = len(context.captured_queries)
+            second = self.client.get(url)
+            response = self.client.get(reverse("orders:metrics"))
+
+        self.assertIn(f'desc="{queries} queries"', first["Server-Timing"])
+        self.assertIn('cache;desc="miss"', first["Server-Timing"])
+        self.assertIn('cache;desc="hit"', second["Server-Timing"])
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        content = response.content.decode()
+        for line in (
+            'cafeorders_requests_total{view="orders:orders_list",method="GET",status="200"} 2',
+            'cafeorders_cache_requests_total{view="orders:orders_list",result="hit"} 1',
+            'cafeorders_cache_requests_total{view="orders:orders_list",result="miss"} 1',
+            'cafeorders_request_duration_seconds_count{view="orders:orders_list"} 2',
+            'cafeorders_db_queries_bucket{view="orders:orders_list",le="0"} 1',
+            f'cafeorders_db_queries_sum{{view="orders:orders_list"}} {queries}',
+            f'cafeorders_response_size_bytes_sum{{view="orders:orders_list"}} '
+            f'{len(first.content) + len(second.content)}',
+        ):
+            self.assertIn(line, content)
+
+    def test_streaming_and_unresolved(self):
+        with self.settings(ORDERS_METRICS=True):
+            response = self.client.get(reverse("orders:export_orders"))
+            b"".join(response.streaming_content)
+            self.client.get("/no-such-page/")
+
+        self.assertIn("total;dur=", response["Server-Timing"])
+        content = metrics.registry.render()
+        self.assertIn('cafeorders_requests_total{view="<unresolved>",method="GET",status="404"} 1',
+                      content)
+        # Размер потокового ответа неизвестен
+        self.assertNotIn('cafeorders_response_size_bytes_count{view="orders:export_orders"}', content)
+
+    async def test_async_middleware(self):
+        """
+        Проверка асинхронной цепочки: запросы к БД из sync_to_async учитываются
+        """
+        with self.settings(ORDERS_METRICS=True):
+            response = await self.async_client.get(
+                reverse("orders:search_order"),
+                {"orderSearchType": "by_id", "search_val": self.order_1.id},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+
+class QueryGuardTest(BaseOrderViewTest):
+    """
+    Класс для тестирования поиска N+1 и медленных запросов (orders.queryguard)
+    и бюджетов SQL-запросов страниц
+    """
+    def setUp(self):
+        super().setUp()
+        # Бюджеты проверяются на списке, где N+1 был бы заметен
+        for table_number in range(100, 120):
+            order = Order.objects.create(table_number=table_number)
+            order.items.set([self.item_1, self.item_2])
+        # Бюджеты относятся к ответам, построенным без кэша страниц
+        cache.clear()
+        # Соединение с тестовой БД открыто до подключения middleware
+        queryguard.install()
+
+    def test_query_shape(self):
+        self.assertEqual(
+            query_shape('SELECT * FROM "orders_order" WHERE "id" IN (%s, %s) LIMIT 21'),
+            query_shape('SELECT * FROM  "orders_order" WHERE "id" IN (%s) LIMIT 5'),
+        )
+        self.assertNotEqual(query_shape('SELECT * FROM "orders_order"'),
+                            query_shape('SELECT * FROM "orders_item"'))
+
+    def test_single_wrapper_with_metrics(self):
+        """
+        Проверка, что метрики и проверка запросов используют один execute_wrapper
+        """
+        metrics.install()
+        metrics_stats = metrics.RequestStats()
+        token = metrics._current.set(metrics_stats)
+        try:
+            with QueryGuard() as guard:
+                Order.objects.count()
+        finally:
+            metrics._current.reset(token)
+
+        self.assertEqual(connection.execute_wrappers.count(sqlhooks._execute), 1)
+        self.assertEqual(metrics_stats.queries, 1)
+        self.assertEqual(len(guard.queries), 1)
+
+    def test_detects_n_plus_one(self):
+        with self.assertRaises(QueryBudgetExceeded) as context:
+            with QueryGuard(max_repeats=1):
+                for order in Order.objects.all():
+                    list(order.items.all())
+
+        self.assertEqual(len(context.exception.problems), 1)
+        self.assertIn("N+1", context.exception.problems[0])
+        self.assertIn("orders_item", context.exception.problems[0])
+
+    def test_detects_slow_queries_and_total(self):
+        with self.assertRaises(QueryBudgetExceeded) as context:
+            with QueryGuard(max_queries=1, slow_ms=0):
+                list(Order.objects.all())
+                list(Item.objects.all())
+
+        problems = context.exception.problems
+        self.assertIn("Выполнено 2 SQL-запросов, допустимо 1", problems[0])
+        self.assertEqual(len([problem for problem in problems if "Медленный" in problem]), 2)
+
+    def test_pages_query_budget(self):
+        """
+        Проверка количества запросов страниц и AJAX views без повторов одной формы
+        """
+        budgets = [
+            (reverse("orders:orders_list"), {}, 3),
+            (reverse("orders:orders_list"), {"status": "pending"}, 3),
+            (reverse("orders:order_detail", args=[self.order_2.pk]), {}, 3),
+            (reverse("orders:create_order"), {}, 1),
+            (reverse("orders:search_order"), {"orderSearchType": "by_status", "search_val": "pending"}, 1),
+            (reverse("orders:search_order"), {"orderSearchType": "by_table", "search_val": 13}, 1),
+            (reverse("orders:calculate_total_revenue"), {}, 1),
+        ]
+        for url, params, max_queries in budgets:
+            with self.subTest(url=url, params=params):
+                with QueryGuard(max_queries=max_queries, max_repeats=1):
+                    response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+
+    @QueryGuard(max_queries=13, max_repeats=2)
+    def test_create_order_query_budget(self):
+        response = self.client.post(reverse("orders:create_order"),
+                                    {"table_number": 50, "items": [self.item_1.pk, self.item_2.pk]})
+        self.assertEqual(response.status_code, 302)
+
+    def test_middleware_logs_problems(self):
+        with self.settings(ORDERS_QUERY_GUARD=True, ORDERS_SLOW_QUERY_MS=0), \
+                self.assertLogs("orders.queries", "WARNING") as logs:
+            self.client.get(reverse("orders:orders_list"))
+
+        self.assertIn("GET /orders/: Медленный запрос", logs.output[0])
+
+    def test_middleware_disabled(self):
+        with self.assertNoLogs("orders.queries"):
+            self.client.get(reverse("orders:orders_list"))
+
+    async def test_async_middleware(self):
+        with self.settings(ORDERS_QUERY_GUARD=True, ORDERS_SLOW_QUERY_MS=0):
+            with self.assertLogs("orders.queries", "WARNING") as logs:
+                await self.async_client.get(reverse("orders:search_order"),
+                                            {"orderSearchType": "by_id", "search_val": self.order_1.id})
+
+        self.assertEqual(len(logs.output), 1)
+
+
+@override_settings(ORDERS_REPLICA_DATABASES=["replica"])
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Класс для тестирования чтения с реплики (orders.routers).
+    В тестах реплика - зеркало основной тестовой БД с отдельным соединением.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.item = Item.objects.create(name="Чай", price=Decimal("200.00"))
+        self.order = Order.objects.create(table_number=1)
+        self.order.items.set([self.item])
+
+    def get(self, url, params=None):
+        """
+        Выполняет GET-запрос и возвращает ответ и количество запросов к каждой БД.
+        """
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get(url, params)
+        return response, len(primary), len(replica)
+
+    def test_read_views_use_replica(self):
+        for url, params in [
+            (reverse("orders:orders_list"), None),
+            (reverse("orders:order_detail", args=[self.order.pk]), None),
+            (reverse("orders:search_order"), {"orderSearchType": "by_id", "search_val": self.order.pk}),
+            (reverse("orders:calculate_total_revenue"), None),
+            (reverse("orders:order-list"), None),
+            (reverse("orders:item-top"), None),
+            (reverse("orders:analytics-hourly"), None),
+        ]:
+            with self.subTest(url=url):
+                response, primary, replica = self.get(url, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.wsgi_request.read_database, "replica")
+                self.assertEqual(primary, 0)
+                self.assertGreater(replica, 0)
+
+    def test_other_views_use_primary(self):
+        response, _, replica = self.get(reverse("orders:create_order"))
+        self.assertEqual(response.wsgi_request.read_database, "default")
+        self.assertEqual(replica, 0)
+
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.patch(
+                reverse("orders:change_order_status", args=[self.order.pk]),
+                json.dumps({"new_status": "ready"}), content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(replica), 0)
+
+    def test_read_your_writes(self):
+        """
+        Проверка закрепления клиента за основной БД после записи
+        """
+        response = self.client.patch(
+            reverse("orders:change_order_status", args=[self.order.pk]),
+            json.dumps({"new_status": "ready"}), content_type="application/json",
+        )
+        self.assertIn("orders_primary", response.cookies)
+
+        response, primary, replica = self.get(reverse("orders:orders_list"))
+        self.assertEqual(response.wsgi_request.read_database, "default")
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        # Ответ основной БД получает ETag по версиям
+        version_etag = orders_list_validators(response.wsgi_request)[0]
+        self.assertEqual(response["ETag"], version_etag)
+
+        with mock.patch("orders.routers.time.time", return_value=time.time() + 60):
+            response, primary, replica = self.get(reverse("orders:orders_list"), {"status": "ready"})
+        self.assertEqual(response.wsgi_request.read_database, "replica")
+        self.assertEqual(primary, 0)
+        # Страница по данным реплики получает только ETag по содержимому
+        # (ConditionalGetMiddleware), а не по версиям
+        self.assertNotEqual(response["ETag"], version_etag)
+
+    def test_pinned_client_skips_page_cache(self):
+        url = reverse("orders:orders_list")
+        self.client.get(url)
+        self.client.cookies["orders_primary"] = str(time.time() + 5)
+
+        response, primary, _ = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary, 0)
+
+    async def test_async_middleware(self):
+        response = await self.async_client.get(reverse("orders:search_order"),
+                                               {"orderSearchType": "by_id", "search_val": self.order.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.asgi_request.read_database, "replica")
+
+    @override_settings(ORDERS_REPLICA_DATABASES=[])
+    def test_replicas_disabled(self):
+        response, _, replica = self.get(reverse("orders:orders_list"))
+        self.assertFalse(hasattr(response.wsgi_request, "read_database"))
+        self.assertEqual(replica, 0)
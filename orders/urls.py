@@ -1,17 +1,31 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
 from orders.views import (home_page, UpdateOrderView,
                           calculate_total_revenue, OrderListView,
                           OrderDetailView, CreateOrderView,
-                          DeleteOrderView, SearchOrderView)
-from orders.api_views import OrderViewSet, ItemViewSet
+                          DeleteOrderView, SearchOrderView,
+                          export_orders, order_events, metrics)
+from orders.api_views import AnalyticsViewSet, ArchivedOrderViewSet, OrderViewSet, ItemViewSet
+
+if settings.ORDERS_ASYNC_VIEWS:
+    # Под ASGI AJAX views работают через асинхронный API ORM
+    from orders.async_views import (
+        AsyncSearchOrderView as SearchOrderView,
+        AsyncUpdateOrderView as UpdateOrderView,
+        AsyncDeleteOrderView as DeleteOrderView,
+        async_calculate_total_revenue as calculate_total_revenue,
+        async_export_orders as export_orders,
+    )
 
 app_name = "orders"
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet)
 router.register(r'items', ItemViewSet)
+router.register(r'archive/orders', ArchivedOrderViewSet, basename='archived-order')
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
 
 urlpatterns = [
     path("", home_page, name="home_page"),
@@ -24,6 +38,13 @@ urlpatterns = [
     path("orders/order/create_order",
          CreateOrderView.as_view(),
          name="create_order"),
+    path("orders/events/",
+         order_events,
+         name="order_events"),
+    path("orders/export/",
+         export_orders,
+         name="export_orders"),
+    path("metrics", metrics, name="metrics"),
     path('api/', include(router.urls))
 ]
 
@@ -1,15 +1,32 @@
+import asyncio
 import json
+from dataclasses import dataclass, field
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import QuerySet
 from django.views import View
-from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, QueryDict
+from django.http import (Http404, HttpRequest, HttpResponse, HttpResponseRedirect, QueryDict,
+                         StreamingHttpResponse)
 from django.http.response import HttpResponseNotAllowed
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
-from django.db.models import Sum
-from orders.models import Order
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from orders.models import ArchivedOrder, Order, InvalidStatusTransition, OrderVersionConflict
 from orders.forms import CreateOrderForm
+from orders import broadcast, export
+from orders import metrics as orders_metrics
 from orders.ajax_responses import ajax_response
+from orders.cache import (cache_view, conditional_view, make_etag, set_conditional_headers,
+                          orders_list_versions, order_detail_versions)
+from orders.conditional import order_validators, orders_list_validators
+from orders.pagination import paginate_by_id, get_page_size, parse_cursor
+from orders.revenue import get_revenue_counter, parse_day
+from orders.routers import use_replica
 
 
+@cache_view()
 def home_page(request: HttpRequest):
     """
     Отображает главную страницу приложения.
@@ -40,6 +57,15 @@ class BaseOrderView(View):
     form_class = CreateOrderForm
     template_name = None
 
+    def get_queryset(self):
+        """
+        Возвращает выборку заказов для списков с подгруженными блюдами.
+
+        Returns:
+            OrderQuerySet: Заказы, упорядоченные по ID, вместе с блюдами.
+        """
+        return self.model.objects.for_list()
+
     def get_context_data(self, **kwargs):
         """
         Возвращает контекст для шаблонов
@@ -59,14 +85,20 @@ class OrderListView(BaseOrderView):
 
     Attributes:
         template_name (str): Имя шаблона для отображения списка заказов.
+        use_replica (bool): Список читается с реплики БД (orders.routers).
     """
     template_name = "orders/orders_list.html"
+    use_replica = True
 
+    @method_decorator(conditional_view(orders_list_validators))
+    @method_decorator(cache_view(version_keys=orders_list_versions))
     def get(self, request: HttpRequest, *args, **kwargs):
         """
         Обрабатывает GET-запрос для отображения списка заказов.
 
         Если в запросе передан параметр 'status', возвращает заказы с указанным статусом.
+        Список разбит на страницы по ID: параметры 'after' и 'before' задают
+        курсор страницы, 'page_size' - ее размер.
 
         Args:
             request (HttpRequest): Объект запроса Django.
@@ -77,14 +109,26 @@ class OrderListView(BaseOrderView):
             HttpResponse: Рендер шаблона с контекстом, содержащим список заказов.
 
         """
-        status = request.GET.get("status")
-        if status:
-            orders = self.model.objects.filter(status=status)
-            status = dict(Order.STATUS_CHOICES).get(status)
-        else:
-            orders = self.model.objects.all()
+        status_filter = request.GET.get("status")
+        status = None
+        orders = self.get_queryset()
+        if status_filter:
+            orders = orders.filter(status=status_filter)
+            status = Order.STATUS_LABELS.get(status_filter)
+
+        page_size = get_page_size(request.GET.get("page_size"))
+        page = paginate_by_id(
+            orders,
+            page_size=page_size,
+            after=parse_cursor(request.GET.get("after")),
+            before=parse_cursor(request.GET.get("before")),
+        )
 
-        context = self.get_context_data(orders=orders, status=status)
+        context = self.get_context_data(orders=page,
+                                        page=page,
+                                        page_size=page_size,
+                                        status=status,
+                                        status_filter=status_filter)
 
         return render(request, self.template_name, context=context)
 
@@ -95,9 +139,13 @@ class OrderDetailView(BaseOrderView):
 
     Attributes:
         template_name (str): Имя шаблона для отображения деталей заказа.
+        use_replica (bool): Заказ читается с реплики БД (orders.routers).
     """
     template_name = "orders/order_detail.html"
+    use_replica = True
 
+    @method_decorator(conditional_view(order_validators))
+    @method_decorator(cache_view(version_keys=order_detail_versions))
     def get(self, request: HttpRequest, order_pk: int, *args, **kwargs):
         """
         Обрабатывает GET-запрос для отображения деталей заказа.
@@ -112,7 +160,7 @@ class OrderDetailView(BaseOrderView):
             HttpResponse: Рендер шаблона с контекстом, содержащим данные заказа и URL для изменения статуса.
         """
         order = get_object_or_404(
-            klass=self.model, pk=order_pk
+            klass=self.model.objects.with_items(), pk=order_pk
         )
 
         context = self.get_context_data(
@@ -121,10 +169,11 @@ class OrderDetailView(BaseOrderView):
                 "orders:change_order_status", args=[order.pk]
             )
         )
-        return render(request,
-                      self.template_name,
-                      context=context
-                      )
+        response = render(request,
+                          self.template_name,
+                          context=context
+                          )
+        return set_conditional_headers(response, last_modified=order.last_modified)
 
 
 class CreateOrderView(BaseOrderView):
@@ -207,6 +256,10 @@ class DeleteOrderView(BaseOrderView):
             )
 
         order.delete()
+        return self.deleted_response(order_pk)
+
+    @staticmethod
+    def deleted_response(order_pk):
         return ajax_response.success_request(
             message=f"Заказ №{order_pk} удален.\nСейчас вы будете перенаправлены к списку заказов."
         )
@@ -214,7 +267,13 @@ class DeleteOrderView(BaseOrderView):
 
 class UpdateOrderView(BaseOrderView):
     """
-    View для изменения статуса заказа
+    View для изменения статуса заказа.
+
+    Статус меняется только по графу переходов Order.STATUS_TRANSITIONS
+    (Order.transition_to). В теле запроса можно передать версию заказа
+    ("version"), которую видел клиент. Если заказ с тех пор изменен другим
+    запросом, статус не записывается и возвращается ответ 409 с текущим
+    состоянием заказа.
     """
     def patch(self, request: HttpRequest, order_pk):
         """
@@ -227,16 +286,10 @@ class UpdateOrderView(BaseOrderView):
         Returns:
             JsonResponse: JSON-ответ с результатом операции.
         """
-        allowed_statuses = dict(Order.STATUS_CHOICES)
-
-        try:
-            data = json.loads(request.body.decode('utf-8'))
-            new_status = data.get("new_status")
-        except json.JSONDecodeError:
-            return ajax_response.bad_request()
-
-        if not new_status or new_status not in allowed_statuses.keys():
+        parsed = self.parse_request(request)
+        if parsed is None:
             return ajax_response.bad_request()
+        new_status, version = parsed
 
         try:
             order = self.model.objects.get(pk=order_pk)
@@ -244,17 +297,103 @@ class UpdateOrderView(BaseOrderView):
             return ajax_response.not_found(
                 message=f"Заказ не найден"
             )
-        order.status = new_status
-        order.save()
+        if version is not None:
+            order.version = version
+        try:
+            order.transition_to(new_status)
+        except InvalidStatusTransition as error:
+            return self.not_allowed_transition_response(error)
+        except OrderVersionConflict:
+            return self.conflict_response(self.model.objects.filter(pk=order_pk).first())
+        return self.updated_response(order)
+
+    @staticmethod
+    def parse_request(request: HttpRequest):
+        """
+        Извлекает из JSON-тела запроса новый статус и версию заказа, которую видел клиент.
+
+        Returns:
+            tuple[str, int | None] | None: Статус и версия (None, если не передана)
+            или None, если статус не передан или недопустим либо версия не целое число.
+        """
+        try:
+            data = json.loads(request.body.decode('utf-8'))
+            new_status, version = data.get("new_status"), data.get("version")
+        except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+            return None
+        if new_status not in Order.STATUS_LABELS:
+            return None
+        if version is not None and type(version) is not int:
+            return None
+        return new_status, version
+
+    @staticmethod
+    def not_allowed_transition_response(error):
+        return ajax_response.bad_request_with_message(
+            message=f"Нельзя изменить статус «{Order.STATUS_LABELS[error.source]}» "
+                    f"на «{Order.STATUS_LABELS[error.target]}»."
+        )
+
+    @staticmethod
+    def conflict_response(order):
+        """
+        Ответ 409 с текущим состоянием заказа или 404, если заказ удален.
+        """
+        if order is None:
+            return ajax_response.not_found(message="Заказ не найден")
+        return ajax_response.conflict(
+            message="Заказ изменен другим пользователем. Обновите страницу и повторите.",
+            data=broadcast.order_payload(order)
+        )
+
+    @staticmethod
+    def updated_response(order):
+        """
+        Ответ об изменении статуса с новым состоянием заказа (в том числе версией).
+        """
         return ajax_response.success_request(
-            message=f"Статус успешно обновлен_{allowed_statuses.get(new_status)}"
+            message=f"Статус успешно обновлен_{order.get_status_display()}",
+            data=broadcast.order_payload(order)
         )
 
 
+@dataclass
+class OrderSearch:
+    """
+    Запросы поиска заказов, общие для синхронной и асинхронной версий
+    SearchOrderView: views различаются только способом их выполнения.
+
+    Attributes:
+        value (str): Искомое значение (ID, номер стола или статус).
+        candidates (list[QuerySet]): Выборки, в которых по очереди ищется
+            один заказ (поиск по ID и номеру стола).
+        not_found_message (str): Текст ответа, если заказ не найден.
+        count_queryset (QuerySet, optional): Выборка, заказы которой
+            считаются (поиск по статусу).
+    """
+    value: str
+    candidates: list = field(default_factory=list)
+    not_found_message: str = ""
+    count_queryset: Optional[QuerySet] = None
+
+
 class SearchOrderView(BaseOrderView):
     """
     View для поиска заказов по ID, номеру стола или статусу.
+
+    С параметром archive=1 заказ, не найденный по ID или номеру стола
+    среди текущих, ищется в архиве (ArchivedOrder).
+    Поиск читает с реплики БД (orders.routers).
     """
+    use_replica = True
+
+    def get_queryset(self):
+        """
+        Возвращает выборку заказов для поиска: блюда в ответах поиска
+        не выводятся, поэтому не подгружаются.
+        """
+        return self.model.objects.all()
+
     def get(self, request: HttpRequest, *args, **kwargs):
         """
         Обрабатывает GET-запрос для поиска заказов.
@@ -267,98 +406,112 @@ class SearchOrderView(BaseOrderView):
         Returns:
             JsonResponse: JSON-ответ с результатами поиска или ошибкой.
         """
-
-        search_type = request.GET.get("orderSearchType")
-        search_params = request.GET.get("search_val")
-
-        if not search_type or not search_params:
-            return ajax_response.bad_request_with_message(
-                message="No required parameters"
-            )
-
-        if search_type == "by_id":
-            return self._search_by_id(order_pk=search_params)
-        elif search_type == "by_table":
-            return self._search_by_table(table_id=search_params)
-        elif search_type == "by_status":
-            return self._search_by_status(order_status=search_params)
-        else:
-            return ajax_response.bad_request()
-
-    def _search_by_id(self, order_pk):
+        search, error_response = self.build_search(request)
+        if error_response:
+            return error_response
+
+        if search.count_queryset is not None:
+            return self.status_count_response(search.value, search.count_queryset.count())
+        for queryset in search.candidates:
+            order = queryset.first()
+            if order is not None:
+                return self.order_found_response(order)
+        return ajax_response.not_found(search.not_found_message)
+
+    def build_search(self, request: HttpRequest):
         """
-        Ищет заказ по ID.
+        Проверяет параметры поиска и строит его запросы.
 
         Args:
-            order_pk (str): ID заказа для поиска.
+            request (HttpRequest): Объект запроса Django.
 
         Returns:
-            JsonResponse: JSON-ответ с результатом поиска или ошибкой.
+            tuple[OrderSearch | None, JsonResponse | None]: Запросы поиска
+                или ответ с ошибкой, если параметры некорректны.
         """
-        if not order_pk.isnumeric():
-            return ajax_response.bad_request_with_message("Должно быть целым числом")
+        search_type = request.GET.get("orderSearchType")
+        search_params = request.GET.get("search_val")
+        search_archive = request.GET.get("archive") == "1"
 
-        try:
-            order = self.model.objects.get(pk=order_pk)
-            return ajax_response.success_request(
-                message=f"Найден заказ №{order.pk}\n",
-                link=order.get_absolute_url()
+        if not search_type or not search_params:
+            return None, ajax_response.bad_request_with_message(
+                message="No required parameters"
             )
-        except self.model.DoesNotExist:
-            return ajax_response.not_found(f"Заказ {order_pk} не найден.")
 
-    def _search_by_table(self, table_id):
-        """
-        Ищет заказ по номеру стола.
+        if search_type == "by_id":
+            if not search_params.isdecimal():
+                return None, self.not_a_number_response()
+            candidates = [self.get_queryset().filter(pk=search_params)]
+            if search_archive:
+                candidates.append(ArchivedOrder.objects.filter(pk=search_params))
+            return OrderSearch(value=search_params, candidates=candidates,
+                               not_found_message=f"Заказ {search_params} не найден."), None
 
-        Args:
-            table_id (str): Номер стола для поиска.
+        elif search_type == "by_table":
+            if not search_params.isdecimal():
+                return None, self.not_a_number_response()
+            # Открытый заказ стола один, закрытых может быть несколько:
+            # находим последний
+            candidates = [self.get_queryset().filter(table_number=search_params).order_by("-id")]
+            if search_archive:
+                candidates.append(
+                    ArchivedOrder.objects.filter(table_number=search_params).order_by("-id")
+                )
+            return OrderSearch(
+                value=search_params, candidates=candidates,
+                not_found_message=f"Заказ для стола №{search_params} не найден."
+            ), None
 
-        Returns:
-            JsonResponse: JSON-ответ с результатом поиска или ошибкой.
-        """
-        if not table_id.isnumeric():
-            return ajax_response.bad_request_with_message("Должно быть целым числом")
+        elif search_type == "by_status":
+            if search_params not in self.model.STATUS_LABELS:
+                return None, self.not_allowed_status_response()
+            # Один COUNT по индексу (status, id)
+            return OrderSearch(
+                value=search_params,
+                count_queryset=self.get_queryset().filter(status=search_params)
+            ), None
 
-        try:
-            order = self.model.objects.get(table_number=table_id)
-            return ajax_response.success_request(
-                message=f"Найден заказ №{order.pk}\n",
-                link=order.get_absolute_url()
-            )
-        except self.model.DoesNotExist:
-            return ajax_response.not_found(f"Заказ для стола №{table_id} не найден.")
+        else:
+            return None, ajax_response.bad_request()
 
+    # Ответы поиска общие для синхронной и асинхронной (orders.async_views) версий
 
-    def _search_by_status(self, order_status):
-        """
-        Ищет заказы по статусу.
+    @staticmethod
+    def not_a_number_response():
+        return ajax_response.bad_request_with_message("Должно быть целым числом")
 
-        Args:
-            order_status (str): Статус заказа для поиска.
+    @staticmethod
+    def not_allowed_status_response():
+        return ajax_response.bad_request_with_message(
+            message="Not allowed status"
+        )
 
-        Returns:
-            JsonResponse: JSON-ответ с результатом поиска или ошибкой.
-        """
-        allowed_statuses = dict(self.model.STATUS_CHOICES)
-        if order_status not in allowed_statuses.keys():
-            return ajax_response.bad_request_with_message(
-                message="Not allowed status"
-            )
+    @staticmethod
+    def order_found_response(order):
+        return ajax_response.success_request(
+            message=f"Найден заказ №{order.pk}\n",
+            link=order.get_absolute_url()
+        )
 
-        orders = self.model.objects.filter(status=order_status)
-        if orders.count() < 1:
+    @staticmethod
+    def status_count_response(order_status, orders_count):
+        if orders_count < 1:
             return ajax_response.not_found("Не найдено заказов с таким статусом.")
         return ajax_response.success_request(
-            message=f"Найдено заказов: {orders.count()}",
+            message=f"Найдено заказов: {orders_count}",
             link=f"{reverse('orders:orders_list')}?status={order_status}"
         )
 
 
+@use_replica
 def calculate_total_revenue(request):
     """
     Обрабатывает GET-запрос.
-    Рассчитывает общую выручку заказов со статусом "оплачено".
+    Возвращает общую выручку заказов со статусом "оплачено".
+
+    Выручка читается из счетчика (orders.revenue), который обновляется
+    при оплате заказов, поэтому ответ не зависит от числа заказов.
+    Если передан параметр 'date' (YYYY-MM-DD), возвращает выручку за этот день.
 
     Args:
         request (HttpRequest): Объект запроса Django.
@@ -367,17 +520,160 @@ def calculate_total_revenue(request):
         JsonResponse: JSON-ответ с суммой выручки или ошибкой.js)
     """
     if request.method == "GET":
-        paid_orders = Order.objects.filter(status="paid")
-        total_revenue_dict = paid_orders.aggregate(total_revenue=Sum("total_price"))
-        total_revenue = total_revenue_dict["total_revenue"]
-        if total_revenue is None:
-            total_revenue = 0
+        day, error_response = parse_revenue_day(request)
+        if error_response:
+            return error_response
 
-        return ajax_response.success_request(
-            message=total_revenue
-        )
+        amount, updated_at = get_revenue_counter(day=day)
+        return revenue_response(day, amount, updated_at)
     else:
         return ajax_response.bad_request()
 
 
+def revenue_response(day, amount, updated_at):
+    """
+    Ответ с выручкой и заголовками ETag / Last-Modified по состоянию счетчика.
+    """
+    return set_conditional_headers(
+        ajax_response.success_request(message=amount),
+        etag=make_etag("revenue", day, amount, updated_at),
+        last_modified=updated_at,
+    )
+
+
+def parse_revenue_day(request: HttpRequest):
+    """
+    Разбирает параметр 'date' (YYYY-MM-DD) запроса выручки.
+
+    Returns:
+        tuple: (дата или None, JSON-ответ с ошибкой или None).
+    """
+    day = request.GET.get("date")
+    if not day:
+        return None, None
+    day = parse_day(day)
+    if day is None:
+        return None, ajax_response.bad_request_with_message(
+            message="Дата должна быть в формате ГГГГ-ММ-ДД"
+        )
+    return day, None
+
+
+async def order_event_stream(order_pk=None):
+    """
+    Поток событий заказов в формате Server-Sent Events.
+
+    Подписка на события снимается при закрытии генератора (aclose).
+
+    Args:
+        order_pk (int, optional): ID заказа, события которого передаются.
+            По умолчанию - события всех заказов.
+
+    Yields:
+        str: Сообщения SSE и комментарии keepalive.
+    """
+    async with broadcast.hub.subscribe() as subscription:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(), timeout=settings.ORDERS_EVENTS_KEEPALIVE
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if broadcast.matches(event, order_pk):
+                yield broadcast.format_sse(event)
+
+
+async def order_events(request: HttpRequest):
+    """
+    Поток событий заказов (Server-Sent Events) для экранов кухни и страниц заказов.
+
+    Событие отправляется при создании заказа (order_created), смене статуса
+    (order_status_changed) и удалении (order_deleted). Если передан параметр
+    'order', поток содержит только события этого заказа. Если событий нет
+    ORDERS_EVENTS_KEEPALIVE секунд, отправляется комментарий, чтобы прокси
+    не закрыли соединение. Рассчитан на запуск под ASGI-сервером.
+
+    Args:
+        request (HttpRequest): Объект запроса Django.
+
+    Returns:
+        StreamingHttpResponse: Поток text/event-stream.
+        JsonResponse: Ошибка 400, если параметр 'order' некорректен.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(permitted_methods=["GET"])
+
+    order_pk = request.GET.get("order")
+    if order_pk is not None:
+        if not order_pk.isdecimal():
+            return ajax_response.bad_request()
+        order_pk = int(order_pk)
+
+    response = StreamingHttpResponse(order_event_stream(order_pk),
+                                     content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Отключает буферизацию ответа в nginx
+    response["X-Accel-Buffering"] = "no"
+    return response
 
+
+def export_response(content, export_format: str) -> StreamingHttpResponse:
+    """
+    Потоковый ответ с выгрузкой заказов в виде файла.
+    """
+    response = StreamingHttpResponse(content, content_type=export.FORMATS[export_format])
+    filename = f"orders-{timezone.localdate().isoformat()}.{export_format}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def export_orders(request: HttpRequest):
+    """
+    Обрабатывает GET-запрос.
+    Выгружает заказы со строками в CSV или JSON Lines потоком (orders.export):
+    заказы читаются и отдаются порциями, поэтому память не зависит
+    от количества заказов.
+
+    Параметры: format (csv или jsonl), status, start и end (YYYY-MM-DD),
+    archive=1 - выгрузить заказы из архива.
+
+    Args:
+        request (HttpRequest): Объект запроса Django.
+
+    Returns:
+        StreamingHttpResponse: Файл выгрузки.
+        JsonResponse: Ошибка 400, если параметры некорректны.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(permitted_methods=["GET"])
+    try:
+        query, export_format = export.parse_params(request.GET)
+    except ValueError as error:
+        return ajax_response.bad_request_with_message(str(error))
+    return export_response(export.stream(query, export_format), export_format)
+
+
+def metrics(request: HttpRequest):
+    """
+    Обрабатывает GET-запрос.
+    Отдает метрики запросов процесса (orders.metrics) в текстовом формате
+    Prometheus. Доступно, только если включена настройка ORDERS_METRICS.
+
+    Args:
+        request (HttpRequest): Объект запроса Django.
+
+    Returns:
+        HttpResponse: Метрики в формате Prometheus.
+
+    Raises:
+        Http404: Метрики выключены.
+    """
+    if not settings.ORDERS_METRICS:
+        raise Http404
+    if request.method != "GET":
+        return HttpResponseNotAllowed(permitted_methods=["GET"])
+    return HttpResponse(orders_metrics.registry.render(),
+                        content_type="text/plain; version=0.0.4; charset=utf-8")